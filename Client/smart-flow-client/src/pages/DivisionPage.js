@@ -14,6 +14,7 @@ const DivisionPage = () => {
   const [error, setError] = useState('');
   const [processedImage, setProcessedImage] = useState(null);
   const [liveCount, setLiveCount] = useState(0);
+  const [zoneCounts, setZoneCounts] = useState(null); // per-zone counts when the server has zones for this division
   const [detectionStarted, setDetectionStarted] = useState(false);
   const [detectionCompleted, setDetectionCompleted] = useState(false);
   const [avgPeople, setAvgPeople] = useState(0);
@@ -45,6 +46,9 @@ const DivisionPage = () => {
   const lastResponseAtRef = useRef(null);
   const lastSentAtRef = useRef(null);
   const sentFramesRef = useRef(0);
+  const creditsRef = useRef(1); // frames the server has allowed us to send (see 'frame_ack')
+  const skippedFramesRef = useRef(0); // frames not sent because no credit was available
+  const minSendIntervalRef = useRef(0); // server-suggested spacing between frames (adaptive quality)
   const monitorRef = useRef(null);
   const IDLE_MS = 3000; // consider processing finished after 3s of no responses
 
@@ -113,6 +117,7 @@ const DivisionPage = () => {
     if (image) {
       formData.append('file', image);
       formData.append('confidence', '0.8');
+      formData.append('division', division);
       try {
         const response = await axios.post('/upload-image', formData, {
           headers: { 'Content-Type': 'multipart/form-data' },
@@ -141,51 +146,71 @@ const DivisionPage = () => {
       setDetectionStarted(true);
       if (!socketRef.current) {
         socketRef.current = io();
+        // src is either a base64 data URL ('processed_frame') or an object URL ('processed_frame_bin')
+        const handleProcessed = (data, src, release) => {
+          // mark last response time so loader can wait until responses stop
+          lastResponseAtRef.current = Date.now();
+          // ensure loading stays true while responses come
+          setLoading(true);
+          // draw received image into processed canvas if available
+          try {
+            const img = new Image();
+            img.onload = () => {
+              const pc = processedCanvasRef.current;
+              if (pc) {
+                const rect = pc.getBoundingClientRect();
+                const DPR = window.devicePixelRatio || 1;
+                pc.width = Math.round(rect.width * DPR);
+                pc.height = Math.round(rect.height * DPR);
+                pc.style.width = `${Math.round(rect.width)}px`;
+                pc.style.height = `${Math.round(rect.height)}px`;
+                const pctx = pc.getContext('2d');
+                pctx.setTransform(DPR, 0, 0, DPR, 0, 0);
+                pctx.clearRect(0, 0, rect.width, rect.height);
+                const ar = img.width / img.height;
+                let w = rect.width, h = Math.round(w / ar);
+                if (h > rect.height) { h = rect.height; w = Math.round(h * ar); }
+                const x = Math.round((rect.width - w) / 2);
+                const y = Math.round((rect.height - h) / 2);
+                pctx.drawImage(img, x, y, w, h);
+                if (release) release();
+              } else {
+                setProcessedImage(src);
+              }
+            };
+            img.src = src;
+          } catch (e) {
+            setProcessedImage(src);
+          }
+          setLiveCount(data.count ?? 0);
+          setZoneCounts(data.zones || null);
+          // update running average
+          const c = Number(data.count ?? 0);
+          totalPeopleRef.current += c;
+          framesCountRef.current += 1;
+          setAvgPeople(totalPeopleRef.current / framesCountRef.current);
+          if (data.inference_time) inferenceTimesRef.current.push(Number(data.inference_time));
+          if (data.quality) minSendIntervalRef.current = Number(data.quality.send_interval_ms) || 0;
+          console.log('[socket] received processed_frame, count=', data.count);
+        };
         socketRef.current.on('processed_frame', (data) => {
+          if (data && data.image) handleProcessed(data, data.image);
+        });
+        socketRef.current.on('processed_frame_bin', (data) => {
           if (data && data.image) {
-            // mark last response time so loader can wait until responses stop
-            lastResponseAtRef.current = Date.now();
-            // ensure loading stays true while responses come
-            setLoading(true);
-            // draw received image into processed canvas if available
-            try {
-              const img = new Image();
-              img.onload = () => {
-                const pc = processedCanvasRef.current;
-                if (pc) {
-                  const rect = pc.getBoundingClientRect();
-                  const DPR = window.devicePixelRatio || 1;
-                  pc.width = Math.round(rect.width * DPR);
-                  pc.height = Math.round(rect.height * DPR);
-                  pc.style.width = `${Math.round(rect.width)}px`;
-                  pc.style.height = `${Math.round(rect.height)}px`;
-                  const pctx = pc.getContext('2d');
-                  pctx.setTransform(DPR, 0, 0, DPR, 0, 0);
-                  pctx.clearRect(0, 0, rect.width, rect.height);
-                  const ar = img.width / img.height;
-                  let w = rect.width, h = Math.round(w / ar);
-                  if (h > rect.height) { h = rect.height; w = Math.round(h * ar); }
-                  const x = Math.round((rect.width - w) / 2);
-                  const y = Math.round((rect.height - h) / 2);
-                  pctx.drawImage(img, x, y, w, h);
-                } else {
-                  setProcessedImage(data.image);
-                }
-              };
-              img.src = data.image;
-            } catch (e) {
-              setProcessedImage(data.image);
-            }
-            setLiveCount(data.count ?? 0);
-            // update running average
-            const c = Number(data.count ?? 0);
-            totalPeopleRef.current += c;
-            framesCountRef.current += 1;
-            setAvgPeople(totalPeopleRef.current / framesCountRef.current);
-            if (data.inference_time) inferenceTimesRef.current.push(Number(data.inference_time));
-            console.log('[socket] received processed_frame, count=', data.count);
+            // binary attachment: wrap the raw bytes in a Blob instead of decoding a base64 string
+            const url = URL.createObjectURL(new Blob([data.image], { type: data.format || 'image/jpeg' }));
+            handleProcessed(data, url, () => URL.revokeObjectURL(url));
           }
         });
+        socketRef.current.on('connected', (d) => {
+          creditsRef.current = Number(d?.credits ?? 1);
+        });
+        // the server grants a credit when our previous frame starts inference
+        socketRef.current.on('frame_ack', (d) => {
+          creditsRef.current = Math.min(1, creditsRef.current + Number(d?.credits ?? 1));
+          if (d?.stats) console.log('[socket] frame_ack stats', d.stats, 'skipped locally', skippedFramesRef.current);
+        });
         socketRef.current.on('error', (d) => setError(d?.error || 'socket error'));
       }
 
@@ -242,13 +267,25 @@ const DivisionPage = () => {
                 // send frames at the configured rate to trade update speed vs server load
                 streamIntervalRef.current = setInterval(() => {
                   try {
-                    ctx.drawImage(v, 0, 0, canvas.width, canvas.height);
-                    const dataUrl = canvas.toDataURL('image/jpeg', 0.7);
-                    if (socketRef.current && socketRef.current.connected) {
-                      lastSentAtRef.current = Date.now();
-                      sentFramesRef.current += 1;
-                      socketRef.current.emit('frame', { image: dataUrl, confidence: 0.8 });
+                    if (!socketRef.current || !socketRef.current.connected) return;
+                    // backpressure: wait for the server's credit instead of queueing frames
+                    if (creditsRef.current <= 0) {
+                      skippedFramesRef.current += 1;
+                      return;
                     }
+                    // slow down when the server's adaptive quality controller asks for it
+                    if (lastSentAtRef.current && Date.now() - lastSentAtRef.current < minSendIntervalRef.current) return;
+                    ctx.drawImage(v, 0, 0, canvas.width, canvas.height);
+                    creditsRef.current -= 1;
+                    lastSentAtRef.current = Date.now();
+                    sentFramesRef.current += 1;
+                    // send raw JPEG bytes as a binary attachment (no base64 data URL)
+                    canvas.toBlob((blob) => {
+                      if (!blob || !socketRef.current) return;
+                      blob.arrayBuffer().then((buf) => {
+                        socketRef.current.emit('frame_bin', { image: buf, confidence: 0.8, format: 'jpeg', division });
+                      });
+                    }, 'image/jpeg', 0.7);
                   } catch (err) {
                     // ignore drawing errors
                   }
@@ -394,6 +431,8 @@ const DivisionPage = () => {
     setImage(null);
     setVideo(null);
     sentFramesRef.current = 0;
+    skippedFramesRef.current = 0;
+    creditsRef.current = 1;
     if (videoUrl) { try { URL.revokeObjectURL(videoUrl); } catch (_) { }; setVideoUrl(null); }
     // stop monitor
     clearIdleMonitor();
@@ -412,6 +451,11 @@ const DivisionPage = () => {
             : 'Normal'}
         </span>
       </h3>
+      {zoneCounts && (
+        <p className="zone-counts">
+          {Object.entries(zoneCounts).map(([name, n]) => `${name}: ${n}`).join(' · ')}
+        </p>
+      )}
       <div className="plasma-meter-container">
         <div className="plasma-readout">
           {avgPeople >= threshold
@@ -10,8 +10,8 @@ class HeadDetect:
         hd.run_on_image('./assets/people.jpg')
     """
  
-    def __init__(self, confidence: float = 0.8, device: str | None = None, use_amp: bool = False):
-        self.detector = Detector(device=device, use_amp=use_amp)
+    def __init__(self, confidence: float = 0.8, device: str | None = None, use_amp: bool = False, backend: str = "frcnn"):
+        self.detector = Detector(device=device, use_amp=use_amp, backend=backend)
         self.confidence = confidence
 
     def run_on_image(
@@ -62,6 +62,11 @@ class HeadDetect:
         skip_frames: int = 0,
         duration_seconds: float | None = None,
         show_progress: bool = True,
+        motion_gate: bool = False,
+        track: bool = False,
+        keyframe_interval: int = 5,
+        pipelined: bool = False,
+        batch_size: int = 1,
     ):
         """Run head detection on a video file or camera index.
 
@@ -69,6 +74,10 @@ class HeadDetect:
             source: path to video file or camera index (int or str digits).
             show: whether to display frames during processing.
             save_path: optional path to save processed video.
+            motion_gate: if True, only run the model when the scene changes (see motion.MotionGate).
+            track: if True, run the model every `keyframe_interval` frames and track people in between.
+            pipelined: if True, overlap decoding, inference and encoding (only when `show` is False).
+            batch_size: frames per model call in pipelined mode.
         """
         # configure detector optional improvements
         self.detector.resize_long_edge = resize_long_edge
@@ -83,8 +92,19 @@ class HeadDetect:
             skip_frames=skip_frames,
             duration_seconds=duration_seconds,
             show_progress=show_progress,
+            motion_gate=motion_gate,
+            track=track,
+            keyframe_interval=keyframe_interval,
+            pipelined=pipelined,
+            batch_size=batch_size,
         )
         print(f"Processed {summary['frames']} frames at ~{summary['avg_fps']:.2f} FPS")
+        if 'stages' in summary:
+            print(f"Pipeline throughput {summary['throughput_fps']:.2f} FPS over {summary['wall_time']:.1f}s")
+            for name, stage in summary['stages'].items():
+                print(f"  {name}: {stage['items']} items, busy {stage['busy_s']:.1f}s ({stage['items_per_s']:.1f}/s)")
+        if 'motion_skipped' in summary:
+            print(f"Motion gate skipped {summary['motion_skipped']} inferences ({summary['motion_skip_fraction']:.1%})")
         if summary.get('processed_path'):
             print(f"Saved processed video to: {summary['processed_path']}")
         return summary
@@ -0,0 +1,426 @@
+"""Batch person counting over whole directories of recorded footage.
+
+Run from the Detection folder:
+    python batch_job.py /data/footage/2026-10-15 --out runs/2026-10-15
+    python batch_job.py "/data/footage/**/*.mp4" /data/stills --out runs/nightly --workers 4 --format parquet --merge
+    python batch_job.py /data/footage --out runs/nightly --track --keyframe-interval 5 --batch-size 4
+
+Every worker process loads the model once and keeps it warm for all the
+files it is given, so weights are not reloaded per video. Files are
+spread across `--workers` processes (largest first), and torch threads
+are divided between them.
+
+Per-frame counts are written as one part file per input under
+`<out>/parts/` (columns: source, frame, timestamp_s, count) in CSV,
+Parquet or NumPy `.npz` format. `--merge` also concatenates the parts
+into `<out>/counts.<ext>` at the end. Annotated videos are only written
+when `--annotate` is given.
+
+`<out>/manifest.jsonl` records every finished file (path, size, mtime,
+status, part file). A re-run with the same `--out` skips files that
+already finished and have not changed since, so a crashed job picks up
+where it stopped. Files that failed are retried; `--force` redoes all.
+
+`--occupancy-url http://localhost:5000/occupancy` also posts each
+finished file's counts to the server's occupancy time series (key
+`--occupancy-key`, default: the file's folder name; the server only
+accepts its divisions and SMARTFLOW_OCCUPANCY_KEYS). The server's series
+are rolling windows (up to 1 h) that live frames advance, so recording
+times could not be queried there. Each file's frame times are instead
+placed so that its last frame is at the moment of the push, and the
+windows ending "now" show that footage. Use a key of its own (not a live
+camera's) so replayed and live counts do not mix. Videos longer than the
+longest window lose their start; the job warns when the server keeps
+noticeably fewer samples than it sent.
+"""
+
+import argparse
+import csv
+import glob
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import time
+import urllib.request
+
+import cv2
+import numpy as np
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.m4v', '.webm')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+FORMATS = {'csv': '.csv', 'parquet': '.parquet', 'npz': '.npz'}
+MANIFEST_NAME = 'manifest.jsonl'
+
+
+def find_inputs(patterns):
+    """Expand directories (recursively) and glob patterns into a sorted list of video and image paths."""
+    found = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            candidates = glob.glob(os.path.join(pattern, '**', '*'), recursive=True)
+        else:
+            candidates = glob.glob(pattern, recursive=True)
+        for path in candidates:
+            if os.path.isfile(path) and path.lower().endswith(VIDEO_EXTENSIONS + IMAGE_EXTENSIONS):
+                found.add(os.path.abspath(path))
+    return sorted(found)
+
+
+def file_key(path) -> dict:
+    st = os.stat(path)
+    return {'path': path, 'size': st.st_size, 'mtime': st.st_mtime}
+
+
+def part_name(path, fmt) -> str:
+    """Stable, collision-free part file name for an input path."""
+    digest = hashlib.sha1(path.encode('utf-8')).hexdigest()[:12]
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return f"{stem}-{digest}{FORMATS[fmt]}"
+
+
+# --- manifest ----------------------------------------------------------------
+
+def load_manifest(path) -> dict:
+    """Last manifest entry per input path. A torn last line from a crash is ignored."""
+    entries = {}
+    if not os.path.exists(path):
+        return entries
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            entries[entry['path']] = entry
+    return entries
+
+
+def is_done(entry, key, out_dir) -> bool:
+    return (
+        entry is not None
+        and entry.get('status') == 'done'
+        and entry.get('size') == key['size']
+        and entry.get('mtime') == key['mtime']
+        and os.path.exists(os.path.join(out_dir, 'parts', entry['part']))
+    )
+
+
+def append_manifest(path, entry):
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+
+# --- columnar output ---------------------------------------------------------
+
+def write_counts(path, fmt, columns):
+    """Write {'source', 'frame', 'timestamp_s', 'count'} columns atomically (temp file + rename)."""
+    tmp = f"{path}.tmp{FORMATS[fmt]}"
+    if fmt == 'csv':
+        with open(tmp, 'w', newline='', encoding='utf-8') as f:
+            w = csv.writer(f)
+            w.writerow(['source', 'frame', 'timestamp_s', 'count'])
+            w.writerows(zip(columns['source'], columns['frame'], np.round(columns['timestamp_s'], 3), columns['count']))
+    elif fmt == 'npz':
+        np.savez_compressed(tmp, **columns)
+    else:
+        pa, pq = _pyarrow()
+        pq.write_table(pa.table(columns), tmp, compression='zstd')
+    os.replace(tmp, path)
+
+
+def read_counts(path, fmt) -> dict:
+    if fmt == 'csv':
+        with open(path, 'r', newline='', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+        return {
+            'source': np.array([r['source'] for r in rows], dtype=object),
+            'frame': np.array([int(r['frame']) for r in rows], dtype=np.int64),
+            'timestamp_s': np.array([float(r['timestamp_s']) for r in rows], dtype=np.float64),
+            'count': np.array([int(r['count']) for r in rows], dtype=np.int32),
+        }
+    if fmt == 'npz':
+        with np.load(path, allow_pickle=False) as data:
+            return {k: data[k] for k in data.files}
+    pa, pq = _pyarrow()
+    table = pq.read_table(path)
+    return {name: table.column(name).to_numpy() for name in table.column_names}
+
+
+def merge_parts(part_paths, out_path, fmt):
+    """Concatenate per-file parts (in input order) into a single output file."""
+    chunks = [read_counts(p, fmt) for p in part_paths]
+    if not chunks:
+        return None
+    merged = {k: np.concatenate([c[k] for c in chunks]) for k in ('source', 'frame', 'timestamp_s', 'count')}
+    if fmt == 'npz':
+        merged['source'] = merged['source'].astype(str)
+    write_counts(out_path, fmt, merged)
+    return out_path
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Parquet output needs pyarrow: pip install pyarrow (or use --format csv/npz)") from e
+    return pa, pq
+
+
+# --- occupancy ---------------------------------------------------------------
+
+def push_occupancy(url, key, counts, end_time: float | None = None, timeout: float = 30.0) -> int:
+    """POST a part's counts to the server's `/occupancy` endpoint, timed so the last frame is at `end_time`
+    (default: now). Returns the number of samples the server added."""
+    end_time = time.time() if end_time is None else end_time
+    timestamps = np.asarray(counts['timestamp_s'], dtype=np.float64)
+    start = end_time - (float(timestamps.max()) if len(timestamps) else 0.0)
+    samples = [[round(start + t, 3), int(c)] for t, c in zip(timestamps, counts['count'])]
+    body = json.dumps({'key': key, 'samples': samples}).encode('utf-8')
+    req = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'}, method='POST')
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return json.loads(resp.read())['added']
+
+
+# --- workers -----------------------------------------------------------------
+
+_detector = None
+_options = None
+
+
+def _init_worker(detector_kwargs, torch_threads, options):
+    global _detector, _options
+    import torch
+    from detect import Detector
+
+    if torch_threads:
+        torch.set_num_threads(torch_threads)
+    _detector = Detector(**detector_kwargs)
+    _options = options
+
+
+def _count_video(path):
+    opts = _options
+    output_path = None
+    if opts['annotate']:
+        output_path = os.path.join(opts['out_dir'], 'annotated', os.path.splitext(part_name(path, 'csv'))[0] + '.mp4')
+    summary = _detector.process_video(
+        path,
+        output_path=output_path,
+        confidence_threshold=opts['confidence'],
+        skip_frames=opts['skip_frames'],
+        show_progress=False,
+        motion_gate=opts['motion_gate'],
+        return_counts=True,
+        track=opts['track'],
+        keyframe_interval=opts['keyframe_interval'],
+        pipelined=True,
+        batch_size=opts['batch_size'],
+    )
+    counts = np.asarray(summary['counts'], dtype=np.int32)
+    frames = np.arange(len(counts), dtype=np.int64)
+    fps = summary.get('fps') or 30.0
+    return frames, frames / fps, counts, summary
+
+
+def _count_image(path):
+    img = cv2.imread(path)
+    if img is None:
+        raise RuntimeError(f"Unable to read image: {path}")
+    _, _, count = _detector.detect(img, confidence_threshold=_options['confidence'], return_image=False)
+    return np.zeros(1, dtype=np.int64), np.zeros(1), np.array([count], dtype=np.int32), {}
+
+
+def _process_file(path):
+    """Count people in one file and write its part. Never raises: failures come back as status 'error'."""
+    start = time.time()
+    fmt, out_dir = _options['format'], _options['out_dir']
+    try:
+        if path.lower().endswith(VIDEO_EXTENSIONS):
+            frames, timestamps, counts, summary = _count_video(path)
+        else:
+            frames, timestamps, counts, summary = _count_image(path)
+        part = part_name(path, fmt)
+        write_counts(os.path.join(out_dir, 'parts', part), fmt, {
+            'source': np.full(len(counts), path, dtype=object if fmt != 'npz' else str),
+            'frame': frames,
+            'timestamp_s': timestamps,
+            'count': counts,
+        })
+        return {
+            'status': 'done',
+            'part': part,
+            'frames': int(len(counts)),
+            'max_count': int(counts.max()) if len(counts) else 0,
+            'processed_frames': summary.get('processed_frames', len(counts)),
+            'elapsed_s': round(time.time() - start, 3),
+        }
+    except Exception as e:
+        return {'status': 'error', 'error': repr(e), 'elapsed_s': round(time.time() - start, 3)}
+
+
+def _process_file_keyed(path):
+    return path, _process_file(path)
+
+
+# --- driver ------------------------------------------------------------------
+
+def run_batch(
+    inputs,
+    out_dir,
+    workers: int | None = None,
+    torch_threads: int | None = None,
+    fmt: str = 'csv',
+    detector_kwargs: dict | None = None,
+    confidence: float = 0.8,
+    skip_frames: int = 0,
+    motion_gate: bool = False,
+    track: bool = False,
+    keyframe_interval: int = 5,
+    batch_size: int = 4,
+    annotate: bool = False,
+    merge: bool = False,
+    force: bool = False,
+    occupancy_url: str | None = None,
+    occupancy_key: str | None = None,
+):
+    """Count people in every input file using a pool of warm workers. Returns a summary dict."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}; choose one of {sorted(FORMATS)}")
+    if fmt == 'parquet':
+        _pyarrow()  # fail before spawning workers
+    os.makedirs(os.path.join(out_dir, 'parts'), exist_ok=True)
+    if annotate:
+        os.makedirs(os.path.join(out_dir, 'annotated'), exist_ok=True)
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    manifest = {} if force else load_manifest(manifest_path)
+
+    keys = {path: file_key(path) for path in inputs}
+    todo = [p for p in inputs if not is_done(manifest.get(p), keys[p], out_dir)]
+    skipped = len(inputs) - len(todo)
+    # largest files first so one long video does not end up alone at the tail
+    todo.sort(key=lambda p: keys[p]['size'], reverse=True)
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(todo) or 1))
+    torch_threads = torch_threads or max(1, (os.cpu_count() or 1) // workers)
+    options = {
+        'out_dir': out_dir,
+        'format': fmt,
+        'confidence': confidence,
+        'skip_frames': skip_frames,
+        'motion_gate': motion_gate,
+        'track': track,
+        'keyframe_interval': keyframe_interval,
+        'batch_size': batch_size,
+        'annotate': annotate,
+    }
+    print(f"[batch] {len(inputs)} inputs, {skipped} already done, {len(todo)} to process "
+          f"on {workers} workers x {torch_threads} threads")
+
+    done = failed = frames = 0
+    start = time.time()
+    if todo:
+        ctx = mp.get_context('spawn')
+        with ctx.Pool(workers, initializer=_init_worker, initargs=(detector_kwargs or {}, torch_threads, options)) as pool:
+            for path, result in pool.imap_unordered(_process_file_keyed, todo):
+                entry = dict(keys[path], **result, finished_at=time.time())
+                append_manifest(manifest_path, entry)
+                manifest[path] = entry
+                if result['status'] == 'done':
+                    done += 1
+                    frames += result['frames']
+                    print(f"[batch] {done + failed}/{len(todo)} {path}: {result['frames']} frames, "
+                          f"max {result['max_count']} people, {result['elapsed_s']:.1f}s")
+                    if occupancy_url:
+                        key = occupancy_key or os.path.basename(os.path.dirname(path))
+                        try:
+                            counts = read_counts(os.path.join(out_dir, 'parts', result['part']), fmt)
+                            added = push_occupancy(occupancy_url, key, counts)
+                            if added < 0.9 * len(counts['count']):
+                                print(f"[batch] occupancy for {path}: the server kept {added} of "
+                                      f"{len(counts['count'])} samples (older than its longest window?)")
+                        except Exception as e:
+                            # the part file is written either way; occupancy is best effort
+                            print(f"[batch] could not post occupancy for {path}: {e!r}")
+                else:
+                    failed += 1
+                    print(f"[batch] {done + failed}/{len(todo)} {path}: FAILED {result['error']}")
+
+    summary = {
+        'inputs': len(inputs),
+        'skipped': skipped,
+        'done': done,
+        'failed': failed,
+        'frames': frames,
+        'elapsed_s': time.time() - start,
+        'manifest': manifest_path,
+    }
+    if merge:
+        parts = [
+            os.path.join(out_dir, 'parts', manifest[p]['part'])
+            for p in inputs if is_done(manifest.get(p), keys[p], out_dir)
+        ]
+        summary['merged'] = merge_parts(parts, os.path.join(out_dir, 'counts' + FORMATS[fmt]), fmt)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('inputs', nargs='+', help='directories, files or glob patterns (quote globs)')
+    parser.add_argument('--out', required=True, help='output directory (parts, manifest, merged counts)')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--threads', type=int, default=None, help='torch threads per worker (default: CPUs / workers)')
+    parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+    parser.add_argument('--merge', action='store_true', help='also write <out>/counts.<ext> with all rows')
+    parser.add_argument('--force', action='store_true', help='ignore the manifest and reprocess everything')
+    parser.add_argument('--annotate', action='store_true', help='also write annotated videos to <out>/annotated')
+    parser.add_argument('--confidence', type=float, default=0.8)
+    parser.add_argument('--backend', default='frcnn')
+    parser.add_argument('--runtime', default='eager')
+    parser.add_argument('--artifact', default=None)
+    parser.add_argument('--quantize', default=None)
+    parser.add_argument('--skip-frames', type=int, default=0)
+    parser.add_argument('--motion-gate', action='store_true')
+    parser.add_argument('--track', action='store_true')
+    parser.add_argument('--keyframe-interval', type=int, default=5)
+    parser.add_argument('--batch-size', type=int, default=4, help='frames per model call within a video')
+    parser.add_argument('--occupancy-url', default=None, help="server occupancy endpoint, e.g. http://localhost:5000/occupancy")
+    parser.add_argument('--occupancy-key', default=None, help='occupancy series key (default: each file\'s folder name)')
+    args = parser.parse_args()
+
+    inputs = find_inputs(args.inputs)
+    if not inputs:
+        parser.error('no video or image files matched')
+    summary = run_batch(
+        inputs,
+        args.out,
+        workers=args.workers,
+        torch_threads=args.threads,
+        fmt=args.format,
+        detector_kwargs={
+            'backend': args.backend,
+            'runtime': args.runtime,
+            'artifact': args.artifact,
+            'quantize': args.quantize,
+        },
+        confidence=args.confidence,
+        skip_frames=args.skip_frames,
+        motion_gate=args.motion_gate,
+        track=args.track,
+        keyframe_interval=args.keyframe_interval,
+        batch_size=args.batch_size,
+        annotate=args.annotate,
+        merge=args.merge,
+        force=args.force,
+        occupancy_url=args.occupancy_url,
+        occupancy_key=args.occupancy_key,
+    )
+    print(json.dumps(summary, indent=2))
+    raise SystemExit(1 if summary['failed'] else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Compare detector backends on latency vs. person count.
+
+Run from the Detection folder:
+    python compare_backends.py --image ./assets/people.jpg --runs 5
+    python compare_backends.py --backends frcnn ssdlite320_mobilenet_v3 --expected 42
+
+Without `--expected`, counts are compared against the first backend listed
+(Faster R-CNN by default), which is the accuracy reference we deploy today.
+"""
+
+import argparse
+import statistics
+import time
+
+import cv2
+from detect import BACKENDS, Detector
+
+
+def benchmark_backend(name: str, image, runs: int, confidence: float, device: str | None = None):
+    build_start = time.time()
+    det = Detector(device=device, backend=name)
+    load_time = time.time() - build_start
+
+    # first call pays one-off allocation costs; keep it out of the timings
+    det.detect(image, confidence_threshold=confidence, return_image=False)
+
+    latencies = []
+    count = 0
+    for _ in range(runs):
+        start = time.time()
+        _, _, count = det.detect(image, confidence_threshold=confidence, return_image=False)
+        latencies.append(time.time() - start)
+    return {
+        'backend': name,
+        'load_time': load_time,
+        'mean': statistics.mean(latencies),
+        'p50': statistics.median(latencies),
+        'min': min(latencies),
+        'count': count,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', default='./assets/people.jpg')
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS))
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--confidence', type=float, default=0.8)
+    parser.add_argument('--device', default=None)
+    parser.add_argument('--expected', type=int, default=None, help='ground-truth person count, if known')
+    args = parser.parse_args()
+
+    image = cv2.imread(args.image)
+    if image is None:
+        raise FileNotFoundError(f"Image not found at {args.image}")
+
+    rows = []
+    for name in args.backends:
+        try:
+            rows.append(benchmark_backend(name, image, args.runs, args.confidence, args.device))
+        except ImportError as e:
+            print(f"skipping {name}: {e}")
+
+    if not rows:
+        return
+    reference = args.expected if args.expected is not None else rows[0]['count']
+    ref_label = 'expected' if args.expected is not None else rows[0]['backend']
+
+    print(f"\n{args.image} ({image.shape[1]}x{image.shape[0]}), confidence {args.confidence}, {args.runs} runs")
+    print(f"{'backend':<26}{'load s':>8}{'mean s':>9}{'p50 s':>9}{'min s':>9}{'fps':>7}{'count':>7}{'vs ' + ref_label:>16}")
+    for r in rows:
+        fps = 1.0 / r['mean'] if r['mean'] > 0 else 0.0
+        diff = r['count'] - reference
+        print(f"{r['backend']:<26}{r['load_time']:>8.2f}{r['mean']:>9.3f}{r['p50']:>9.3f}{r['min']:>9.3f}{fps:>7.2f}{r['count']:>7}{diff:>+16}")
+
+
+if __name__ == '__main__':
+    main()
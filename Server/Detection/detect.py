@@ -1,31 +1,371 @@
 import time
 import cv2
+import numpy as np
 import torch
 from torchvision.transforms import functional as F
-from torchvision.ops import nms as torchvision_nms
+from torchvision.ops import box_iou, nms as torchvision_nms
 
 from torchvision.models.detection import (
     fasterrcnn_resnet50_fpn,
     FasterRCNN_ResNet50_FPN_Weights,
+    retinanet_resnet50_fpn_v2,
+    RetinaNet_ResNet50_FPN_V2_Weights,
+    ssdlite320_mobilenet_v3_large,
+    SSDLite320_MobileNet_V3_Large_Weights,
 )
 
+# imported as `Detection.detect` by the server and as `detect` by the scripts in this folder
+try:
+    from .motion import MotionGate
+    from .pipeline import run_video_pipeline
+    from .quantize import QUANTIZE_MODES, quantize_model
+    from .render import render_detections
+    from .roi import pack_regions
+    from .tracker import Tracker
+    from .weight_cache import load_cached_model
+except ImportError:
+    from motion import MotionGate
+    from pipeline import run_video_pipeline
+    from quantize import QUANTIZE_MODES, quantize_model
+    from render import render_detections
+    from roi import pack_regions
+    from tracker import Tracker
+    from weight_cache import load_cached_model
+
+
+class TorchvisionBackend:
+    """torchvision detection model; labels are COCO category ids (person == 1)."""
+
+    def __init__(self, builder, default_weights, weights=None, device: str = "cpu", use_amp: bool = False,
+                 weight_cache: str | None = None, mmap_weights: bool = True):
+        self.device = device
+        self.weights = weights or default_weights
+        if weight_cache:
+            # local pre-serialized copy of the weights (see weight_cache.py)
+            self.model = load_cached_model(builder, self.weights, weight_cache, mmap_weights)
+        else:
+            self.model = builder(weights=self.weights)
+        self.model.to(self.device)
+        self.model.eval()
+        self.use_amp = use_amp
+
+    def prepare(self, images):
+        return [F.to_tensor(img).to(self.device) for img in images]
+
+    def __call__(self, batch):
+        with torch.no_grad():
+            if self.use_amp and torch.cuda.is_available() and 'cuda' in str(self.device):
+                # use automatic mixed precision for GPU
+                with torch.cuda.amp.autocast():
+                    return self.model(batch)
+            return self.model(batch)
+
+
+class YoloBackend:
+    """Ultralytics YOLO model; person detections are relabelled to the COCO id used elsewhere (1).
+
+    Requires the optional `ultralytics` package (see Detection/requirements.txt).
+    """
+
+    def __init__(self, weights=None, device: str = "cpu", use_amp: bool = False, min_score: float = 0.05):
+        try:
+            from ultralytics import YOLO
+        except ImportError as e:
+            raise ImportError("the 'yolov8n' backend requires `pip install ultralytics`") from e
+        self.device = device
+        self.weights = weights or "yolov8n.pt"
+        self.model = YOLO(self.weights)
+        self.use_amp = use_amp
+        # keep low-score boxes so Detector's confidence threshold and NMS decide, as for other backends
+        self.min_score = min_score
+
+    def prepare(self, images):
+        # ultralytics letterboxes BGR numpy images itself
+        return list(images)
+
+    def __call__(self, batch):
+        results = self.model.predict(
+            batch,
+            device=self.device,
+            conf=self.min_score,
+            classes=[0],
+            half=self.use_amp and 'cuda' in str(self.device),
+            verbose=False,
+        )
+        outs = []
+        for r in results:
+            n = len(r.boxes)
+            outs.append({
+                'boxes': r.boxes.xyxy,
+                'scores': r.boxes.conf,
+                'labels': torch.ones(n, dtype=torch.int64),
+            })
+        return outs
+
+
+class TorchScriptBackend:
+    """Scripted detection model exported by `export.py --format torchscript`.
+
+    The module is frozen and passed through `torch.jit.optimize_for_inference`
+    where possible; `num_threads` caps torch's intra-op CPU threads.
+    """
+
+    def __init__(self, path: str, device: str = "cpu", num_threads: int | None = None, optimize: bool = True):
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self.device = device
+        self.weights = path
+        self.model = torch.jit.load(path, map_location=device)
+        self.model.eval()
+        if optimize:
+            try:
+                self.model = torch.jit.optimize_for_inference(self.model)
+            except Exception as e:
+                # detection heads are not always freezable; fall back to the plain scripted module
+                print(f"[detect] optimize_for_inference skipped: {e}")
+
+    def prepare(self, images):
+        return [F.to_tensor(img).to(self.device) for img in images]
+
+    def __call__(self, batch):
+        with torch.no_grad():
+            out = self.model(batch)
+        # scripted torchvision detectors return (losses, detections)
+        if isinstance(out, tuple):
+            out = out[1]
+        return out
+
+
+class OnnxBackend:
+    """ONNX Runtime session for a model exported by `export.py --format onnx`.
+
+    The exported graph takes one CHW float image, so a batch is run image by
+    image inside the same session. Requires the optional `onnxruntime` package.
+    """
+
+    def __init__(self, path: str, device: str = "cpu", num_threads: int | None = None):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("the 'onnx' runtime requires `pip install onnxruntime`") from e
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        if num_threads:
+            opts.intra_op_num_threads = num_threads
+            opts.inter_op_num_threads = 1
+        providers = ['CUDAExecutionProvider', 'CPUExecutionProvider'] if 'cuda' in str(device) else ['CPUExecutionProvider']
+        self.device = device
+        self.weights = path
+        self.model = ort.InferenceSession(path, sess_options=opts, providers=providers)
+        self.input_name = self.model.get_inputs()[0].name
+        self.output_names = [o.name for o in self.model.get_outputs()]
+
+    def prepare(self, images):
+        return [F.to_tensor(img).numpy() for img in images]
+
+    def __call__(self, batch):
+        outs = []
+        for arr in batch:
+            values = dict(zip(self.output_names, self.model.run(None, {self.input_name: arr})))
+            outs.append({k: torch.from_numpy(values[k]) for k in ('boxes', 'scores', 'labels')})
+        return outs
+
+
+# exported-artifact runtimes: name -> factory(path, device, num_threads)
+RUNTIMES = {
+    'torchscript': TorchScriptBackend,
+    'onnx': OnnxBackend,
+}
+
+
+# name -> factory(weights, device, use_amp, **options); select with Detector(backend=...)
+BACKENDS = {
+    'frcnn': lambda weights, device, use_amp, **options: TorchvisionBackend(
+        fasterrcnn_resnet50_fpn, FasterRCNN_ResNet50_FPN_Weights.DEFAULT, weights, device, use_amp, **options),
+    'ssdlite320_mobilenet_v3': lambda weights, device, use_amp, **options: TorchvisionBackend(
+        ssdlite320_mobilenet_v3_large, SSDLite320_MobileNet_V3_Large_Weights.DEFAULT, weights, device, use_amp, **options),
+    'retinanet': lambda weights, device, use_amp, **options: TorchvisionBackend(
+        retinanet_resnet50_fpn_v2, RetinaNet_ResNet50_FPN_V2_Weights.DEFAULT, weights, device, use_amp, **options),
+    'yolov8n': lambda weights, device, use_amp, **options: YoloBackend(weights, device, use_amp),
+}
+
+
+def register_backend(name: str, factory):
+    """Register a backend factory `factory(weights, device, use_amp)` under `name`.
+
+    The object it returns needs `prepare(images) -> batch` and `__call__(batch)`
+    returning one dict per image with 'boxes' (xyxy), 'scores' and 'labels' (person == 1).
+    With `Detector(weight_cache=...)` the factory is also called with the keyword
+    options `weight_cache` and `mmap_weights`.
+    """
+    BACKENDS[name] = factory
+
+
+def tile_grid(width: int, height: int, tile_size: int, overlap: float = 0.2):
+    """Overlapping (x0, y0, x1, y1) tiles of at most `tile_size` px that cover a width x height image."""
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        stride = max(1, int(tile_size * (1.0 - overlap)))
+        return list(range(0, length - tile_size, stride)) + [length - tile_size]
+
+    return [
+        (x, y, min(x + tile_size, width), min(y + tile_size, height))
+        for y in starts(height)
+        for x in starts(width)
+    ]
+
+
+# test-time augmentations as (hflip, scale); the identity view is always run as well.
+# Detectors resize their input to a fixed size, so a scale < 1 shrinks the frame onto a canvas of the
+# original size (people appear smaller to the model); zooming in is what `tile_size` does.
+TTA_PRESETS = {
+    'hflip': ((True, 1.0),),
+    'multiscale': ((False, 0.8), (False, 0.6)),
+    'full': ((True, 1.0), (False, 0.8), (True, 0.8), (False, 0.6)),
+}
+FUSIONS = ('nms', 'wbf')
+
+
+def parse_tta(tta):
+    """Normalize a TTA spec (preset name or [(hflip, scale), ...]) to a tuple of non-identity augmentations."""
+    if not tta:
+        return ()
+    if isinstance(tta, str):
+        if tta not in TTA_PRESETS:
+            raise ValueError(f"Unknown TTA preset {tta!r}; choose one of {sorted(TTA_PRESETS)}")
+        return TTA_PRESETS[tta]
+    augs = []
+    for flip, scale in tta:
+        scale = float(scale)
+        if not 0.0 < scale <= 1.0:
+            raise ValueError(f"TTA scale {scale} must be in (0, 1]; use tile_size to zoom in")
+        if flip or scale != 1.0:
+            augs.append((bool(flip), scale))
+    return tuple(augs)
+
+
+def augment(image, flip: bool, scale: float):
+    """Return (view, (scaled_w, scaled_h)): `image` shrunk by `scale` onto a same-size canvas, then mirrored."""
+    h, w = image.shape[:2]
+    view = image
+    sw, sh = w, h
+    if scale != 1.0:
+        sw, sh = max(1, int(round(w * scale))), max(1, int(round(h * scale)))
+        view = np.zeros_like(image)
+        view[:sh, :sw] = cv2.resize(image, (sw, sh), interpolation=cv2.INTER_AREA)
+    if flip:
+        view = cv2.flip(view, 1)
+    return view, (sw, sh)
+
+
+def weighted_box_fusion(boxes, scores, iou_threshold: float = 0.55, num_views: int = 1):
+    """Fuse overlapping boxes from several views into score-weighted averages (WBF).
+
+    Boxes are visited by descending score and joined to the first fused box they overlap by more
+    than `iou_threshold`. A fused score is the cluster's mean score, scaled down when fewer than
+    `num_views` boxes support it.
+    """
+    if boxes.numel() == 0:
+        return boxes, scores
+    order = torch.argsort(scores, descending=True)
+    weighted, weights, counts, totals = [], [], [], []
+    fused = torch.zeros((0, 4), dtype=boxes.dtype)
+    for i in order.tolist():
+        b, s = boxes[i], scores[i]
+        if len(fused):
+            ious = box_iou(b[None], fused)[0]
+            j = int(torch.argmax(ious))
+            if ious[j] > iou_threshold:
+                weighted[j] = weighted[j] + b * s
+                weights[j] = weights[j] + s
+                counts[j] += 1
+                totals[j] = totals[j] + s
+                fused[j] = weighted[j] / weights[j]
+                continue
+        weighted.append(b * s)
+        weights.append(s)
+        counts.append(1)
+        totals.append(s)
+        fused = torch.cat([fused, b[None]])
+    counts_t = torch.tensor(counts, dtype=scores.dtype)
+    fused_scores = torch.stack(totals) / counts_t * torch.clamp(counts_t, max=num_views) / num_views
+    keep = torch.argsort(fused_scores, descending=True)
+    return fused[keep], fused_scores[keep]
+
 
 class Detector:
-    """Faster R-CNN based detector for people / head-region highlighting.
+    """Person detector (Faster R-CNN by default) for people / head-region highlighting.
 
     Usage:
-        det = Detector()
+        det = Detector()                        # or Detector(backend="ssdlite320_mobilenet_v3")
         out_img, t, count = det.detect(image, confidence_threshold=0.8)
+
+        # exported artifact (see export.py) with a fixed CPU thread budget
+        det = Detector(runtime="onnx", artifact="models/frcnn.onnx", num_threads=4)
+
+        # int8 post-training quantization for CPU (see quantize.py)
+        det = Detector(device="cpu", quantize="dynamic")
+
+        # weights from a local mmap-backed cache (see weight_cache.py), then a warm-up pass
+        det = Detector(weight_cache="./models/weights")
+        det.warmup([(1280, 720)])
     """
 
-    def __init__(self, device: str | None = None, weights=None, use_amp: bool = False):
+    def __init__(
+        self,
+        device: str | None = None,
+        weights=None,
+        use_amp: bool = False,
+        backend: str = "frcnn",
+        runtime: str = "eager",
+        artifact: str | None = None,
+        num_threads: int | None = None,
+        quantize: str | None = None,
+        calibration_images=None,
+        weight_cache: str | None = None,
+        mmap_weights: bool = True,
+    ):
         self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
-        self.weights = weights or FasterRCNN_ResNet50_FPN_Weights.DEFAULT
-        self.model = fasterrcnn_resnet50_fpn(weights=self.weights)
-        self.model.to(self.device)
-        self.model.eval()
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}; choose one of {sorted(BACKENDS)}")
+        if runtime != "eager" and runtime not in RUNTIMES:
+            raise ValueError(f"Unknown runtime {runtime!r}; choose 'eager' or one of {sorted(RUNTIMES)}")
+        self.backend_name = backend
+        self.runtime = runtime
         # mixed precision inference (uses torch.cuda.amp.autocast when True and GPU available)
         self.use_amp = use_amp
+        if runtime == "eager":
+            if num_threads:
+                torch.set_num_threads(num_threads)
+            options = {'weight_cache': weight_cache, 'mmap_weights': mmap_weights} if weight_cache else {}
+            self.backend = BACKENDS[backend](weights, self.device, use_amp, **options)
+        else:
+            if not artifact:
+                raise ValueError(f"runtime {runtime!r} needs an exported artifact path (see export.py)")
+            self.backend = RUNTIMES[runtime](artifact, self.device, num_threads)
+        self.quantize = quantize
+        if quantize:
+            if quantize not in QUANTIZE_MODES:
+                raise ValueError(f"Unknown quantize mode {quantize!r}; choose one of {QUANTIZE_MODES}")
+            if not isinstance(self.backend, TorchvisionBackend) or 'cuda' in str(self.device):
+                raise ValueError("quantize is only supported for eager torchvision backends on CPU")
+            # calibration_images: list of BGR images, a directory or a glob (defaults to ./assets)
+            self.backend.model = quantize_model(self.backend.model, quantize, calibration_images)
+        self.weights = self.backend.weights
+        self.model = self.backend.model
+
+    def warmup(self, sizes=((1280, 720),), batch_size: int = 1, **params) -> float:
+        """Run one untimed batch per (width, height) in `sizes` so the first real request does not pay
+        for lazy initialisation and first-call allocations. `params` go to `detect_batch` (e.g. the
+        server's tiling / TTA settings, which change the shapes the model sees). Returns the seconds spent.
+        """
+        start = time.perf_counter()
+        for width, height in sizes:
+            frame = np.full((int(height), int(width), 3), 114, dtype=np.uint8)
+            self.detect_batch([frame] * max(1, int(batch_size)), **params)
+        return time.perf_counter() - start
 
     def detect(
         self,
@@ -34,6 +374,14 @@ class Detector:
         resize_long_edge: int | None = None,
         tta_hflip: bool = False,
         nms_iou: float = 0.5,
+        return_image: bool = True,
+        tile_size: int | None = None,
+        tile_overlap: float = 0.2,
+        return_raw: bool = False,
+        tta=None,
+        fusion: str = 'nms',
+        timings: dict | None = None,
+        regions=None,
     ):
         """Run detection on a single BGR OpenCV image with optional improvements.
 
@@ -42,170 +390,330 @@ class Detector:
             confidence_threshold: score threshold for detections
             resize_long_edge: optional int to resize the longer image edge (keeps aspect ratio)
             tta_hflip: if True, run horizontal flip test-time augmentation and combine detections
+                (shorthand for tta='hflip')
             nms_iou: IoU threshold to use for NMS
+            return_image: if False, skip all drawing and return the detections instead of an image
+            tile_size: if set and the image is larger, also run overlapping tiles of this size
+                (in the same batch as the full frame) so small, distant people keep their detail
+            tile_overlap: fraction of `tile_size` shared by neighbouring tiles
+            return_raw: if True, append the raw result: every person box and score before the
+                confidence threshold and NMS ({'boxes': (N, 4), 'scores': (N,)} float32 arrays),
+                which `select_detections` can re-threshold later without the model
+            tta: test-time augmentations, a `TTA_PRESETS` name or [(hflip, scale), ...]; all views
+                run in the same batched forward pass as the original and are mapped back before fusion
+            fusion: how overlapping boxes are merged, 'nms' (keep the best) or 'wbf' (score-weighted
+                average, see `weighted_box_fusion`; uses `nms_iou` as its IoU threshold)
+            timings: optional dict; seconds spent per stage ('preprocess', 'to_tensor', 'forward', 'nms', 'render')
+                are added to it, measured with a monotonic clock
+            regions: optional list of (x0, y0, x1, y1) pixel rectangles (e.g. `roi.ZoneSet.regions`); only
+                these parts of the image are packed into one mosaic and run through the model, and the
+                boxes are mapped back to image coordinates
+
+        Returns: (output_image, inference_time, person_count), or
+            (detections, inference_time, person_count) when return_image is False, where
+            detections is a list of (x1, y1, x2, y2_head, score) tuples in input image coordinates.
+            With return_raw, a fourth element holds the raw result.
+        """
+        return self.detect_batch(
+            [image],
+            confidence_threshold=confidence_threshold,
+            resize_long_edge=resize_long_edge,
+            tta_hflip=tta_hflip,
+            nms_iou=nms_iou,
+            return_image=return_image,
+            tile_size=tile_size,
+            tile_overlap=tile_overlap,
+            return_raw=return_raw,
+            tta=tta,
+            fusion=fusion,
+            timings=timings,
+            regions=[regions] if regions else None,
+        )[0]
+
+    def detect_batch(
+        self,
+        images,
+        confidence_threshold=0.8,
+        resize_long_edge: int | None = None,
+        tta_hflip: bool = False,
+        nms_iou=0.5,
+        return_image: bool = True,
+        tile_size: int | None = None,
+        tile_overlap: float = 0.2,
+        return_raw: bool = False,
+        tta=None,
+        fusion: str = 'nms',
+        timings: dict | None = None,
+        regions=None,
+    ):
+        """Run detection on several BGR images with a single batched model call.
 
-        Returns: (output_image, inference_time, person_count)
+        Args:
+            images: list of BGR numpy images (sizes may differ)
+            confidence_threshold: float, or one float per image
+            nms_iou: float, or one float per image
+            return_image: bool, or one bool per image
+            resize_long_edge: int or None, or one per image
+            regions: one list of (x0, y0, x1, y1) rectangles per image (None = the full frame)
+            tta_hflip, tile_size, tile_overlap, return_raw, tta, fusion, timings:
+                as in `detect`
+
+        Returns: list of (output_image or detections, inference_time, person_count), one per image,
+            plus the raw result when return_raw is set.
+            inference_time is the duration of the shared forward pass.
         """
+        if not images:
+            return []
+        if fusion not in FUSIONS:
+            raise ValueError(f"Unknown fusion {fusion!r}; choose one of {FUSIONS}")
+        augs = parse_tta(tta)
+        if tta_hflip and (True, 1.0) not in augs:
+            augs = augs + TTA_PRESETS['hflip']
+        num_views = 1 + len(augs)
+        thresholds = confidence_threshold
+        if isinstance(thresholds, (int, float)):
+            thresholds = [float(thresholds)] * len(images)
+        ious = nms_iou
+        if isinstance(ious, (int, float)):
+            ious = [float(ious)] * len(images)
+        render_flags = return_image
+        if isinstance(render_flags, bool):
+            render_flags = [render_flags] * len(images)
+        resizes = resize_long_edge
+        if not isinstance(resizes, (list, tuple)):
+            resizes = [resizes] * len(images)
+
+        preprocess_start = time.perf_counter()
+        prepared = [self._prepare(img, resize) for img, resize in zip(images, resizes)]
+        region_lists = regions if regions is not None else [None] * len(images)
+
+        # every image contributes one base view (the frame, or its regions packed into one mosaic) plus its
+        # augmented views and tiles, all in the same forward pass; `sources` maps each view's boxes back
+        batch_images = []
+        sources = []  # (image index, [(undo callable, *args), ...] applied in order)
+        for i, ((img, scale_factor), rects) in enumerate(zip(prepared, region_lists)):
+            base_steps = []
+            if rects:
+                ih, iw = img.shape[:2]
+                rects = [
+                    (max(0, round(x0 * scale_factor)), max(0, round(y0 * scale_factor)),
+                     min(iw, round(x1 * scale_factor)), min(ih, round(y1 * scale_factor)))
+                    for x0, y0, x1, y1 in rects
+                ]
+                rects = [r for r in rects if r[2] > r[0] and r[3] > r[1]]
+            if rects:
+                img, placements = pack_regions(img, rects)
+                base_steps = [(self._unpack, placements)]
+            h, w = img.shape[:2]
+            batch_images.append(img)
+            sources.append((i, base_steps))
+            for flip, scale in augs:
+                view, scaled = augment(img, flip, scale)
+                batch_images.append(view)
+                sources.append((i, [(self._deaugment, flip, (w, h), scaled)] + base_steps))
+            if tile_size:
+                grid = tile_grid(w, h, tile_size, tile_overlap)
+                if len(grid) > 1:
+                    for x0, y0, x1, y1 in grid:
+                        batch_images.append(img[y0:y1, x0:x1])
+                        sources.append((i, [(self._untile, (x0, y0, x1, y1), (w, h))] + base_steps))
+
+        if timings is not None:
+            timings['preprocess'] = timings.get('preprocess', 0.0) + time.perf_counter() - preprocess_start
+        raw, time_consumed = self._forward(batch_images, timings)
+        views = [[] for _ in images]
+        for out, (i, steps) in zip(raw, sources):
+            for undo, *args in steps:
+                out = undo(out, *args)
+            views[i].append(out)
+
+        results = []
+        nms_time = render_time = 0.0
+        for image, (_, scale_factor), v, thr, iou, render in zip(images, prepared, views, thresholds, ious, render_flags):
+            start = time.perf_counter()
+            all_boxes, all_scores = self._persons(v, scale_factor)
+            boxes, scores = self.select(all_boxes, all_scores, thr, iou, fusion, num_views)
+            detections = self.to_detections(boxes, scores)
+            selected_at = time.perf_counter()
+            output = self.render(image, detections) if render else detections
+            nms_time += selected_at - start
+            render_time += time.perf_counter() - selected_at if render else 0.0
+            if return_raw:
+                raw = {
+                    'boxes': all_boxes.numpy().astype('float32'),
+                    'scores': all_scores.numpy().astype('float32'),
+                    'views': num_views,
+                }
+                results.append((output, time_consumed, len(detections), raw))
+            else:
+                results.append((output, time_consumed, len(detections)))
+        if timings is not None:
+            timings['nms'] = timings.get('nms', 0.0) + nms_time
+            if render_time:
+                timings['render'] = timings.get('render', 0.0) + render_time
+        return results
+
+    def _prepare(self, image, resize_long_edge: int | None):
+        """Optionally downscale so the long edge equals `resize_long_edge`. Returns (image, scale)."""
         orig_h, orig_w = image.shape[:2]
-        proc_image = image
-        scale_factor = 1.0
         if resize_long_edge and resize_long_edge > 0:
             long_edge = max(orig_w, orig_h)
             if long_edge != resize_long_edge:
                 scale_factor = resize_long_edge / float(long_edge)
                 new_w = int(orig_w * scale_factor)
                 new_h = int(orig_h * scale_factor)
-                proc_image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
-
-        def run_model(img):
-            img_t = F.to_tensor(img).to(self.device).unsqueeze(0)
-            start_time = time.time()
-            with torch.no_grad():
-                if self.use_amp and torch.cuda.is_available() and 'cuda' in str(self.device):
-                    # use automatic mixed precision for GPU
-                    with torch.cuda.amp.autocast():
-                        out = self.model(img_t)[0]
-                else:
-                    out = self.model(img_t)[0]
-            t = time.time() - start_time
-            return {
+                return cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR), scale_factor
+        return image, 1.0
+
+    @staticmethod
+    def _deaugment(out, flip, size, scaled):
+        """Map boxes of an `augment`ed view back to the un-augmented image."""
+        (w, h), (sw, sh) = size, scaled
+        boxes = out['boxes'].clone()
+        if flip:
+            boxes[:, [0, 2]] = w - boxes[:, [2, 0]]
+        if (sw, sh) != (w, h):
+            boxes = boxes * torch.tensor([w / sw, h / sh, w / sw, h / sh], dtype=boxes.dtype)
+        return {'boxes': boxes, 'scores': out['scores'], 'labels': out['labels']}
+
+    @staticmethod
+    def _unpack(out, placements):
+        """Map boxes found in a `pack_regions` mosaic back to the image.
+
+        Each box belongs to the crop that contains its centre (boxes centred in the gaps are
+        dropped) and is clipped to that crop.
+        """
+        boxes = out['boxes']
+        cx = (boxes[:, 0] + boxes[:, 2]) / 2
+        cy = (boxes[:, 1] + boxes[:, 3]) / 2
+        keep = torch.zeros(boxes.shape[0], dtype=torch.bool)
+        mapped = boxes.clone()
+        for mx, my, x0, y0, x1, y1 in placements:
+            inside = (cx >= mx) & (cx < mx + x1 - x0) & (cy >= my) & (cy < my + y1 - y0) & ~keep
+            if inside.any():
+                b = boxes[inside] - torch.tensor([mx, my, mx, my], dtype=boxes.dtype)
+                b[:, [0, 2]] = b[:, [0, 2]].clamp(0, x1 - x0) + x0
+                b[:, [1, 3]] = b[:, [1, 3]].clamp(0, y1 - y0) + y0
+                mapped[inside] = b
+                keep |= inside
+        return {'boxes': mapped[keep], 'scores': out['scores'][keep], 'labels': out['labels'][keep]}
+
+    @staticmethod
+    def _untile(out, tile, size, margin: int = 2):
+        """Shift one tile's boxes into full-frame coordinates.
+
+        Boxes cut by an inner tile edge are dropped: a neighbouring tile (or the
+        full frame, for people larger than the overlap) sees them whole, and NMS
+        in `select` merges the duplicates along the seams.
+        """
+        x0, y0, x1, y1 = tile
+        width, height = size
+        boxes = out['boxes']
+        cut = torch.zeros(boxes.shape[0], dtype=torch.bool)
+        if x0 > 0:
+            cut |= boxes[:, 0] <= margin
+        if y0 > 0:
+            cut |= boxes[:, 1] <= margin
+        if x1 < width:
+            cut |= boxes[:, 2] >= (x1 - x0) - margin
+        if y1 < height:
+            cut |= boxes[:, 3] >= (y1 - y0) - margin
+        keep = ~cut
+        offset = torch.tensor([x0, y0, x0, y0], dtype=boxes.dtype)
+        return {
+            'boxes': boxes[keep] + offset,
+            'scores': out['scores'][keep],
+            'labels': out['labels'][keep],
+        }
+
+    def _forward(self, images, timings: dict | None = None):
+        """Run one batched forward pass. Returns (list of CPU output dicts, seconds)."""
+        start_time = time.perf_counter()
+        batch = self.backend.prepare(images)
+        prepared_at = time.perf_counter()
+        outs = self.backend(batch)
+        outs = [
+            {
                 'boxes': out['boxes'].cpu(),
                 'scores': out['scores'].cpu(),
                 'labels': out['labels'].cpu(),
-                'time': t,
             }
-
-        boxes_list, scores_list, labels_list = [], [], []
-        time_consumed = 0.0
-
-        base = run_model(proc_image)
-        boxes_list.append(base['boxes'])
-        scores_list.append(base['scores'])
-        labels_list.append(base['labels'])
-        time_consumed += base['time']
-
-        if tta_hflip:
-            flipped = cv2.flip(proc_image, 1)
-            f = run_model(flipped)
-            fboxes = f['boxes']
-            if fboxes.numel() > 0:
-                W = proc_image.shape[1]
-                x1 = W - fboxes[:, 2]
-                x2 = W - fboxes[:, 0]
-                fboxes[:, 0] = x1
-                fboxes[:, 2] = x2
-            boxes_list.append(fboxes)
-            scores_list.append(f['scores'])
-            labels_list.append(f['labels'])
-            time_consumed += f['time']
-
-        if len(boxes_list) > 1:
-            boxes = torch.cat(boxes_list, dim=0)
-            scores = torch.cat(scores_list, dim=0)
-            labels = torch.cat(labels_list, dim=0)
+            for out in outs
+        ]
+        t = time.perf_counter() - prepared_at
+        if timings is not None:
+            timings['to_tensor'] = timings.get('to_tensor', 0.0) + (prepared_at - start_time)
+            timings['forward'] = timings.get('forward', 0.0) + t
+        return outs, t
+
+    @staticmethod
+    def _persons(views, scale_factor: float = 1.0):
+        """All person boxes and scores of the merged views, in input image coordinates (no threshold, no NMS)."""
+        if len(views) > 1:
+            boxes = torch.cat([v['boxes'] for v in views], dim=0)
+            scores = torch.cat([v['scores'] for v in views], dim=0)
+            labels = torch.cat([v['labels'] for v in views], dim=0)
         else:
-            boxes = boxes_list[0]
-            scores = scores_list[0]
-            labels = labels_list[0]
+            boxes = views[0]['boxes']
+            scores = views[0]['scores']
+            labels = views[0]['labels']
 
         mask_person = labels == 1
         boxes = boxes[mask_person]
         scores = scores[mask_person]
+        if scale_factor != 1.0:
+            boxes = boxes / scale_factor
+        return boxes, scores
+
+    @staticmethod
+    def select(boxes, scores, confidence_threshold: float, nms_iou: float, fusion: str = 'nms', num_views: int = 1):
+        """Keep boxes scoring at least `confidence_threshold`, then merge overlaps by NMS or WBF at `nms_iou`.
 
+        With WBF the threshold is applied to the fused scores too, so a box seen in only one of
+        `num_views` views must still score at least `confidence_threshold` after fusion.
+        """
         keep_inds = scores >= confidence_threshold
         boxes = boxes[keep_inds]
         scores = scores[keep_inds]
 
         if boxes.numel() == 0:
-            return image.copy(), time_consumed, 0
+            return boxes, scores
 
+        if fusion == 'wbf':
+            boxes, scores = weighted_box_fusion(boxes, scores, nms_iou, num_views)
+            # fused scores are scaled down for boxes found in few views; threshold them again
+            keep_inds = scores >= confidence_threshold
+            return boxes[keep_inds], scores[keep_inds]
         keep = torchvision_nms(boxes, scores, nms_iou)
-        boxes = boxes[keep]
-        scores = scores[keep]
-
-        if scale_factor != 1.0:
-            boxes = boxes / scale_factor
-
-        output_image = image.copy()
-        overlay = output_image.copy()
+        return boxes[keep], scores[keep]
+
+    @classmethod
+    def select_detections(cls, raw, confidence_threshold: float = 0.8, nms_iou: float = 0.5, fusion: str = 'nms'):
+        """Re-apply a threshold and NMS IoU to a raw result (`return_raw=True`) without running the model."""
+        boxes, scores = cls.select(
+            torch.from_numpy(raw['boxes']).reshape(-1, 4),
+            torch.from_numpy(raw['scores']),
+            confidence_threshold,
+            nms_iou,
+            fusion,
+            raw.get('views', 1),
+        )
+        return cls.to_detections(boxes, scores)
+
+    @staticmethod
+    def to_detections(boxes, scores):
+        """Convert person boxes to head-region tuples (x1, y1, x2, y2_head, score)."""
         detections = []
-        for b, s in zip(boxes, scores):
-            x1, y1, x2, y2 = map(int, b.tolist())
+        for b, s in zip(boxes.tolist(), scores.tolist()):
+            x1, y1, x2, y2 = map(int, b)
             head_height = int((y2 - y1) * 0.3)
             y2_head = y1 + head_height
             detections.append((x1, y1, x2, y2_head, float(s)))
-            # filled translucent region will be applied by blending overlay later
-            cv2.rectangle(overlay, (x1, y1), (x2, y2_head), (255, 255, 0), -1)
-
-        # blend translucent fill (10% opacity)
-        output_image = cv2.addWeighted(overlay, 0.10, output_image, 0.90, 0)
-
-        # draw borders and proportional labels with background behind text
-        for idx, (x1, y1, x2, y2_head, score) in enumerate(detections, start=1):
-            rect_color = (255, 255, 0)
-            border_thickness = 1
-            cv2.rectangle(output_image, (x1, y1), (x2, y2_head), rect_color, border_thickness)
-
-            # determine font scale relative to head region height, but shrink if label too wide
-            region_h = max(8, y2_head - y1)
-            font_scale = max(0.3, min(0.9, region_h / 60.0))
-            font_thickness = 1  # thin font as requested
-            font_face = cv2.FONT_HERSHEY_SIMPLEX
-
-            label_text = f'Person {idx} ({score:.2f})'
-
-            # box width available for label
-            box_width = max(10, x2 - x1)
-
-            # compute text size and reduce font_scale until it fits within box width (with padding)
-            padding_x = max(4, int(6 * font_scale))
-            padding_y = max(2, int(3 * font_scale))
-            (text_w, text_h), _ = cv2.getTextSize(label_text, font_face, font_scale, font_thickness)
-            min_scale = 0.2
-            while text_w + padding_x * 2 > box_width and font_scale > min_scale:
-                font_scale = font_scale * 0.9
-                (text_w, text_h), _ = cv2.getTextSize(label_text, font_face, font_scale, font_thickness)
-
-            # label background matches rectangle color
-            label_bg = rect_color
-
-            # place label above the box; if not enough space, place below
-            label_x1 = x1
-            label_x2 = x1 + text_w + padding_x * 2
-            label_y2 = y1  # flush with the box (no gap)
-            label_y1 = label_y2 - (text_h + padding_y * 2)
-            if label_y1 < 0:
-                # fallback: place below the head region
-                label_y1 = y2_head
-                label_y2 = label_y1 + (text_h + padding_y * 2)
-
-            # clamp label_x2 to box right
-            if label_x2 > x2:
-                label_x2 = x2
-                label_x1 = max(x1, label_x2 - (text_w + padding_x * 2))
-
-            cv2.rectangle(output_image, (label_x1, label_y1), (label_x2, label_y2), label_bg, -1)
-            text_org = (label_x1 + padding_x, label_y1 + text_h + padding_y - 1)
-            # use black labels as requested
-            cv2.putText(output_image, label_text, text_org, font_face, font_scale, (0, 0, 0), font_thickness, cv2.LINE_AA)
-
-        person_count = len(detections)
-
-        # Draw total people counter at top-left with responsive font size and background
-        total_text = f"Total People: {person_count}"
-        total_font_scale = max(0.8, min(2.0, output_image.shape[1] / 1000.0))
-        total_thickness = max(1, int(round(total_font_scale * 2)))
-        (t_w, t_h), _ = cv2.getTextSize(total_text, cv2.FONT_HERSHEY_DUPLEX, total_font_scale, total_thickness)
-        box_x1, box_y1 = 10, 10
-        box_x2, box_y2 = box_x1 + t_w + 20, box_y1 + t_h + 18
-        # use the same yellow background for counter
-        cv2.rectangle(output_image, (box_x1, box_y1), (box_x2, box_y2), (255, 255, 0), -1)
-        # draw black text for counter
-        cv2.putText(output_image, total_text, (box_x1 + 8, box_y1 + t_h + 4), cv2.FONT_HERSHEY_DUPLEX, total_font_scale, (0, 0, 0), total_thickness, cv2.LINE_AA)
-
-        return output_image, time_consumed, person_count
-
-        
+        return detections
+
+    def render(self, image, detections, labels=None):
+        """Draw head regions, labels and the total counter on a copy of `image` (see `render_detections`)."""
+        return render_detections(image, detections, labels)
 
     def process_video(
         self,
@@ -217,6 +725,13 @@ class Detector:
         skip_frames: int = 0,
         duration_seconds: float | None = None,
         show_progress: bool = True,
+        motion_gate: bool | MotionGate = False,
+        return_counts: bool = False,
+        track: bool | Tracker = False,
+        keyframe_interval: int = 5,
+        pipelined: bool = False,
+        batch_size: int = 1,
+        queue_size: int = 8,
     ):
         """Process a video file or camera stream frame-by-frame.
 
@@ -228,10 +743,28 @@ class Detector:
             max_width: if set, resize display frames to this width for viewing.
             duration_seconds: if set, process only the first N seconds of video.
             show_progress: if True, print periodic progress updates to console.
+            motion_gate: True (default MotionGate) or a MotionGate instance; frames with too
+                little change since the last inference reuse the cached detections, which are
+                re-drawn on the current frame.
+            return_counts: if True, include the per-frame person counts in the summary.
+            track: True (default Tracker) or a Tracker instance; the detector then only runs on
+                every `keyframe_interval`-th frame, boxes are carried forward by the tracker in
+                between, and labels show stable track ids instead of per-frame numbering.
+                Replaces `skip_frames` when enabled.
+            keyframe_interval: frames per detector run in tracking mode.
+            pipelined: if True, decode, inference and annotate+encode run as overlapping threads
+                connected by bounded queues (see pipeline.py). Ignored when `show` is set, since
+                OpenCV windows must be driven from a single thread.
+            batch_size: frames per `detect_batch` call in pipelined mode.
+            queue_size: capacity of each inter-stage queue in pipelined mode.
 
         Returns:
-            dict with summary: {'frames': int, 'avg_fps': float, 'processed_path': str|None}
+            dict with summary: {'frames': int, 'avg_fps': float, 'processed_path': str|None, 'fps': float (source),
+            'motion_skipped': int, 'motion_skip_fraction': float, 'tracks': int, 'counts': list[int] (if requested)}
+            Pipelined runs add 'wall_time', 'throughput_fps', and per-stage 'stages' / 'queues' stats.
         """
+        gate = MotionGate() if motion_gate is True else (motion_gate or None)
+        tracker = Tracker() if track is True else (track or None)
         # allow passing integer-like sources
         cap_source = int(source) if isinstance(source, str) and source.isdigit() else source
         cap = cv2.VideoCapture(cap_source)
@@ -257,10 +790,38 @@ class Detector:
             fourcc = cv2.VideoWriter_fourcc(*('mp4v' if ext == 'mp4' else 'XVID'))
             writer = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
 
+        if pipelined and not show:
+            try:
+                summary = run_video_pipeline(
+                    self, cap, writer,
+                    confidence_threshold=confidence_threshold,
+                    skip_frames=skip_frames,
+                    frames_limit=frames_limit,
+                    duration_seconds=duration_seconds,
+                    gate=gate,
+                    tracker=tracker,
+                    keyframe_interval=keyframe_interval,
+                    batch_size=batch_size,
+                    queue_size=queue_size,
+                    show_progress=show_progress,
+                    return_counts=return_counts,
+                )
+            finally:
+                cap.release()
+                if writer:
+                    writer.release()
+            summary['processed_path'] = output_path
+            summary['fps'] = fps
+            return summary
+
         frame_count = 0
         processed_count = 0
         total_proc_time = 0.0
         last_out_frame = None
+        last_detections = None
+        track_ids = None
+        motion_skipped = 0
+        counts = []
         start_wall = time.time()
         next_report = start_wall + 1.0
         progress_interval = 1.0
@@ -277,23 +838,46 @@ class Detector:
                 if frames_limit is not None and frame_count > frames_limit:
                     break
 
-                # decide whether to run detection on this frame (skip_frames support)
+                # decide whether to run detection on this frame (keyframe / skip_frames support)
                 do_process = True
-                if skip_frames and skip_frames > 0:
+                if tracker is not None:
+                    do_process = (frame_count - 1) % max(1, keyframe_interval) == 0
+                elif skip_frames and skip_frames > 0:
                     # process every (skip_frames + 1)-th frame
                     do_process = (frame_count - 1) % (skip_frames + 1) == 0
 
-                if do_process:
+                if do_process and gate is not None and last_detections is not None and not gate.should_infer(frame):
+                    # static scene: re-draw the cached detections instead of running the model
+                    motion_skipped += 1
+                    if tracker is not None:
+                        last_detections, track_ids = tracker.predict()
+                    out_frame = self.render(frame, last_detections, track_ids)
+                    last_out_frame = out_frame
+                elif do_process:
+                    if gate is not None and last_detections is None:
+                        gate.should_infer(frame)  # first frame becomes the gate's reference
                     start = time.time()
-                    out_frame, inf_time, person_count = self.detect(frame, confidence_threshold=confidence_threshold)
+                    last_detections, inf_time, person_count = self.detect(
+                        frame, confidence_threshold=confidence_threshold, return_image=False)
+                    if tracker is not None:
+                        last_detections, track_ids = tracker.update(last_detections)
+                    out_frame = self.render(frame, last_detections, track_ids)
                     proc_time = time.time() - start
                     total_proc_time += proc_time
                     processed_count += 1
                     last_out_frame = out_frame
+                elif tracker is not None:
+                    # between keyframes the tracker carries the boxes forward
+                    last_detections, track_ids = tracker.predict()
+                    out_frame = self.render(frame, last_detections, track_ids)
+                    last_out_frame = out_frame
                 else:
                     # reuse last processed frame for display/save if available, else use original
                     out_frame = last_out_frame if last_out_frame is not None else frame
 
+                if return_counts:
+                    counts.append(len(last_detections) if last_detections is not None else 0)
+
                 if writer:
                     # ensure we write the same size as original capture
                     writer.write(out_frame)
@@ -333,7 +917,16 @@ class Detector:
                 cv2.destroyAllWindows()
 
         avg_fps = processed_count / total_proc_time if total_proc_time > 0 else 0.0
-        return {'frames': frame_count, 'processed_frames': processed_count, 'avg_fps': avg_fps, 'processed_path': output_path}
+        summary = {'frames': frame_count, 'processed_frames': processed_count, 'avg_fps': avg_fps, 'processed_path': output_path, 'fps': fps}
+        if gate is not None:
+            gated = processed_count + motion_skipped
+            summary['motion_skipped'] = motion_skipped
+            summary['motion_skip_fraction'] = motion_skipped / gated if gated else 0.0
+        if tracker is not None:
+            summary['tracks'] = tracker.total_tracks
+        if return_counts:
+            summary['counts'] = counts
+        return summary
 
 
 # convenience wrapper
@@ -0,0 +1,139 @@
+"""Export a detection backend to TorchScript or ONNX and check it against eager PyTorch.
+
+Run from the Detection folder:
+    python export.py --format torchscript --out ./models/frcnn.ts
+    python export.py --format onnx --out ./models/frcnn.onnx --check ./assets/people.jpg ./assets/people_1.jpg
+
+Then serve it with:
+    Detector(runtime="torchscript", artifact="./models/frcnn.ts", num_threads=4)
+"""
+
+import argparse
+import os
+import time
+
+import cv2
+import torch
+from torchvision.transforms import functional as F
+
+from detect import BACKENDS, Detector
+
+
+def export_torchscript(detector: Detector, path: str):
+    """Script the eager model and save it; torchvision detectors are scriptable as-is."""
+    scripted = torch.jit.script(detector.model.eval())
+    scripted.save(path)
+    return path
+
+
+def export_onnx(detector: Detector, path: str, sample_image, opset: int = 11):
+    """Trace the eager model on `sample_image` and save an ONNX graph with dynamic height/width."""
+    model = detector.model.eval()
+    sample = F.to_tensor(sample_image).to(detector.device)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            ([sample],),
+            path,
+            opset_version=opset,
+            input_names=['image'],
+            output_names=['boxes', 'labels', 'scores'],
+            dynamic_axes={
+                'image': {1: 'height', 2: 'width'},
+                'boxes': {0: 'detections'},
+                'labels': {0: 'detections'},
+                'scores': {0: 'detections'},
+            },
+        )
+    return path
+
+
+def compare_outputs(reference: Detector, candidate: Detector, images, min_score: float = 0.3, atol: float = 1e-2):
+    """Compare raw person outputs of two detectors image by image.
+
+    Boxes scoring at least `min_score` in the reference must be matched by the
+    candidate with the same count, and box/score differences must stay within
+    `atol` (boxes are compared after dividing by the image size).
+
+    Returns a list of per-image dicts and whether all images passed.
+    """
+    report = []
+    ok = True
+    for img in images:
+        ref = reference._forward([img])[0][0]
+        cand = candidate._forward([img])[0][0]
+        h, w = img.shape[:2]
+        scale = torch.tensor([w, h, w, h], dtype=torch.float32)
+
+        def persons(out):
+            keep = (out['labels'] == 1) & (out['scores'] >= min_score)
+            order = torch.argsort(out['scores'][keep], descending=True)
+            return out['boxes'][keep][order].float() / scale, out['scores'][keep][order].float()
+
+        ref_boxes, ref_scores = persons(ref)
+        cand_boxes, cand_scores = persons(cand)
+        same_count = len(ref_boxes) == len(cand_boxes)
+        box_diff = score_diff = float('nan')
+        if same_count and len(ref_boxes):
+            box_diff = float((ref_boxes - cand_boxes).abs().max())
+            score_diff = float((ref_scores - cand_scores).abs().max())
+        passed = same_count and (len(ref_boxes) == 0 or (box_diff <= atol and score_diff <= atol))
+        ok = ok and passed
+        report.append({
+            'reference_count': len(ref_boxes),
+            'candidate_count': len(cand_boxes),
+            'max_box_diff': box_diff,
+            'max_score_diff': score_diff,
+            'passed': passed,
+        })
+    return report, ok
+
+
+def time_detector(det: Detector, image, runs: int = 5):
+    det.detect(image, return_image=False)
+    start = time.time()
+    for _ in range(runs):
+        det.detect(image, return_image=False)
+    return (time.time() - start) / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--format', choices=['torchscript', 'onnx'], required=True)
+    parser.add_argument('--backend', default='frcnn', choices=[b for b in BACKENDS if b != 'yolov8n'])
+    parser.add_argument('--out', required=True)
+    parser.add_argument('--sample', default='./assets/people.jpg', help='image used to trace the ONNX graph')
+    parser.add_argument('--check', nargs='*', default=['./assets/people.jpg', './assets/people_1.jpg'],
+                        help='images used to compare the artifact with the eager model')
+    parser.add_argument('--num-threads', type=int, default=None)
+    parser.add_argument('--atol', type=float, default=1e-2)
+    args = parser.parse_args()
+
+    eager = Detector(device='cpu', backend=args.backend, num_threads=args.num_threads)
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    if args.format == 'torchscript':
+        export_torchscript(eager, args.out)
+    else:
+        sample = cv2.imread(args.sample)
+        if sample is None:
+            raise FileNotFoundError(f"Image not found at {args.sample}")
+        export_onnx(eager, args.out, sample)
+    print(f"Exported {args.backend} to {args.out}")
+
+    images = [img for img in (cv2.imread(p) for p in args.check) if img is not None]
+    if not images:
+        return
+    exported = Detector(device='cpu', backend=args.backend, runtime=args.format, artifact=args.out, num_threads=args.num_threads)
+    report, ok = compare_outputs(eager, exported, images, atol=args.atol)
+    for path, r in zip(args.check, report):
+        print(f"{path}: eager {r['reference_count']} vs {args.format} {r['candidate_count']} persons, "
+              f"max box diff {r['max_box_diff']:.4f}, max score diff {r['max_score_diff']:.4f} -> "
+              f"{'ok' if r['passed'] else 'MISMATCH'}")
+    print(f"eager {time_detector(eager, images[0]):.3f}s/frame, "
+          f"{args.format} {time_detector(exported, images[0]):.3f}s/frame")
+    if not ok:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
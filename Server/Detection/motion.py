@@ -0,0 +1,108 @@
+import time
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """Cheap change detector that decides when a frame needs full inference.
+
+    Frames are downscaled to `width` pixels wide, converted to blurred
+    grayscale and compared with the frame that was last sent to the model
+    ("diff"), or fed to a MOG2 background subtractor ("mog2"). Inference is
+    requested when at least `min_changed_fraction` of the pixels changed, or
+    when the cached detections are older than `max_stale_frames` checks or
+    `max_stale_seconds`.
+
+    Usage:
+        gate = MotionGate()
+        if gate.should_infer(frame):
+            detections = ...  # run the detector
+        else:
+            ...               # reuse the cached detections
+    """
+
+    def __init__(
+        self,
+        width: int = 160,
+        pixel_threshold: int = 25,
+        min_changed_fraction: float = 0.01,
+        max_stale_frames: int | None = 30,
+        max_stale_seconds: float | None = None,
+        method: str = "diff",
+    ):
+        if method not in ("diff", "mog2"):
+            raise ValueError(f"Unknown motion method {method!r}; choose 'diff' or 'mog2'")
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_fraction = min_changed_fraction
+        self.max_stale_frames = max_stale_frames
+        self.max_stale_seconds = max_stale_seconds
+        self.method = method
+        self._subtractor = (
+            cv2.createBackgroundSubtractorMOG2(history=200, varThreshold=16, detectShadows=False)
+            if method == "mog2" else None
+        )
+        self._reference = None
+        self._last_infer_at = 0.0
+        self._since_infer = 0
+        self.checked = 0
+        self.skipped = 0
+        self.last_changed_fraction = 0.0
+
+    def _small_gray(self, frame):
+        h, w = frame.shape[:2]
+        if w > self.width:
+            frame = cv2.resize(frame, (self.width, max(1, int(h * self.width / w))), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def changed_fraction(self, small) -> float:
+        if self._subtractor is not None:
+            mask = self._subtractor.apply(small)
+            return float(np.count_nonzero(mask)) / mask.size
+        if self._reference is None or self._reference.shape != small.shape:
+            return 1.0
+        diff = cv2.absdiff(small, self._reference)
+        return float(np.count_nonzero(diff > self.pixel_threshold)) / diff.size
+
+    def should_infer(self, frame, update_reference: bool = True) -> bool:
+        """Return True when `frame` needs inference; the gate then treats it as the new reference.
+
+        With `update_reference=False` the reference is left alone, for callers that only know later
+        whether the frame was actually inferred; they call `set_reference` once its result exists.
+        """
+        small = self._small_gray(frame)
+        self.checked += 1
+        self._since_infer += 1
+        self.last_changed_fraction = self.changed_fraction(small)
+        stale = (
+            (self.max_stale_frames is not None and self._since_infer > self.max_stale_frames)
+            or (self.max_stale_seconds is not None and time.monotonic() - self._last_infer_at >= self.max_stale_seconds)
+        )
+        if self._reference is None or stale or self.last_changed_fraction >= self.min_changed_fraction:
+            if update_reference:
+                self._set_reference(small)
+            return True
+        self.skipped += 1
+        return False
+
+    def _set_reference(self, small):
+        self._reference = small
+        self._last_infer_at = time.monotonic()
+        self._since_infer = 0
+
+    def set_reference(self, frame):
+        """Make `frame` (whose detections are now cached) the frame later ones are compared with."""
+        self._set_reference(self._small_gray(frame))
+
+    def reset(self):
+        """Force inference on the next frame (e.g. after the cached result was lost)."""
+        self._reference = None
+
+    def stats(self) -> dict:
+        return {
+            'checked': self.checked,
+            'skipped': self.skipped,
+            'skip_fraction': self.skipped / self.checked if self.checked else 0.0,
+        }
@@ -0,0 +1,53 @@
+"""Measure how many inferences the motion gate skips and how far the counts drift.
+
+Run from the Detection folder:
+    python motion_report.py path/to/store_camera.mp4 --duration 60
+    python motion_report.py path/to/clip.mp4 --method mog2 --min-changed 0.02 --max-stale 60
+
+The video is processed twice: once with inference on every frame (the
+reference) and once through the motion gate. Drift is the per-frame
+difference between the gated count and the reference count.
+"""
+
+import argparse
+
+from detect import Detector
+from motion import MotionGate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source')
+    parser.add_argument('--duration', type=float, default=None, help='seconds of video to process')
+    parser.add_argument('--confidence', type=float, default=0.8)
+    parser.add_argument('--method', choices=['diff', 'mog2'], default='diff')
+    parser.add_argument('--min-changed', type=float, default=0.01, help='fraction of changed pixels that triggers inference')
+    parser.add_argument('--pixel-threshold', type=int, default=25)
+    parser.add_argument('--max-stale', type=int, default=30, help='max frames between inferences')
+    args = parser.parse_args()
+
+    det = Detector()
+    common = dict(confidence_threshold=args.confidence, duration_seconds=args.duration, show_progress=False, return_counts=True)
+    reference = det.process_video(args.source, **common)
+    gate = MotionGate(
+        pixel_threshold=args.pixel_threshold,
+        min_changed_fraction=args.min_changed,
+        max_stale_frames=args.max_stale,
+        method=args.method,
+    )
+    gated = det.process_video(args.source, motion_gate=gate, **common)
+
+    drift = [g - r for g, r in zip(gated['counts'], reference['counts'])]
+    n = len(drift)
+    mean_abs = sum(abs(d) for d in drift) / n if n else 0.0
+    exact = sum(1 for d in drift if d == 0) / n if n else 0.0
+    print(f"frames: {n}")
+    print(f"inferences: reference {reference['processed_frames']}, gated {gated['processed_frames']} "
+          f"(skipped {gated['motion_skipped']}, {gated['motion_skip_fraction']:.1%})")
+    print(f"model fps: reference {reference['avg_fps']:.2f}, gated {gated['avg_fps']:.2f}")
+    print(f"count drift: mean |diff| {mean_abs:.3f}, max |diff| {max((abs(d) for d in drift), default=0)}, "
+          f"exact match {exact:.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+"""Staged, multi-threaded video processing for `Detector.process_video(pipelined=True)`.
+
+    decode thread --(decoded queue)--> inference (calling thread) --(annotated queue)--> annotate/encode thread
+
+Decoding (`cap.read()`) and annotation + encoding (`render`, `writer.write()`)
+overlap with inference instead of waiting on it. OpenCV and PyTorch release
+the GIL in their heavy calls, so the stages really run in parallel. Queues
+are bounded, so memory stays flat, and each stage has a single producer and
+consumer, so frame order is preserved.
+
+Which frames need the model (keyframes, `skip_frames`, motion gate) is
+decided in order as frames arrive. Up to `batch_size` frames that need
+inference are then run in a single `detect_batch` call, and the frames in
+between are filled in from the batch results (reused detections or tracker
+predictions). Frames whose detections are already known (nothing waiting
+for inference before them) go straight to the encoder; only frames that
+depend on a pending inference are buffered, and a partial batch is run
+once `queue_size` frames are buffered, so sparse keyframes do not hold
+`batch_size x keyframe_interval` frames in memory.
+"""
+
+import queue
+import threading
+import time
+
+_END = object()
+
+
+class StageStats:
+    """Items processed and busy time for one stage."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self.calls = 0
+
+    def add(self, seconds: float, items: int = 1):
+        self.busy += seconds
+        self.items += items
+        self.calls += 1
+
+    def summary(self) -> dict:
+        return {
+            'items': self.items,
+            'calls': self.calls,
+            'busy_s': self.busy,
+            'items_per_s': self.items / self.busy if self.busy > 0 else 0.0,
+        }
+
+
+class MonitoredQueue(queue.Queue):
+    """Bounded queue that samples its occupancy on every put."""
+
+    def __init__(self, maxsize: int):
+        super().__init__(maxsize)
+        self.samples = 0
+        self.total = 0
+        self.peak = 0
+        self.blocked_puts = 0
+
+    def put(self, item, block=True, timeout=None):
+        size = self.qsize()
+        self.samples += 1
+        self.total += size
+        self.peak = max(self.peak, size)
+        if size >= self.maxsize:
+            self.blocked_puts += 1
+        super().put(item, block, timeout)
+
+    def summary(self) -> dict:
+        return {
+            'capacity': self.maxsize,
+            'mean_occupancy': self.total / self.samples if self.samples else 0.0,
+            'peak_occupancy': self.peak,
+            'full_on_put': self.blocked_puts,
+        }
+
+
+def _put(q, item, stop):
+    # never block forever on a full queue once another stage has failed
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def run_video_pipeline(
+    detector,
+    cap,
+    writer=None,
+    confidence_threshold: float = 0.8,
+    skip_frames: int = 0,
+    frames_limit: int | None = None,
+    duration_seconds: float | None = None,
+    gate=None,
+    tracker=None,
+    keyframe_interval: int = 5,
+    batch_size: int = 1,
+    queue_size: int = 8,
+    show_progress: bool = True,
+    return_counts: bool = False,
+):
+    """Run decode / inference / annotate+encode as overlapping stages. Returns a summary dict."""
+    batch_size = max(1, int(batch_size))
+    decoded = MonitoredQueue(queue_size)
+    annotated = MonitoredQueue(queue_size)
+    stop = threading.Event()
+    errors = []
+    decode_stats, infer_stats, encode_stats = StageStats('decode'), StageStats('infer'), StageStats('encode')
+    start_wall = time.time()
+
+    def decode():
+        try:
+            index = 0
+            while not stop.is_set():
+                t0 = time.perf_counter()
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                index += 1
+                if frames_limit is not None and index > frames_limit:
+                    break
+                decode_stats.add(time.perf_counter() - t0)
+                if not _put(decoded, (index, frame), stop):
+                    break
+                if duration_seconds is not None and (time.time() - start_wall) >= duration_seconds:
+                    break
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _put(decoded, _END, stop)
+
+    def encode():
+        try:
+            while True:
+                item = annotated.get()
+                if item is _END:
+                    break
+                frame, detections, ids = item
+                t0 = time.perf_counter()
+                out_frame = detector.render(frame, detections, ids)
+                if writer:
+                    writer.write(out_frame)
+                encode_stats.add(time.perf_counter() - t0)
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+
+    decoder = threading.Thread(target=decode, name='video-decode', daemon=True)
+    encoder = threading.Thread(target=encode, name='video-encode', daemon=True)
+    decoder.start()
+    encoder.start()
+
+    frame_count = 0
+    processed_count = 0
+    motion_skipped = 0
+    counts = []
+    last_detections = None
+    track_ids = None
+    next_report = start_wall + 1.0
+
+    def emit(frame, kind, result=None) -> bool:
+        """Resolve one frame's detections (in frame order) and hand it to the encoder."""
+        nonlocal last_detections, track_ids, motion_skipped
+        if kind == 'infer':
+            last_detections = result[0]
+            if tracker is not None:
+                last_detections, track_ids = tracker.update(last_detections)
+        else:
+            if kind == 'motion':
+                motion_skipped += 1
+            if tracker is not None:
+                last_detections, track_ids = tracker.predict()
+        if return_counts:
+            counts.append(len(last_detections) if last_detections is not None else 0)
+        return _put(annotated, (frame, last_detections or [], track_ids), stop)
+
+    def flush(chunk):
+        """Infer the frames in `chunk` that need it (one batch), then emit the chunk in order."""
+        nonlocal processed_count
+        to_infer = [frame for frame, kind in chunk if kind == 'infer']
+        results = []
+        if to_infer:
+            t0 = time.perf_counter()
+            results = detector.detect_batch(to_infer, confidence_threshold=confidence_threshold, return_image=False)
+            infer_stats.add(time.perf_counter() - t0, len(to_infer))
+            processed_count += len(to_infer)
+        results = iter(results)
+        for frame, kind in chunk:
+            if not emit(frame, kind, next(results) if kind == 'infer' else None):
+                return
+
+    try:
+        chunk = []
+        pending_infer = 0
+        while not stop.is_set():
+            try:
+                item = decoded.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _END:
+                break
+            index, frame = item
+            frame_count = index
+
+            if tracker is not None:
+                do_process = (index - 1) % max(1, keyframe_interval) == 0
+            elif skip_frames and skip_frames > 0:
+                do_process = (index - 1) % (skip_frames + 1) == 0
+            else:
+                do_process = True
+
+            first = index == 1
+            if do_process and gate is not None and not first and not gate.should_infer(frame):
+                kind = 'motion'
+            elif do_process or first:
+                if gate is not None and first:
+                    gate.should_infer(frame)  # first frame becomes the gate's reference
+                kind = 'infer'
+                pending_infer += 1
+            else:
+                kind = 'reuse'
+
+            if not chunk and kind != 'infer':
+                # nothing pending before this frame: its detections are known now
+                emit(frame, kind)
+            else:
+                chunk.append((frame, kind))
+            if pending_infer >= batch_size or len(chunk) >= max(batch_size, queue_size):
+                flush(chunk)
+                chunk, pending_infer = [], 0
+
+            if show_progress and time.time() >= next_report:
+                elapsed = time.time() - start_wall
+                model_fps = infer_stats.items / infer_stats.busy if infer_stats.busy > 0 else 0.0
+                print(f"Progress: read {frame_count} frames, processed {processed_count}, model_fps {model_fps:.2f}, "
+                      f"elapsed {elapsed:.1f}s, queues decoded {decoded.qsize()}/{queue_size} annotated {annotated.qsize()}/{queue_size}")
+                next_report = time.time() + 1.0
+        if chunk and not stop.is_set():
+            flush(chunk)
+    except Exception:
+        stop.set()
+        raise
+    finally:
+        while encoder.is_alive():
+            try:
+                annotated.put(_END, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        encoder.join()
+        stop.set()  # the decoder has already finished unless another stage failed
+        decoder.join()
+
+    if errors:
+        raise errors[0]
+
+    wall = time.time() - start_wall
+    summary = {
+        'frames': frame_count,
+        'processed_frames': processed_count,
+        'avg_fps': infer_stats.items / infer_stats.busy if infer_stats.busy > 0 else 0.0,
+        'wall_time': wall,
+        'throughput_fps': frame_count / wall if wall > 0 else 0.0,
+        'stages': {s.name: s.summary() for s in (decode_stats, infer_stats, encode_stats)},
+        'queues': {'decoded': decoded.summary(), 'annotated': annotated.summary()},
+    }
+    if gate is not None:
+        gated = processed_count + motion_skipped
+        summary['motion_skipped'] = motion_skipped
+        summary['motion_skip_fraction'] = motion_skipped / gated if gated else 0.0
+    if tracker is not None:
+        summary['tracks'] = tracker.total_tracks
+    if return_counts:
+        summary['counts'] = counts
+    return summary
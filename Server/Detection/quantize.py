@@ -0,0 +1,98 @@
+"""Post-training int8 quantization for CPU inference of torchvision detectors.
+
+- "dynamic": int8 weights with dynamically quantized activations for every
+  `nn.Linear` (the Faster R-CNN box head's fc6/fc7 hold most of its FLOPs
+  after the backbone). No calibration needed.
+- "static": the ResNet backbone body is quantized with FX graph mode after
+  folding its FrozenBatchNorm layers into the preceding convolutions, then
+  calibrated by running the full model over a local image set. The FPN,
+  RPN and heads stay in fp32.
+"""
+
+import glob
+import os
+
+import cv2
+import torch
+from torch import nn
+from torchvision.ops.misc import FrozenBatchNorm2d
+from torchvision.transforms import functional as F
+
+QUANTIZE_MODES = ('dynamic', 'static')
+DEFAULT_CALIBRATION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets')
+
+
+def load_calibration_images(source=None, limit: int = 32):
+    """Return BGR images from a list of arrays, a directory, a glob pattern or the bundled assets."""
+    if source is None:
+        source = DEFAULT_CALIBRATION_DIR
+    if isinstance(source, str):
+        pattern = os.path.join(source, '*') if os.path.isdir(source) else source
+        paths = sorted(p for p in glob.glob(pattern) if p.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp')))
+        images = [img for img in (cv2.imread(p) for p in paths[:limit]) if img is not None]
+    else:
+        images = list(source)[:limit]
+    if not images:
+        raise ValueError(f"no calibration images found in {source!r}")
+    return images
+
+
+def quantize_dynamic(model: nn.Module) -> nn.Module:
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def _fold_frozen_bn(conv: nn.Conv2d, bn: FrozenBatchNorm2d):
+    scale = bn.weight * (bn.running_var + bn.eps).rsqrt()
+    shift = bn.bias - bn.running_mean * scale
+    conv.weight.data.mul_(scale.reshape(-1, 1, 1, 1))
+    bias = conv.bias.data * scale + shift if conv.bias is not None else shift
+    conv.bias = nn.Parameter(bias)
+
+
+def fold_frozen_batchnorm(module: nn.Module):
+    """Fold every FrozenBatchNorm2d into the conv that feeds it (ResNet naming: convN/bnN, downsample[0]/[1])."""
+    for parent in module.modules():
+        children = dict(parent.named_children())
+        for name, child in children.items():
+            if not isinstance(child, FrozenBatchNorm2d):
+                continue
+            if name.startswith('bn'):
+                conv = children.get('conv' + name[2:])
+            elif name.isdigit():
+                conv = children.get(str(int(name) - 1))
+            else:
+                conv = None
+            if isinstance(conv, nn.Conv2d):
+                _fold_frozen_bn(conv, child)
+                setattr(parent, name, nn.Identity())
+    return module
+
+
+def quantize_static(model: nn.Module, calibration_images, backend: str = 'x86') -> nn.Module:
+    """Quantize `model.backbone.body` in place and calibrate it with `calibration_images`."""
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    body = getattr(getattr(model, 'backbone', None), 'body', None)
+    if body is None:
+        raise ValueError("static quantization needs a model with a ResNet `backbone.body` (frcnn or retinanet)")
+    torch.backends.quantized.engine = 'x86' if backend == 'x86' else backend
+    fold_frozen_batchnorm(body)
+    example = (torch.randn(1, 3, 224, 224),)
+    prepared = prepare_fx(body, get_default_qconfig_mapping(backend), example_inputs=example)
+    model.backbone.body = prepared
+    with torch.no_grad():
+        for img in calibration_images:
+            model([F.to_tensor(img)])
+    model.backbone.body = convert_fx(prepared)
+    return model
+
+
+def quantize_model(model: nn.Module, mode: str, calibration_images=None) -> nn.Module:
+    """Apply int8 post-training quantization (`mode` is "dynamic" or "static") to a CPU model."""
+    if mode not in QUANTIZE_MODES:
+        raise ValueError(f"Unknown quantize mode {mode!r}; choose one of {QUANTIZE_MODES}")
+    model.eval()
+    if mode == 'dynamic':
+        return quantize_dynamic(model)
+    return quantize_static(model, load_calibration_images(calibration_images))
@@ -0,0 +1,61 @@
+"""Report int8 speedup and person-count change versus fp32 on the bundled assets.
+
+Run from the Detection folder:
+    python quantize_report.py
+    python quantize_report.py --modes dynamic --images ./assets/people.jpg --calibration ./calib/
+"""
+
+import argparse
+import glob
+import os
+import statistics
+import time
+
+import cv2
+from detect import Detector
+from quantize import DEFAULT_CALIBRATION_DIR, QUANTIZE_MODES
+
+
+def time_and_count(det: Detector, images, runs: int, confidence: float):
+    """Return (median seconds per image, person count per image)."""
+    counts = [det.detect(img, confidence_threshold=confidence, return_image=False)[2] for img in images]
+    latencies = []
+    for _ in range(runs):
+        for img in images:
+            start = time.time()
+            det.detect(img, confidence_threshold=confidence, return_image=False)
+            latencies.append(time.time() - start)
+    return statistics.median(latencies), counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', default='frcnn')
+    parser.add_argument('--modes', nargs='+', default=list(QUANTIZE_MODES), choices=QUANTIZE_MODES)
+    parser.add_argument('--images', nargs='+', default=None, help='defaults to the .jpg files in ./assets')
+    parser.add_argument('--calibration', default=DEFAULT_CALIBRATION_DIR, help='directory or glob for static calibration')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--confidence', type=float, default=0.8)
+    parser.add_argument('--num-threads', type=int, default=None)
+    args = parser.parse_args()
+
+    paths = args.images or sorted(glob.glob(os.path.join(DEFAULT_CALIBRATION_DIR, '*.jpg')))
+    images = [img for img in (cv2.imread(p) for p in paths) if img is not None]
+    if not images:
+        raise FileNotFoundError("no images to benchmark")
+
+    base = Detector(device='cpu', backend=args.backend, num_threads=args.num_threads)
+    base_t, base_counts = time_and_count(base, images, args.runs, args.confidence)
+    print(f"fp32      {base_t:.3f}s/image  counts {base_counts}")
+
+    for mode in args.modes:
+        det = Detector(device='cpu', backend=args.backend, num_threads=args.num_threads,
+                       quantize=mode, calibration_images=args.calibration)
+        t, counts = time_and_count(det, images, args.runs, args.confidence)
+        speedup = base_t / t if t > 0 else 0.0
+        drift = [c - b for c, b in zip(counts, base_counts)]
+        print(f"{mode:<9} {t:.3f}s/image  counts {counts}  speedup x{speedup:.2f}  count change vs fp32 {drift}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Benchmark the annotation renderer against the original drawing loop.
+
+Run from the Detection folder:
+    python render_bench.py
+    python render_bench.py --image ./assets/people.jpg --counts 10 50 200 --runs 50
+
+Detections are synthetic head boxes scattered over the frame (seeded, so
+runs are comparable). For each count it prints the mean / p50 time of
+`render_detections_legacy` and `render_detections`, the speed-up, and the
+largest per-pixel difference between their outputs.
+"""
+
+import argparse
+import statistics
+import time
+
+import cv2
+import numpy as np
+
+from render import render_detections, render_detections_legacy
+
+
+def synthetic_detections(width: int, height: int, n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    w = rng.integers(30, 120, n)
+    h = (w * rng.uniform(0.3, 0.6, n)).astype(int)
+    x1 = rng.integers(0, max(1, width - 120), n)
+    y1 = rng.integers(0, max(1, height - 80), n)
+    scores = rng.uniform(0.8, 1.0, n)
+    return [(int(a), int(b), int(a + c), int(b + d), float(s)) for a, b, c, d, s in zip(x1, y1, w, h, scores)]
+
+
+def time_renderer(fn, image, detections, runs: int):
+    fn(image, detections)  # warm-up (and the glyph cache, for the new renderer)
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(image, detections)
+        times.append(time.perf_counter() - start)
+    return statistics.mean(times), statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', default=None, help='background image (default: 1920x1080 noise)')
+    parser.add_argument('--counts', type=int, nargs='+', default=[10, 50, 200])
+    parser.add_argument('--runs', type=int, default=30)
+    args = parser.parse_args()
+
+    if args.image:
+        image = cv2.imread(args.image)
+        if image is None:
+            raise SystemExit(f"Unable to read image: {args.image}")
+    else:
+        image = np.random.default_rng(1).integers(0, 256, (1080, 1920, 3), dtype=np.uint8)
+    height, width = image.shape[:2]
+
+    print(f"frame {width}x{height}, {args.runs} runs per renderer")
+    print(f"{'detections':>10} {'legacy mean':>12} {'legacy p50':>11} {'new mean':>10} {'new p50':>9} {'speed-up':>9} {'max diff':>9}")
+    for n in args.counts:
+        detections = synthetic_detections(width, height, n)
+        legacy_mean, legacy_p50 = time_renderer(render_detections_legacy, image, detections, args.runs)
+        new_mean, new_p50 = time_renderer(render_detections, image, detections, args.runs)
+        diff = cv2.absdiff(render_detections_legacy(image, detections), render_detections(image, detections)).max()
+        print(f"{n:>10} {legacy_mean * 1000:>10.2f}ms {legacy_p50 * 1000:>9.2f}ms {new_mean * 1000:>8.2f}ms "
+              f"{new_p50 * 1000:>7.2f}ms {legacy_mean / new_mean:>8.2f}x {int(diff):>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""Polygon regions of interest (zones) and crop-only inference geometry.
+
+A camera usually only matters in a few places (aisles, entrances, checkout
+zones). A `ZoneSet` holds named polygons in normalised (0..1) frame
+coordinates, so one configuration works at any capture resolution.
+
+- `ZoneSet.regions(width, height)` gives the pixel rectangles around the
+  zones (with a margin, overlapping ones merged) that the detector should
+  look at, or None when they cover most of the frame anyway.
+- `pack_regions` copies those rectangles into one compact mosaic, so a
+  frame is still a single model input however many zones it has, and
+  pixels outside them never reach the model. Backends resize every input
+  to a fixed working size (800px short side for Faster R-CNN, 320/640 for
+  SSDLite/YOLO), so a mosaic of the zones also gives them more of the
+  model's resolution than the full frame would.
+- `ZoneSet.assign` keeps the detections whose centre lies inside a zone and
+  counts them per zone.
+
+Zones are configured per division (and optionally per camera) in JSON:
+
+    {
+      "showroom": [
+        {"name": "entrance", "polygon": [[0.02, 0.35], [0.30, 0.35], [0.30, 0.98], [0.02, 0.98]]},
+        {"name": "checkout", "polygon": [[0.60, 0.50], [0.97, 0.45], [0.97, 0.95], [0.62, 0.95]]}
+      ],
+      "warehouse/dock-2": [{"name": "dock", "polygon": [[0.1, 0.2], [0.9, 0.2], [0.9, 0.9], [0.1, 0.9]]}]
+    }
+"""
+
+import json
+
+import cv2
+import numpy as np
+
+ZONE_COLOR = (0, 200, 255)
+
+
+class ZoneSet:
+    """Named polygons (normalised x, y in 0..1) for one camera."""
+
+    def __init__(self, zones):
+        self.names = []
+        self.polygons = []
+        for zone in zones:
+            polygon = np.asarray(zone['polygon'], dtype=np.float64).reshape(-1, 2)
+            if len(polygon) < 3:
+                raise ValueError(f"zone {zone.get('name')!r} needs at least 3 points")
+            self.names.append(str(zone.get('name') or f'zone{len(self.names) + 1}'))
+            self.polygons.append(np.clip(polygon, 0.0, 1.0))
+
+    def __len__(self):
+        return len(self.polygons)
+
+    def pixel_polygons(self, width: int, height: int):
+        return [np.round(p * (width, height)).astype(np.int32) for p in self.polygons]
+
+    def regions(self, width: int, height: int, margin: float = 0.02, max_fraction: float = 0.8):
+        """Pixel rectangles (x0, y0, x1, y1) covering the zones, or None to use the full frame.
+
+        Each zone's bounding box is grown by `margin` (fraction of the frame) so people on a zone
+        edge are seen whole, and overlapping boxes are merged. When the boxes cover more than
+        `max_fraction` of the frame, cropping would not save anything and None is returned.
+        """
+        mx, my = margin * width, margin * height
+        rects = []
+        for p in self.polygons:
+            x0, y0 = p.min(axis=0) * (width, height)
+            x1, y1 = p.max(axis=0) * (width, height)
+            rects.append([max(0, int(x0 - mx)), max(0, int(y0 - my)),
+                          min(width, int(np.ceil(x1 + mx))), min(height, int(np.ceil(y1 + my)))])
+        rects = merge_rects(rects)
+        area = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in rects)
+        if area >= max_fraction * width * height:
+            return None
+        return [tuple(r) for r in rects]
+
+    def assign(self, detections, width: int, height: int):
+        """Keep the detections whose centre lies in a zone. Returns (kept, per-zone counts)."""
+        counts = {name: 0 for name in self.names}
+        if not detections:
+            return [], counts
+        boxes = np.asarray([d[:4] for d in detections], dtype=np.float64)
+        cx = (boxes[:, 0] + boxes[:, 2]) / 2.0 / max(1, width)
+        cy = (boxes[:, 1] + boxes[:, 3]) / 2.0 / max(1, height)
+        inside_any = np.zeros(len(detections), dtype=bool)
+        for name, polygon in zip(self.names, self.polygons):
+            inside = points_in_polygon(cx, cy, polygon)
+            counts[name] = int(inside.sum())
+            inside_any |= inside
+        return [d for d, keep in zip(detections, inside_any) if keep], counts
+
+    def draw(self, image, color=ZONE_COLOR, thickness: int = 2):
+        """Outline the zones on `image` in place."""
+        h, w = image.shape[:2]
+        cv2.polylines(image, self.pixel_polygons(w, h), True, color, thickness, cv2.LINE_AA)
+        return image
+
+
+def points_in_polygon(x, y, polygon):
+    """Vectorised even-odd rule: which of the points (x[i], y[i]) lie inside `polygon` ((N, 2) array)."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    inside = np.zeros(x.shape, dtype=bool)
+    px, py = polygon[:, 0], polygon[:, 1]
+    qx, qy = np.roll(px, 1), np.roll(py, 1)
+    for ax, ay, bx, by in zip(px, py, qx, qy):
+        crosses = (ay > y) != (by > y)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_cross = ax + (y - ay) * (bx - ax) / (by - ay)
+        inside ^= crosses & (x < x_cross)
+    return inside
+
+
+def merge_rects(rects):
+    """Union overlapping (x0, y0, x1, y1) rectangles until none overlap."""
+    rects = [list(r) for r in rects]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(rects)):
+            for j in range(i + 1, len(rects)):
+                a, b = rects[i], rects[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    rects[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del rects[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return rects
+
+
+def pack_regions(image, rects, gap: int = 16, fill: int = 114):
+    """Copy the `rects` of `image` into one mosaic (shelf packing, roughly square).
+
+    Returns (mosaic, placements) where each placement is (mx, my, x0, y0, x1, y1): the crop
+    `image[y0:y1, x0:x1]` sits at (mx, my) in the mosaic. Crops are separated by `gap` pixels
+    of `fill` so no detection spans two of them.
+    """
+    sizes = [(x1 - x0, y1 - y0) for x0, y0, x1, y1 in rects]
+    area = sum(w * h for w, h in sizes)
+    row_width = max(max(w for w, _ in sizes), int(np.sqrt(area)))
+    order = sorted(range(len(rects)), key=lambda k: -sizes[k][1])
+    placements = []
+    x = y = row_height = 0
+    for k in order:
+        w, h = sizes[k]
+        if x > 0 and x + w > row_width:
+            x, y, row_height = 0, y + row_height + gap, 0
+        placements.append((x, y, *rects[k]))
+        x += w + gap
+        row_height = max(row_height, h)
+    width = max(mx + (x1 - x0) for mx, _, x0, _, x1, _ in placements)
+    height = max(my + (y1 - y0) for _, my, _, y0, _, y1 in placements)
+    mosaic = np.full((height, width) + image.shape[2:], fill, dtype=image.dtype)
+    for mx, my, x0, y0, x1, y1 in placements:
+        mosaic[my:my + y1 - y0, mx:mx + x1 - x0] = image[y0:y1, x0:x1]
+    return mosaic, placements
+
+
+def load_zones(path: str) -> dict:
+    """Read a zone configuration file: {"<division>" or "<division>/<camera>": [{name, polygon}, ...]}."""
+    with open(path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    return {key: ZoneSet(zones) for key, zones in config.items() if zones}
@@ -0,0 +1,158 @@
+import numpy as np
+
+
+def iou_matrix(a, b):
+    """Pairwise IoU between (N, 4) and (M, 4) xyxy box arrays."""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0).astype(np.float32)
+
+
+def greedy_match(iou, threshold: float):
+    """Match rows to columns by descending IoU. Returns (matches (K, 2), unmatched rows, unmatched cols)."""
+    n, m = iou.shape
+    matches = []
+    if n and m:
+        rows, cols = np.nonzero(iou >= threshold)
+        order = np.argsort(-iou[rows, cols], kind='stable')
+        used_r = np.zeros(n, dtype=bool)
+        used_c = np.zeros(m, dtype=bool)
+        for r, c in zip(rows[order], cols[order]):
+            if not used_r[r] and not used_c[c]:
+                used_r[r] = used_c[c] = True
+                matches.append((r, c))
+    matches = np.array(matches, dtype=np.int64).reshape(-1, 2)
+    unmatched_rows = np.setdiff1d(np.arange(n), matches[:, 0])
+    unmatched_cols = np.setdiff1d(np.arange(m), matches[:, 1])
+    return matches, unmatched_rows, unmatched_cols
+
+
+def _xyxy_to_z(boxes):
+    w = boxes[:, 2] - boxes[:, 0]
+    h = boxes[:, 3] - boxes[:, 1]
+    return np.stack([boxes[:, 0] + w / 2, boxes[:, 1] + h / 2, w * h, w / np.maximum(h, 1e-6)], axis=1)
+
+
+def _x_to_xyxy(x):
+    s = np.clip(x[:, 2], 1e-6, None)
+    r = np.clip(x[:, 3], 1e-6, None)
+    w = np.sqrt(s * r)
+    h = s / np.maximum(w, 1e-6)
+    return np.stack([x[:, 0] - w / 2, x[:, 1] - h / 2, x[:, 0] + w / 2, x[:, 1] + h / 2], axis=1)
+
+
+class Tracker:
+    """SORT-style multi-object tracker with a constant-velocity Kalman filter, vectorized over tracks.
+
+    State per track is (cx, cy, area, aspect, vcx, vcy, varea). `update` is
+    called on keyframes with fresh detections; `predict` carries every track
+    forward one frame in between. Each track keeps a stable integer id.
+
+    Usage:
+        tracker = Tracker()
+        tracks, ids = tracker.update(detections)   # keyframe
+        tracks, ids = tracker.predict()            # frames in between
+    """
+
+    # constant-velocity model: position += velocity each frame (aspect ratio is static)
+    _F = np.eye(7)
+    _F[0, 4] = _F[1, 5] = _F[2, 6] = 1.0
+    _H = np.eye(4, 7)
+    _Q = np.diag([1.0, 1.0, 1.0, 1e-4, 1e-2, 1e-2, 1e-4])
+    _R = np.diag([1.0, 1.0, 10.0, 1e-2])
+    _P0 = np.diag([10.0, 10.0, 10.0, 10.0, 1e4, 1e4, 1e4])
+
+    def __init__(self, iou_threshold: float = 0.3, max_age: int = 2, min_hits: int = 1):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age  # keyframes a track may go unmatched before it is dropped
+        self.min_hits = min_hits
+        self.x = np.zeros((0, 7))
+        self.P = np.zeros((0, 7, 7))
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.scores = np.zeros(0)
+        self.hits = np.zeros(0, dtype=np.int64)
+        self.misses = np.zeros(0, dtype=np.int64)
+        self._next_id = 1
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def total_tracks(self) -> int:
+        """Number of distinct ids handed out so far."""
+        return self._next_id - 1
+
+    def _predict(self):
+        if not len(self):
+            return
+        # a shrinking box must not go negative: freeze area velocity when it would
+        collapse = self.x[:, 2] + self.x[:, 6] <= 0
+        self.x[collapse, 6] = 0.0
+        self.x = self.x @ self._F.T
+        self.P = np.einsum('ij,njk,lk->nil', self._F, self.P, self._F) + self._Q
+
+    def _correct(self, idx, z):
+        H, R = self._H, self._R
+        x, P = self.x[idx], self.P[idx]
+        y = z - x @ H.T
+        S = np.einsum('ij,njk,lk->nil', H, P, H) + R
+        K = P @ H.T @ np.linalg.inv(S)
+        self.x[idx] = x + np.einsum('nij,nj->ni', K, y)
+        self.P[idx] = (np.eye(7) - K @ H) @ P
+
+    def _output(self):
+        # tracks that missed the last keyframe are hidden, but survive `max_age` keyframes for re-association
+        visible = (self.hits >= self.min_hits) & (self.misses == 0)
+        boxes = _x_to_xyxy(self.x[visible]) if len(self) else np.zeros((0, 4))
+        tracks = [
+            (int(b[0]), int(b[1]), int(b[2]), int(b[3]), float(s))
+            for b, s in zip(boxes, self.scores[visible])
+        ]
+        return tracks, [int(i) for i in self.ids[visible]]
+
+    def predict(self):
+        """Advance all tracks by one frame without measurements. Returns (tracks, ids)."""
+        self._predict()
+        return self._output()
+
+    def update(self, detections):
+        """Advance one frame and correct with `detections` [(x1, y1, x2, y2, score), ...]. Returns (tracks, ids)."""
+        self._predict()
+        dets = np.asarray([d[:4] for d in detections], dtype=np.float64).reshape(-1, 4)
+        scores = np.asarray([d[4] for d in detections], dtype=np.float64)
+
+        predicted = _x_to_xyxy(self.x) if len(self) else np.zeros((0, 4))
+        matches, lost, new = greedy_match(iou_matrix(predicted, dets), self.iou_threshold)
+
+        if len(matches):
+            t, d = matches[:, 0], matches[:, 1]
+            self._correct(t, _xyxy_to_z(dets[d]))
+            self.scores[t] = scores[d]
+            self.hits[t] += 1
+            self.misses[t] = 0
+        self.misses[lost] += 1
+
+        if len(new):
+            n = len(new)
+            x = np.zeros((n, 7))
+            x[:, :4] = _xyxy_to_z(dets[new])
+            self.x = np.concatenate([self.x, x])
+            self.P = np.concatenate([self.P, np.repeat(self._P0[None], n, axis=0)])
+            self.ids = np.concatenate([self.ids, np.arange(self._next_id, self._next_id + n)])
+            self._next_id += n
+            self.scores = np.concatenate([self.scores, scores[new]])
+            self.hits = np.concatenate([self.hits, np.ones(n, dtype=np.int64)])
+            self.misses = np.concatenate([self.misses, np.zeros(n, dtype=np.int64)])
+
+        keep = self.misses <= self.max_age
+        self.x, self.P, self.ids = self.x[keep], self.P[keep], self.ids[keep]
+        self.scores, self.hits, self.misses = self.scores[keep], self.hits[keep], self.misses[keep]
+        return self._output()
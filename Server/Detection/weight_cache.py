@@ -0,0 +1,100 @@
+"""Local pre-serialized weight cache for fast cold starts.
+
+Building a torchvision detector with pretrained weights resolves them through
+the torch hub: the checkpoint is downloaded on first use (a fresh container
+has none), hash-checked and read fully into memory. `load_cached_model`
+instead keeps a plain state dict per weights enum in a local directory, so
+it can be baked into the image, and loads it with `torch.load(..., mmap=True)`.
+The tensors then stay backed by the file, pages are read only when the
+forward pass touches them, and inference worker processes on one host share
+the same page cache.
+
+Pre-build the cache (e.g. in the Docker image) from the Detection folder:
+    python weight_cache.py --cache-dir ./models/weights --backends frcnn
+
+and serve with `Detector(weight_cache="./models/weights")` (the server reads
+SMARTFLOW_WEIGHT_CACHE). A missing or unreadable cache entry falls back to
+the regular pretrained weights and is rewritten.
+"""
+
+import argparse
+import os
+import time
+
+import torch
+from torch import nn
+from torchvision.ops.misc import FrozenBatchNorm2d
+
+
+def cache_path(cache_dir: str, weights) -> str:
+    """File holding the state dict of `weights` (a torchvision weights enum member)."""
+    return os.path.join(cache_dir, f"{type(weights).__name__}.{weights.name}.pt")
+
+
+def _freeze_batchnorm(model, state_dict):
+    """Swap BatchNorm2d for FrozenBatchNorm2d where the checkpoint came from a frozen-BN model.
+
+    Builders pick FrozenBatchNorm2d only when given pretrained weights; a frozen layer is the one
+    whose checkpoint entry has no `num_batches_tracked`. In eval mode both compute the same output.
+    """
+    for name, module in list(model.named_modules()):
+        for child_name, child in list(module.named_children()):
+            prefix = f"{name}.{child_name}" if name else child_name
+            if isinstance(child, nn.BatchNorm2d) and f"{prefix}.num_batches_tracked" not in state_dict:
+                setattr(module, child_name, FrozenBatchNorm2d(child.num_features, eps=child.eps))
+    return model
+
+
+def _from_state_dict(builder, weights, state_dict):
+    model = builder(weights=None, weights_backbone=None, num_classes=len(weights.meta['categories']))
+    _freeze_batchnorm(model, state_dict)
+    # assign=True keeps the (possibly mmap-backed) tensors instead of copying them into fresh parameters
+    model.load_state_dict(state_dict, assign=True)
+    return model
+
+
+def save_state_dict(model, path: str):
+    """Write `model`'s state dict to `path` atomically (readers never see a partial file)."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp{os.getpid()}"
+    torch.save(model.state_dict(), tmp)
+    os.replace(tmp, path)
+
+
+def load_cached_model(builder, weights, cache_dir: str, mmap: bool = True):
+    """`builder(weights=weights)`, with the weights read from (and written to) `cache_dir`."""
+    path = cache_path(cache_dir, weights)
+    if os.path.exists(path):
+        try:
+            state_dict = torch.load(path, map_location='cpu', mmap=mmap, weights_only=True)
+            return _from_state_dict(builder, weights, state_dict)
+        except Exception as e:
+            print(f"[weights] ignoring unreadable cache {path}: {e!r}")
+    model = builder(weights=weights)
+    try:
+        save_state_dict(model, path)
+    except OSError as e:
+        print(f"[weights] could not write cache {path}: {e!r}")
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cache-dir', required=True)
+    parser.add_argument('--backends', nargs='+', default=['frcnn'])
+    parser.add_argument('--no-mmap', action='store_true')
+    args = parser.parse_args()
+
+    from detect import Detector
+
+    for backend in args.backends:
+        start = time.perf_counter()
+        Detector(device='cpu', backend=backend, weight_cache=args.cache_dir, mmap_weights=not args.no_mmap)
+        first = time.perf_counter() - start
+        start = time.perf_counter()
+        Detector(device='cpu', backend=backend, weight_cache=args.cache_dir, mmap_weights=not args.no_mmap)
+        print(f"{backend}: first load {first:.2f}s, cached load {time.perf_counter() - start:.2f}s ({args.cache_dir})")
+
+
+if __name__ == '__main__':
+    main()
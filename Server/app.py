@@ -1,16 +1,25 @@
 # FLASK APP FOR SERVER-SIDE LOGIC
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit
-import base64
-import cv2
-import numpy as np
 import time
 import os
+import threading
+import uuid
 
 # import detector from Detection folder (do not modify detection logic)
-from Detection.detect import Detector
+from Detection.detect import TTA_PRESETS, Detector, render_detections
+from Detection.motion import MotionGate
+from Detection.roi import load_zones
+from Detection.tracker import Tracker
+from scheduler import BatchScheduler, FrameJob
+from inference_pool import InferencePool
+from result_cache import RawResultStore, ResultCache
+from codec import IMAGE_FORMATS, decode_base64_image, decode_image_bytes, encode_image_bytes, encode_image_to_base64
+from metrics import Metrics, clean_label, timed
+from quality import QualityController
+from occupancy import OccupancyStore
 
 
 app = Flask(__name__, static_folder='static')
@@ -40,24 +49,141 @@ else:
 
 print(f"[server] Flask-SocketIO selected async mode: {selected_async}")
 
-# single Detector instance (warm model once)
-detector = Detector()
+# single Detector instance (warm model once); SMARTFLOW_BACKEND picks the model (see Detection.detect.BACKENDS)
+DETECTOR_BACKEND = os.environ.get('SMARTFLOW_BACKEND', 'frcnn')
+# optional exported artifact (Detection/export.py): SMARTFLOW_RUNTIME=torchscript|onnx, SMARTFLOW_ARTIFACT=<path>
+DETECTOR_RUNTIME = os.environ.get('SMARTFLOW_RUNTIME', 'eager')
+DETECTOR_ARTIFACT = os.environ.get('SMARTFLOW_ARTIFACT')
+TORCH_THREADS = int(os.environ['SMARTFLOW_THREADS']) if os.environ.get('SMARTFLOW_THREADS') else None
+# SMARTFLOW_QUANTIZE=dynamic|static enables int8 post-training quantization on CPU
+DETECTOR_QUANTIZE = os.environ.get('SMARTFLOW_QUANTIZE') or None
+# SMARTFLOW_WEIGHT_CACHE=<dir> loads torchvision weights from a local pre-serialized copy
+# (Detection/weight_cache.py), memory-mapped unless SMARTFLOW_MMAP_WEIGHTS=0
+WEIGHT_CACHE = os.environ.get('SMARTFLOW_WEIGHT_CACHE') or None
+MMAP_WEIGHTS = os.environ.get('SMARTFLOW_MMAP_WEIGHTS', '1') == '1'
+DETECTOR_KWARGS = {
+	'backend': DETECTOR_BACKEND,
+	'runtime': DETECTOR_RUNTIME,
+	'artifact': DETECTOR_ARTIFACT,
+	'quantize': DETECTOR_QUANTIZE,
+	'weight_cache': WEIGHT_CACHE,
+	'mmap_weights': MMAP_WEIGHTS,
+}
+# SMARTFLOW_WORKERS=N runs inference in N worker processes (shared-memory frame hand-off) so the
+# event loop stays responsive; 0 keeps the single in-process Detector
+INFERENCE_WORKERS = int(os.environ.get('SMARTFLOW_WORKERS', 0))
 
+# startup: SMARTFLOW_LAZY_LOAD=1 binds the server at once and builds the model in the background
+# (GET /ready answers 503 until it can serve); SMARTFLOW_WARMUP_SIZES (WxH list, empty disables it)
+# runs a warm-up pass per input size before the model is reported ready
+LAZY_LOAD = os.environ.get('SMARTFLOW_LAZY_LOAD', '0') == '1'
+WARMUP_SIZES = [
+	tuple(int(v) for v in size.lower().split('x'))
+	for size in os.environ.get('SMARTFLOW_WARMUP_SIZES', '1280x720').replace(',', ' ').split()
+]
 
-def decode_base64_image(b64_str: str):
-	# Accept either data URL (data:image/..;base64,...) or raw base64
-	if ',' in b64_str:
-		b64_str = b64_str.split(',', 1)[1]
-	img_bytes = base64.b64decode(b64_str)
-	arr = np.frombuffer(img_bytes, dtype=np.uint8)
-	img = cv2.imdecode(arr, cv2.IMREAD_COLOR)
-	return img
+# frames from all socket clients are batched into shared forward passes
+MAX_BATCH_SIZE = int(os.environ.get('SMARTFLOW_MAX_BATCH', 8))
+BATCH_WAIT_MS = float(os.environ.get('SMARTFLOW_BATCH_WAIT_MS', 30))
 
+# motion gating for socket streams: static scenes reuse the session's last result instead of
+# running inference; SMARTFLOW_MOTION_GATE=1 enables it by default, clients may override per frame
+MOTION_GATE = os.environ.get('SMARTFLOW_MOTION_GATE', '0') == '1'
+MOTION_MIN_CHANGED = float(os.environ.get('SMARTFLOW_MOTION_MIN_CHANGED', 0.01))
+MOTION_MAX_STALE_S = float(os.environ.get('SMARTFLOW_MOTION_MAX_STALE_S', 5))
 
-def encode_image_to_base64(img) -> str:
-	_, buf = cv2.imencode('.jpg', img, [int(cv2.IMWRITE_JPEG_QUALITY), 90])
-	b64 = base64.b64encode(buf).decode('utf-8')
-	return 'data:image/jpeg;base64,' + b64
+# keyframe + tracker mode for socket streams: the detector runs on every Nth frame of a session and
+# boxes are carried forward (with stable person ids) by a per-session tracker in between
+TRACKING = os.environ.get('SMARTFLOW_TRACKING', '0') == '1'
+KEYFRAME_INTERVAL = int(os.environ.get('SMARTFLOW_KEYFRAME_INTERVAL', 5))
+
+# tiled inference for high-resolution cameras: SMARTFLOW_TILE_SIZE=1280 also runs overlapping tiles of
+# each frame (in the same batch) so small, distant people are not lost to the model's internal downscale
+TILE_SIZE = int(os.environ.get('SMARTFLOW_TILE_SIZE', 0)) or None
+TILE_OVERLAP = float(os.environ.get('SMARTFLOW_TILE_OVERLAP', 0.2))
+
+# test-time augmentation: SMARTFLOW_TTA=hflip|multiscale|full adds augmented views to the same batched
+# forward pass; SMARTFLOW_FUSION=nms|wbf picks how their boxes are merged
+TTA = os.environ.get('SMARTFLOW_TTA') or None
+FUSION = os.environ.get('SMARTFLOW_FUSION', 'nms')
+# adaptive quality for socket streams: SMARTFLOW_ADAPTIVE_QUALITY=1 gives each session a controller that lowers
+# the model input size and reply JPEG quality (then the suggested send rate) while its p95 latency is above
+# SMARTFLOW_TARGET_P95_MS, and raises them again when there is headroom; clients may override per frame
+ADAPTIVE_QUALITY = os.environ.get('SMARTFLOW_ADAPTIVE_QUALITY', '0') == '1'
+TARGET_P95_MS = float(os.environ.get('SMARTFLOW_TARGET_P95_MS', 500))
+
+# per-division zones: SMARTFLOW_ROI_CONFIG=<zones.json> (see Detection/roi.py) maps a division (or
+# 'division/camera') to polygons; only the regions around them run through the model, and replies carry
+# per-zone counts. Frames pick their zones with 'division' (and 'camera'); 'roi': false opts out
+ROI_CONFIG = os.environ.get('SMARTFLOW_ROI_CONFIG') or None
+ZONES = load_zones(ROI_CONFIG) if ROI_CONFIG else {}
+# divisions known to the server (SMARTFLOW_DIVISIONS, comma-separated, plus those with zones); any other
+# client-sent 'division' is labelled 'other', which bounds the metric series a client can create
+DIVISIONS = frozenset(
+	[d.strip() for d in os.environ.get('SMARTFLOW_DIVISIONS', 'showroom,markethall,warehouse').split(',') if d.strip()]
+	+ [key.split('/')[0] for key in ZONES])
+# occupancy time series: every socket reply's count is recorded per 'division' (or 'division/camera', and
+# '<key>#<zone>' per zone) with rolling 1m / 15m / 1h aggregates on GET /occupancy. SMARTFLOW_OCCUPANCY_PATH
+# (an .npz file) keeps them across restarts: loaded at startup, saved every SMARTFLOW_OCCUPANCY_SNAPSHOT_S seconds
+# series keys are limited to the known divisions, the zone keys and SMARTFLOW_OCCUPANCY_KEYS (comma-separated,
+# e.g. 'warehouse/dock-2' cameras or batch-job feeds); other cameras count towards their division
+OCCUPANCY_KEYS = frozenset(
+	list(DIVISIONS) + list(ZONES)
+	+ [k.strip() for k in os.environ.get('SMARTFLOW_OCCUPANCY_KEYS', '').split(',') if k.strip()])
+OCCUPANCY_PATH = os.environ.get('SMARTFLOW_OCCUPANCY_PATH') or None
+OCCUPANCY_SNAPSHOT_S = float(os.environ.get('SMARTFLOW_OCCUPANCY_SNAPSHOT_S', 60))
+
+DETECT_PARAMS = {'tile_size': TILE_SIZE, 'tile_overlap': TILE_OVERLAP, 'tta': TTA, 'fusion': FUSION}
+WARMUP = {'sizes': WARMUP_SIZES, **DETECT_PARAMS} if WARMUP_SIZES else None
+
+# detector (or InferencePool) serving requests; None until _load_detector has built it
+detector = None
+model_state = {'state': 'loading', 'error': None, 'load_seconds': None, 'warmup_seconds': None}
+
+# results of byte-identical uploads/frames are reused from an LRU cache (SMARTFLOW_CACHE_MB=0 disables it)
+result_cache = ResultCache(
+	max_bytes=int(float(os.environ.get('SMARTFLOW_CACHE_MB', 64)) * 1024 * 1024),
+	max_entries=int(os.environ.get('SMARTFLOW_CACHE_ENTRIES', 1024)),
+)
+
+# unfiltered detections of the last SMARTFLOW_RAW_FRAMES frames per socket session and of the last
+# SMARTFLOW_RAW_UPLOADS uploads, so 'rethreshold' can apply a new confidence / NMS IoU without inference
+session_raw = RawResultStore(per_owner=int(os.environ.get('SMARTFLOW_RAW_FRAMES', 3)))
+upload_raw = RawResultStore(per_owner=1, max_owners=int(os.environ.get('SMARTFLOW_RAW_UPLOADS', 64)))
+
+if OCCUPANCY_PATH and os.path.exists(OCCUPANCY_PATH):
+	occupancy = OccupancyStore.load(OCCUPANCY_PATH)
+	print(f"[server] loaded {len(occupancy.keys())} occupancy series from {OCCUPANCY_PATH}")
+else:
+	occupancy = OccupancyStore()
+
+# per-stage latency histograms (labelled by endpoint and the client's 'division'), served on /metrics
+metrics = Metrics()
+stage_seconds = metrics.histogram(
+	'smartflow_stage_seconds', 'Seconds spent in each processing stage', ('stage', 'endpoint', 'division'))
+request_seconds = metrics.histogram(
+	'smartflow_request_seconds', 'Seconds from receiving an image to sending its reply', ('endpoint', 'division', 'outcome'))
+
+
+def division_label(value) -> str:
+	return clean_label(value, allowed=DIVISIONS)
+
+
+def _observe(timings, endpoint, division, total, outcome):
+	for stage, seconds in timings.items():
+		stage_seconds.observe(seconds, stage, endpoint, division)
+	request_seconds.observe(total, endpoint, division, outcome)
+
+
+def detections_to_json(detections, ids=None):
+	out = [
+		{'x1': x1, 'y1': y1, 'x2': x2, 'y2_head': y2_head, 'score': score}
+		for x1, y1, x2, y2_head, score in detections
+	]
+	if ids is not None:
+		for d, track_id in zip(out, ids):
+			d['id'] = track_id
+	return out
 
 
 # @app.route('/')
@@ -72,51 +198,718 @@ def upload_image():
 	if not f:
 		return jsonify({'error': 'no file provided'}), 400
 
+	if not model_ready():
+		return jsonify({'error': 'model is loading', 'state': model_state['state']}), 503, {'Retry-After': '5'}
+	received_at = time.perf_counter()
+	timings = {}
+	division = division_label(request.form.get('division'))
 	data = f.read()
-	arr = np.frombuffer(data, dtype=np.uint8)
-	img = cv2.imdecode(arr, cv2.IMREAD_COLOR)
+	confidence = float(request.form.get('confidence', 0.8))
+	nms_iou = float(request.form.get('nms_iou', 0.5))
+	mode = request.form.get('mode', 'image')
+	tta = request.form.get('tta') or TTA
+	if tta and tta not in TTA_PRESETS:
+		return jsonify({'error': f"unknown tta {tta!r}; choose one of {sorted(TTA_PRESETS)}"}), 400
+	params = dict(DETECT_PARAMS, tile_size=int(request.form.get('tile_size', 0)) or TILE_SIZE, tta=tta)
+	zones_key = _zones_key(request.form, division)
+	zones = ZONES[zones_key] if zones_key is not None else None
+	cache_key = result_cache.make_key(
+		data, confidence=confidence, nms_iou=nms_iou, mode=mode, zones=zones_key, **params)
+	cached = result_cache.get(cache_key)
+	if cached is not None:
+		response, raw = cached
+		response = dict(response, cached=True)
+		_keep_upload_raw(response, raw, data, zones)
+		_observe(timings, 'upload-image', division, time.perf_counter() - received_at, 'cached')
+		return jsonify(response)
+
+	img = decode_image_bytes(data, timings)
 	if img is None:
 		return jsonify({'error': 'invalid image file'}), 400
 
-	confidence = float(request.form.get('confidence', 0.8))
-	out_img, t, count = detector.detect(img, confidence_threshold=confidence)
-	b64 = encode_image_to_base64(out_img)
-	return jsonify({'image': b64, 'count': int(count), 'inference_time': float(t)})
+	# mode=boxes returns structured detections only and skips drawing and encoding
+	regions = zones.regions(img.shape[1], img.shape[0]) if zones is not None else None
+	output, t, count, raw = detector.detect(
+		img, confidence_threshold=confidence, nms_iou=nms_iou, return_image=mode != 'boxes' and zones is None, return_raw=True,
+		timings=timings, regions=regions, **params)
+	zone_counts = None
+	if zones is not None:
+		with timed(timings, 'render'):
+			output, count, zone_counts = _zone_output(img, output, zones, mode)
+	response = _upload_response(img, output, t, count, mode, timings)
+	if zone_counts is not None:
+		response['zones'] = zone_counts
+	# cached without an upload_id: every reply, cached or not, gets a fresh id backed by a live raw entry
+	result_cache.put(cache_key, (response, raw))
+	response = dict(response)
+	_keep_upload_raw(response, raw, data, zones)
+	_observe(timings, 'upload-image', division, time.perf_counter() - received_at, 'inferred')
+	return jsonify(response)
+
+
+def _keep_upload_raw(response, raw, encoded, zones):
+	"""Store the upload's raw detections for /rethreshold and put their new 'upload_id' in `response`."""
+	if upload_raw.enabled:
+		upload_id = uuid.uuid4().hex
+		upload_raw.add(upload_id, {'raw': raw, 'encoded': encoded, 'zones': zones})
+		response['upload_id'] = upload_id
+
+
+def _zones_key(data, division):
+	"""The ZONES key used for this request: 'division/camera' when configured, else `division`; None without zones or with 'roi': false."""
+	if not ZONES or str(data.get('roi', True)).lower() in ('0', 'false'):
+		return None
+	camera = data.get('camera')
+	if camera and f"{division}/{clean_label(camera)}" in ZONES:
+		return f"{division}/{clean_label(camera)}"
+	return division if division in ZONES else None
+
+
+def _zones_for(data, division):
+	"""The ZoneSet configured for `division` (or 'division/camera'), unless the request sends 'roi': false."""
+	key = _zones_key(data, division)
+	return ZONES[key] if key is not None else None
+
+
+def _zone_output(img, detections, zones, mode):
+	"""Keep the detections inside `zones` and count them per zone; mode 'image' also draws them and the zones."""
+	h, w = img.shape[:2]
+	detections, zone_counts = zones.assign(detections, w, h)
+	output = detections if mode == 'boxes' else zones.draw(render_detections(img, detections))
+	return output, len(detections), zone_counts
+
+
+def _upload_response(img, output, t, count, mode, timings=None):
+	if mode == 'boxes':
+		h, w = img.shape[:2]
+		return {'detections': detections_to_json(output), 'width': w, 'height': h, 'count': int(count), 'inference_time': float(t)}
+	return {'image': encode_image_to_base64(output, timings), 'count': int(count), 'inference_time': float(t)}
+
+
+@app.route('/rethreshold', methods=['POST'])
+def rethreshold_upload():
+	"""Re-apply 'confidence' / 'nms_iou' to a previous upload's raw detections ('upload_id') without inference.
+
+	Accepts form fields or JSON; the reply has the same shape as /upload-image ('mode' image or boxes).
+	"""
+	params = request.get_json(silent=True) or request.form
+	entry = upload_raw.get(params.get('upload_id'))
+	if entry is None:
+		return jsonify({'error': 'unknown or expired upload_id'}), 404
+	confidence = float(params.get('confidence', 0.8))
+	nms_iou = float(params.get('nms_iou', 0.5))
+	mode = params.get('mode', 'image')
+	img = decode_image_bytes(entry['encoded'])
+	detections = Detector.select_detections(entry['raw'], confidence, nms_iou, FUSION)
+	zone_counts = None
+	if entry.get('zones') is not None:
+		output, count, zone_counts = _zone_output(img, detections, entry['zones'], mode)
+	else:
+		output, count = (detections if mode == 'boxes' else render_detections(img, detections)), len(detections)
+	response = _upload_response(img, output, 0.0, count, mode)
+	if zone_counts is not None:
+		response['zones'] = zone_counts
+	response.update(upload_id=params.get('upload_id'), rethresholded=True)
+	return jsonify(response)
+
+
+@app.route('/cache-stats', methods=['GET'])
+def cache_stats():
+	return jsonify(result_cache.stats())
+
+
+@app.route('/health', methods=['GET'])
+def health():
+	# liveness: the process is up and serving HTTP, whether or not the model is loaded yet
+	return jsonify({'status': 'ok'})
+
+
+@app.route('/ready', methods=['GET'])
+def ready():
+	# readiness: 200 once requests can be served, 503 while the model loads (or after it failed)
+	state = {k: v for k, v in model_state.items() if k != 'started'}
+	state['ready'] = model_ready()
+	if isinstance(detector, InferencePool):
+		state['workers_ready'] = detector.ready_workers
+	return jsonify(state), 200 if state['ready'] else 503
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+	return Response(metrics.render(), mimetype=Metrics.CONTENT_TYPE)
+
+
+def _occupancy_key(division, camera=''):
+	"""The series for a reply: 'division/camera' if that key is known, else the division; None if neither is."""
+	if camera and f"{division}/{camera}" in OCCUPANCY_KEYS:
+		return f"{division}/{camera}"
+	return division if division in OCCUPANCY_KEYS else None
+
+
+def _record_occupancy(key, count, zone_counts=None):
+	# zone names come from the configured ZoneSet, so '<key>#<zone>' stays within the configuration
+	if key is None:
+		return
+	occupancy.record(key, count)
+	for name, zone_count in (zone_counts or {}).items():
+		occupancy.record(f"{key}#{name}", zone_count)
+
+
+@app.route('/occupancy', methods=['GET'])
+def occupancy_query():
+	"""Rolling occupancy aggregates: all series, or one 'key' (with per-bucket 'points' of one window).
+
+	Query string: key=showroom[/camera][#zone], points=1m|15m|1h, at=<unix seconds, default now>.
+	Only reads the in-memory aggregates; no frame or model work is involved.
+	"""
+	key = request.args.get('key')
+	try:
+		at = float(request.args['at']) if request.args.get('at') else None
+		if key is None:
+			return jsonify({'time': at or time.time(), 'series': occupancy.query_all(at)})
+		result = occupancy.query(key, at, points=request.args.get('points'))
+	except ValueError as e:
+		return jsonify({'error': f'invalid at: {e}'}), 400
+	if result is None:
+		return jsonify({'error': f'unknown series {key!r}', 'keys': occupancy.keys()}), 404
+	return jsonify(result)
+
+
+@app.route('/occupancy', methods=['POST'])
+def occupancy_ingest():
+	"""Add timestamped counts from an offline job (Detection/batch_job.py --occupancy-url).
+
+	JSON body: { 'key': 'warehouse/dock-2', 'samples': [[<unix seconds>, <count>], ...] }
+	"""
+	body = request.get_json(silent=True) or {}
+	key = body.get('key')
+	samples = body.get('samples') or []
+	if not isinstance(key, str) or not key or not isinstance(samples, list):
+		return jsonify({'error': "expected 'key' and a list of [time, count] 'samples'"}), 400
+	if key not in OCCUPANCY_KEYS:
+		return jsonify({'error': f'unknown series {key!r} (see SMARTFLOW_OCCUPANCY_KEYS)', 'keys': sorted(OCCUPANCY_KEYS)}), 400
+	try:
+		times, counts = zip(*samples) if samples else ((), ())
+		added = occupancy.record_many(key, times, counts)
+	except (TypeError, ValueError) as e:
+		return jsonify({'error': f'invalid samples: {e}'}), 400
+	return jsonify({'key': key, 'added': added})
+
+
+def _snapshot_occupancy():
+	"""Background task: save the occupancy series to SMARTFLOW_OCCUPANCY_PATH periodically.
+
+	The arrays are copied here, on the event loop (the store's lock is also taken by the socket
+	handlers); only compressing and writing them runs in an OS thread.
+	"""
+	while True:
+		socketio.sleep(OCCUPANCY_SNAPSHOT_S)
+		try:
+			arrays = occupancy.snapshot()
+			_call_blocking(lambda: OccupancyStore.write_snapshot(OCCUPANCY_PATH, arrays))
+		except Exception as e:
+			print(f"[server] failed to save occupancy snapshot: {e!r}")
 
 
 @socketio.on('connect')
 def handle_connect():
-	emit('connected', {'message': 'connected to detection socket'})
+	# every session starts with one credit: it may send a single frame before waiting for 'frame_ack'
+	# frames sent before the model is ready are answered with 'error' (and the credit back)
+	emit('connected', {'message': 'connected to detection socket', 'credits': 1, 'ready': model_ready()})
+
+
+@socketio.on('disconnect')
+def handle_disconnect():
+	scheduler.remove_session(request.sid)
+	session_raw.drop(request.sid)
+	_motion_sessions.pop(request.sid, None)
+	_track_sessions.pop(request.sid, None)
+	_quality_sessions.pop(request.sid, None)
+
+
+# sid -> {'gate': MotionGate, 'key': (mode, binary, format), 'event': str, 'payload': dict}
+_motion_sessions = {}
+
+
+def _reply_if_static(sid, img, data, binary: bool) -> bool:
+	"""Answer from the session's cached result when the motion gate sees no change. Returns True if answered."""
+	if not data.get('motion_gate', MOTION_GATE):
+		return False
+	state = _motion_sessions.get(sid)
+	if state is None:
+		gate = MotionGate(min_changed_fraction=MOTION_MIN_CHANGED, max_stale_frames=None, max_stale_seconds=MOTION_MAX_STALE_S)
+		state = _motion_sessions[sid] = {'gate': gate, 'key': None, 'event': None, 'payload': None}
+	key = (data.get('mode', 'image'), binary, data.get('format', 'jpeg') if binary else 'jpeg')
+	if state['payload'] is None or state['key'] != key:
+		# nothing reusable yet; the reference is set once a result for this session is sent
+		state['gate'].reset()
+		return False
+	# compare with the frame whose result is in state['payload'], not with frames merely received:
+	# a received frame can still be replaced in the inbox and never be inferred
+	if state['gate'].should_infer(img, update_reference=False):
+		return False
+	stats = scheduler.record_reused(sid)
+	payload = state['payload']
+	emit(state['event'], dict(payload, latency=0.0, reused=True, stats=stats, seq=data.get('seq')))
+	_record_occupancy(_occupancy_key(division_label(data.get('division')), clean_label(data.get('camera'), default='')),
+					  payload['count'], payload.get('zones'))
+	emit('frame_ack', {'credits': 1, 'stats': stats})
+	return True
+
+
+def _remember_result(job, event, payload):
+	state = _motion_sessions.get(job.sid)
+	# a cache hit is never decoded, so it cannot become the gate reference; keep reference and payload paired
+	if state is not None and job.image is not None:
+		state.update(key=(job.mode, job.binary, job.image_format), event=event, payload=payload)
+		state['gate'].set_reference(job.image)
+
+
+# sid -> {'tracker': Tracker, 'lock': Lock, 'replied': frames answered, 'interval': int, 'ready': bool,
+#         'keyframe_pending': bool, 'held': FrameJob waiting for the pending keyframe's update}
+_track_sessions = {}
+
+
+def _track_step(state, job) -> str:
+	"""'keyframe' (infer), 'predict' (carry the boxes forward) or 'hold' (a keyframe is still being inferred)."""
+	with state['lock']:
+		if state['keyframe_pending']:
+			replaced, state['held'] = state['held'], job
+			if replaced is not None:
+				scheduler.record_dropped(job.sid)  # latest frame wins, as in the scheduler inbox
+			return 'hold'
+		if not state['ready'] or state['replied'] % state['interval'] == 0:
+			state['keyframe_pending'] = True
+			return 'keyframe'
+		return 'predict'
+
+
+def _reply_predicted(job):
+	stats = scheduler.record_reused(job.sid)
+	_emit_processed(job, None, 0.0, 0, stats, predicted=True)
+	_emit_ack(job.sid, stats)
+
+
+def _release_held(sid):
+	"""The session's keyframe is done (or failed): answer or infer the frame held meanwhile."""
+	state = _track_sessions.get(sid)
+	if state is None:
+		return
+	with state['lock']:
+		state['keyframe_pending'] = False
+		held, state['held'] = state['held'], None
+	if held is None:
+		return
+	if _track_step(state, held) == 'keyframe':
+		scheduler.submit(held)
+	else:
+		_reply_predicted(held)
+
+
+def _reply_from_tracker(job, data) -> bool:
+	"""Between keyframes, answer with boxes carried forward by the session tracker. Returns True if handled.
+
+	A frame that arrives while the session's keyframe is still being inferred is held (latest wins) and
+	answered once that keyframe's update has been applied, so the tracker always steps in frame order.
+	"""
+	if not data.get('track', TRACKING):
+		return False
+	state = _track_sessions.get(job.sid)
+	if state is None:
+		state = _track_sessions[job.sid] = {
+			'tracker': Tracker(), 'lock': threading.Lock(), 'replied': 0, 'interval': KEYFRAME_INTERVAL,
+			'ready': False, 'keyframe_pending': False, 'held': None,
+		}
+	job.track = True
+	state['interval'] = max(1, int(data.get('keyframe_interval', KEYFRAME_INTERVAL)))
+	step = _track_step(state, job)
+	if step == 'predict':
+		_reply_predicted(job)
+	return step != 'keyframe'
+
+
+# sid -> QualityController
+_quality_sessions = {}
+
+
+def _quality_controller(job, data):
+	"""The session's adaptive quality controller, or None when adaptive quality is off for this frame."""
+	if not data.get('adaptive', ADAPTIVE_QUALITY):
+		return None
+	ctrl = _quality_sessions.get(job.sid)
+	if ctrl is None:
+		ctrl = _quality_sessions[job.sid] = QualityController(target_p95=TARGET_P95_MS / 1000.0)
+	return ctrl
+
+
+def _apply_quality(job, data):
+	"""Give `job` the session's current adaptive model input size and reply quality (when enabled)."""
+	ctrl = _quality_controller(job, data)
+	if ctrl is not None:
+		job.resize_long_edge = ctrl.resize_for(job.image)
+		job.quality = ctrl.jpeg_quality
+
+
+def _apply_zones(job):
+	"""Crop the model input of a frame with division zones to the regions around them."""
+	if job.zones is not None:
+		h, w = job.image.shape[:2]
+		job.regions = job.zones.regions(w, h)
+
+
+def _reply_from_cache(job, encoded, data) -> bool:
+	"""Answer with the cached result for byte-identical input and parameters. Returns True if answered.
+
+	Runs on the encoded bytes before the frame is decoded. The adaptive quality level stands in for
+	the model input size: for identical bytes (same frame size) it determines `resize_long_edge`.
+	"""
+	if not result_cache.enabled:
+		return False
+	ctrl = _quality_controller(job, data)
+	job.cache_key = result_cache.make_key(
+		encoded, confidence=job.confidence, nms_iou=job.nms_iou, mode=job.mode,
+		quality_level=ctrl.level if ctrl is not None else None,
+		zones=_zones_key(data, job.division), **scheduler.detect_params)
+	cached = result_cache.get(job.cache_key)
+	if cached is None:
+		return False
+	if ctrl is not None:
+		job.quality = ctrl.jpeg_quality
+	stats = scheduler.record_reused(job.sid)
+	_emit_processed(job, None, 0.0, 0, stats, cached=cached)
+	emit('frame_ack', {'credits': 1, 'stats': stats})
+	return True
+
+
+def _process_frame(job, data, encoded, decode):
+	"""Shared path of 'frame' / 'frame_bin' after parsing: result cache (on the encoded bytes), decode,
+	motion gate, adaptive quality, zones and tracking, then the session inbox."""
+	job.camera = clean_label(data.get('camera'), default='')
+	job.seq = data.get('seq')
+	job.zones = _zones_for(data, job.division)
+	# tracked sessions bypass the cache: every frame has to step the session tracker
+	if not data.get('track', TRACKING) and _reply_from_cache(job, encoded, data):
+		return
+	if not model_ready():
+		emit('error', dict(_error_payload(f"model is {model_state['state']}", data), state=model_state['state']))
+		emit('frame_ack', {'credits': 1, 'stats': scheduler.session_stats(job.sid)})
+		return
+	job.image = decode()
+	if job.image is None:
+		emit('error', _error_payload('unable to decode image', data))
+		emit('frame_ack', {'credits': 1, 'stats': scheduler.session_stats(job.sid)})
+		return
+	if _reply_if_static(job.sid, job.image, data, binary=job.binary):
+		_observe(job.timings, job.endpoint, job.division, time.monotonic() - job.received_at, 'reused')
+		return
+	_apply_quality(job, data)
+	_apply_zones(job)
+	if _reply_from_tracker(job, data):
+		return
+	job.keep_raw = session_raw.enabled and not job.track
+	scheduler.submit(job)
+
+
+def _emit_processed(job, output, t, count, stats, predicted=False, cached=None, extra=None):
+	"""Finish and send one frame's reply. `cached` is a result cache entry; `job.image` is None then."""
+	frame_id = None
+	if job.raw is not None:
+		entry = {'raw': job.raw, 'image': job.image, 'zones': job.zones}
+		frame_id = entry['frame_id'] = session_raw.add(job.sid, entry)
+	latency = time.monotonic() - job.received_at
+	if cached is not None:
+		output, count, t, zone_counts, (w, h) = cached
+		track_ids = None
+	else:
+		output, count, zone_counts, track_ids = _finish_result(job, output, count, predicted)
+		h, w = job.image.shape[:2]
+		if job.cache_key is not None:
+			# the finished result (zones applied and drawn) plus the frame size, so a hit needs no pixels
+			result_cache.put(job.cache_key, (output, count, t, zone_counts, (w, h)))
+	payload = {'count': int(count), 'inference_time': float(t), 'latency': latency, 'stats': stats}
+	if job.seq is not None:
+		payload['seq'] = job.seq
+	if job.track:
+		payload['tracked'] = predicted
+	if cached is not None:
+		payload['cached'] = True
+	if frame_id is not None:
+		payload['frame_id'] = frame_id
+	if zone_counts is not None:
+		payload['zones'] = zone_counts
+	if extra:
+		payload.update(extra)
+	ctrl = _quality_sessions.get(job.sid)
+	if ctrl is not None:
+		# current setting and suggested client send interval ('send_interval_ms')
+		payload['quality'] = ctrl.state()
+	event = 'processed_frame_bin' if job.binary else 'processed_frame'
+	if job.mode == 'boxes':
+		payload.update({'detections': detections_to_json(output, track_ids), 'width': w, 'height': h})
+	elif job.binary:
+		payload['image'] = encode_image_bytes(output, job.image_format, job.quality, timings=job.timings)
+		payload['format'] = IMAGE_FORMATS.get(job.image_format, IMAGE_FORMATS['jpeg'])[2]
+	else:
+		payload['image'] = encode_image_to_base64(output, job.timings, job.quality)
+	with timed(job.timings, 'emit'):
+		socketio.emit(event, payload, to=job.sid)
+	_remember_result(job, event, payload)
+	outcome = 'cached' if cached is not None else 'tracked' if predicted else 'rethresholded' if extra else 'inferred'
+	total = time.monotonic() - job.received_at
+	_observe(job.timings, job.endpoint, job.division, total, outcome)
+	if ctrl is not None and outcome == 'inferred':
+		ctrl.observe(total, t)
+	if job.track and not predicted:
+		_release_held(job.sid)
+	if not extra:
+		# re-thresholded replies revisit an old frame; they are not a new occupancy sample
+		_record_occupancy(_occupancy_key(job.division, job.camera), count, zone_counts)
+
+
+def _finish_result(job, output, count, predicted):
+	"""Apply zones and the session tracker to a fresh result and draw it. Returns (output, count, zone_counts, ids)."""
+	h, w = job.image.shape[:2]
+	zone_counts = None
+	if job.zones is not None and not predicted:
+		# people outside every zone are neither counted nor tracked
+		output, zone_counts = job.zones.assign(output, w, h)
+		count = len(output)
+	track_ids = None
+	if job.track:
+		state = _track_sessions.get(job.sid)
+		if state is not None:
+			tracker = state['tracker']
+			with state['lock'], timed(job.timings, 'track'):
+				output, track_ids = tracker.predict() if predicted else tracker.update(output)
+				state['ready'] = True
+				state['replied'] += 1
+			count = len(output)
+			if job.zones is not None:
+				zone_counts = job.zones.assign(output, w, h)[1]
+	if (job.track or job.zones is not None) and job.mode != 'boxes':
+		with timed(job.timings, 'render'):
+			output = render_detections(job.image, output, track_ids)
+			if job.zones is not None:
+				job.zones.draw(output)
+	return output, count, zone_counts, track_ids
+
+
+def _error_payload(message, data=None):
+	"""An 'error' event payload, echoing the frame's 'seq' when the client sent one."""
+	payload = {'error': message}
+	if isinstance(data, dict) and data.get('seq') is not None:
+		payload['seq'] = data['seq']
+	return payload
+
+
+def _emit_error(job, exc):
+	socketio.emit('error', _error_payload(str(exc), {'seq': job.seq}), to=job.sid)
+	if job.track:
+		_release_held(job.sid)
+
+
+def _emit_ack(sid, stats):
+	socketio.emit('frame_ack', {'credits': 1, 'stats': stats}, to=sid)
+
+
+scheduler = BatchScheduler(
+	detector, _emit_processed, _emit_error, _emit_ack,
+	max_batch_size=MAX_BATCH_SIZE, max_wait_ms=BATCH_WAIT_MS,
+	detect_params=DETECT_PARAMS,
+)
+metrics.gauge('smartflow_queue_depth', 'Sessions with a frame waiting for inference', scheduler.qsize)
+metrics.gauge('smartflow_frames_in_flight', 'Frames currently in a detector batch', lambda: scheduler.in_flight)
+if INFERENCE_WORKERS > 0:
+	metrics.gauge('smartflow_pool_batches_in_flight', 'Batches submitted to inference workers',
+				  lambda: detector.in_flight() if detector is not None else 0)
+metrics.gauge('smartflow_cache_hits_total', 'Result cache hits', lambda: result_cache.hits, kind='counter')
+metrics.gauge('smartflow_cache_misses_total', 'Result cache misses', lambda: result_cache.misses, kind='counter')
+metrics.gauge('smartflow_model_ready', '1 once the detector can serve requests', lambda: int(model_ready()))
+
+
+def model_ready() -> bool:
+	# an InferencePool is usable once every worker has built (and warmed up) its Detector
+	return model_state['state'] == 'ready' and getattr(detector, 'ready', True)
+
+
+def _call_blocking(fn):
+	"""Run `fn` in an OS thread and wait for it without blocking the event loop (gevent/eventlet)."""
+	if selected_async == 'gevent':
+		return gevent.get_hub().threadpool.apply(fn)
+	if selected_async == 'eventlet':
+		from eventlet import tpool
+		return tpool.execute(fn)
+	return fn()  # threading mode: background tasks already are OS threads
+
+
+def _build_local_detector():
+	det = Detector(num_threads=TORCH_THREADS, **DETECTOR_KWARGS)
+	model_state['load_seconds'] = time.perf_counter() - model_state['started']
+	if WARMUP:
+		model_state['warmup_seconds'] = det.warmup(**WARMUP)
+	return det
+
+
+def _model_failed(error):
+	"""Mark the model failed and answer every frame still waiting in a session inbox with an error and its credit."""
+	model_state.update(state='failed', error=error)
+	exc = RuntimeError(f"model failed to load: {error}")
+	for job in scheduler.drain():
+		_emit_error(job, exc)
+		_emit_ack(job.sid, scheduler.session_stats(job.sid))
+
+
+def _load_detector():
+	"""Build the detector (or worker pool), then hand it to the scheduler and start its loops."""
+	global detector
+	model_state['started'] = time.perf_counter()
+	try:
+		if INFERENCE_WORKERS > 0:
+			# workers build and warm up their own Detector in the background; model_ready() follows them
+			det = InferencePool(
+				INFERENCE_WORKERS,
+				DETECTOR_KWARGS,
+				torch_threads=TORCH_THREADS or max(1, (os.cpu_count() or 1) // INFERENCE_WORKERS),
+				slots_per_worker=int(os.environ.get('SMARTFLOW_SLOTS', 4)),
+				slot_bytes=int(float(os.environ.get('SMARTFLOW_SLOT_MB', 4)) * 1024 * 1024),
+				spawn=socketio.start_background_task,
+				sleep=socketio.sleep,
+				warmup=WARMUP,
+				on_failure=_model_failed,
+			)
+			print(f"[server] detector backend: {DETECTOR_BACKEND} ({DETECTOR_RUNTIME}) in {INFERENCE_WORKERS} worker processes")
+		else:
+			det = _call_blocking(_build_local_detector) if LAZY_LOAD else _build_local_detector()
+			print(f"[server] detector backend: {DETECTOR_BACKEND} ({DETECTOR_RUNTIME}), loaded in "
+				  f"{model_state['load_seconds']:.2f}s, warm-up {model_state['warmup_seconds'] or 0.0:.2f}s")
+	except Exception as e:
+		_model_failed(repr(e))
+		print(f"[server] failed to load the detector: {e!r}")
+		if not LAZY_LOAD:
+			raise
+		return
+	detector = scheduler.detector = det
+	if model_state['state'] == 'loading':  # a pool worker may already have failed to load
+		model_state['state'] = 'ready'
+	# one scheduler loop per worker process keeps every worker busy with its own batch
+	for _ in range(max(1, INFERENCE_WORKERS)):
+		socketio.start_background_task(scheduler.run)
+
+
+# inference workers (InferencePool) are spawned without re-importing this module; they only load Detection.detect
+if LAZY_LOAD:
+	socketio.start_background_task(_load_detector)
+else:
+	_load_detector()
+
+if OCCUPANCY_PATH:
+	socketio.start_background_task(_snapshot_occupancy)
 
 
 @socketio.on('frame')
 def handle_frame(data):
-	"""Receive a single video frame as base64 from client, run detection, and emit processed frame.
+	"""Receive a single video frame as base64 from client and queue it for batched detection.
+
+	Client should emit 'frame' events with payload: { 'image': '<base64 data>', 'confidence': 0.8, 'mode': 'image' }
+	Server responds with 'processed_frame' event: { 'image': '<base64 data>', 'count': int, 'inference_time': float,
+	'latency': float, 'stats': {'received', 'processed', 'dropped'} }
+	With 'mode': 'boxes' the reply has no 'image'; instead it carries 'detections'
+	([{x1, y1, x2, y2_head, score}]) plus the frame 'width'/'height', and nothing is drawn or encoded.
+	Frames from all connected clients share batched forward passes (see scheduler.BatchScheduler).
+
+	With motion gating on (SMARTFLOW_MOTION_GATE=1 or 'motion_gate': true) a frame that barely differs
+	from the last inferred one is answered with the session's previous result ('reused': true).
+	A frame whose bytes and parameters ('confidence', 'nms_iou', ...) match a recently processed one is
+	answered from the result cache without being decoded or inferred ('cached': true).
+	With tracking on (SMARTFLOW_TRACKING=1 or 'track': true) only every 'keyframe_interval'-th frame
+	runs the detector; the frames in between get boxes predicted by the session tracker ('tracked': true),
+	and labels / 'detections[].id' carry stable person ids.
 
-	Client should emit 'frame' events with payload: { 'image': '<base64 data>', 'confidence': 0.8 }
-	Server responds with 'processed_frame' event: { 'image': '<base64 data>', 'count': int, 'inference_time': float }
+	Each session keeps at most one queued frame; a newer frame replaces a queued one that has not
+	started. The server emits 'frame_ack' { 'credits': 1, 'stats': {...} } when a frame starts
+	inference, and clients should wait for that credit before sending the next frame.
 	"""
+	received_at = time.monotonic()
+	timings = {}
 	try:
 		b64 = data.get('image') if isinstance(data, dict) else None
 		if not b64:
-			emit('error', {'error': 'no image data'})
+			emit('error', _error_payload('no image data', data))
+			emit('frame_ack', {'credits': 1, 'stats': scheduler.session_stats(request.sid)})
 			return
 
-		img = decode_base64_image(b64)
-		if img is None:
-			emit('error', {'error': 'unable to decode image'})
+		job = FrameJob(request.sid, None, confidence=float(data.get('confidence', 0.8)), mode=data.get('mode', 'image'),
+					   endpoint='frame', division=division_label(data.get('division')), timings=timings,
+					   nms_iou=float(data.get('nms_iou', 0.5)))
+		job.received_at = received_at
+		_process_frame(job, data, b64, lambda: decode_base64_image(b64, timings))
+	except Exception as e:
+		emit('error', _error_payload(str(e), data))
+		emit('frame_ack', {'credits': 1, 'stats': scheduler.session_stats(request.sid)})
+
+
+@socketio.on('frame_bin')
+def handle_frame_bin(data):
+	"""Binary variant of 'frame': the image travels as a Socket.IO binary attachment.
+
+	Client should emit 'frame_bin' events with payload: { 'image': <ArrayBuffer/Blob of JPEG or WebP bytes>,
+	'confidence': 0.8, 'format': 'jpeg' | 'webp' }
+	Server responds with 'processed_frame_bin' event: same fields as 'processed_frame', but 'image' holds
+	the encoded bytes (in the requested 'format') and 'format' holds its MIME type.
+	Backpressure and credits work exactly as for 'frame'.
+	"""
+	received_at = time.monotonic()
+	timings = {}
+	try:
+		buf = data.get('image') if isinstance(data, dict) else None
+		if not buf:
+			emit('error', _error_payload('no image data', data))
+			emit('frame_ack', {'credits': 1, 'stats': scheduler.session_stats(request.sid)})
 			return
 
-		confidence = float(data.get('confidence', 0.8)) if isinstance(data, dict) else 0.8
-		start = time.time()
-		out_img, t, count = detector.detect(img, confidence_threshold=confidence)
-		# prefer measured model time if available
-		inf_time = float(t) if t is not None else (time.time() - start)
-		out_b64 = encode_image_to_base64(out_img)
-		emit('processed_frame', {'image': out_b64, 'count': int(count), 'inference_time': inf_time})
+		job = FrameJob(request.sid, None, confidence=float(data.get('confidence', 0.8)), mode=data.get('mode', 'image'),
+					   binary=True, image_format=data.get('format', 'jpeg'), endpoint='frame_bin',
+					   division=division_label(data.get('division')), timings=timings, nms_iou=float(data.get('nms_iou', 0.5)))
+		job.received_at = received_at
+		_process_frame(job, data, buf, lambda: decode_image_bytes(buf, timings))
+	except Exception as e:
+		emit('error', _error_payload(str(e), data))
+		emit('frame_ack', {'credits': 1, 'stats': scheduler.session_stats(request.sid)})
+
+@socketio.on('rethreshold')
+def handle_rethreshold(data):
+	"""Re-apply a new 'confidence' / 'nms_iou' to one of the session's last frames without inference.
+
+	Payload: { 'confidence': 0.6, 'nms_iou': 0.5, 'frame_id': <id from a processed_frame reply, default latest>,
+	'mode': 'image' | 'boxes', 'binary': false, 'format': 'jpeg' }
+	Replies with 'processed_frame' (or 'processed_frame_bin' when 'binary' is true) carrying 'frame_id'
+	and 'rethresholded': true. No credit is consumed.
+	"""
+	data = data if isinstance(data, dict) else {}
+	try:
+		try:
+			entry = session_raw.get(request.sid, data.get('frame_id'))
+		except (TypeError, ValueError):
+			emit('error', {'error': f"invalid frame_id {data.get('frame_id')!r}"})
+			return
+		if entry is None:
+			emit('error', {'error': 'no cached frame to re-threshold'})
+			return
+		confidence = float(data.get('confidence', 0.8))
+		detections = Detector.select_detections(entry['raw'], confidence, float(data.get('nms_iou', 0.5)), FUSION)
+		job = FrameJob(request.sid, entry['image'], confidence=confidence, mode=data.get('mode', 'image'),
+					   binary=bool(data.get('binary', False)), image_format=data.get('format', 'jpeg'),
+					   endpoint='rethreshold', division=division_label(data.get('division')))
+		job.zones = entry.get('zones')
+		with timed(job.timings, 'render'):
+			# with zones, _emit_processed filters, counts and draws
+			output = detections if job.mode == 'boxes' or job.zones is not None else render_detections(job.image, detections)
+		extra = {'rethresholded': True, 'frame_id': entry['frame_id']}
+		_emit_processed(job, output, 0.0, len(detections), scheduler.session_stats(request.sid), extra=extra)
 	except Exception as e:
 		emit('error', {'error': str(e)})
 
+
 from flask import send_from_directory
  
 # Serve React build files
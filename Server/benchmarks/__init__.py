@@ -0,0 +1,11 @@
+"""Benchmarks for the detection and serving paths.
+
+Run from the Server folder:
+    python -m benchmarks.detector_bench   # Detector.detect: resolution, resize_long_edge, TTA, people count
+    python -m benchmarks.codec_bench      # decode_base64_image / encode_image_to_base64 and the binary codecs
+    python -m benchmarks.load_test        # simulated Socket.IO clients + /upload-image posts against a server
+
+Each writes a JSON report (see common.write_report) with p50/p95/p99
+latency and throughput per case, so runs on different commits, backends
+or machines can be compared side by side.
+"""
@@ -0,0 +1,60 @@
+"""Benchmark the frame codecs: `decode_base64_image` / `encode_image_to_base64` and the binary variants.
+
+Run from the Server folder:
+    python -m benchmarks.codec_bench
+    python -m benchmarks.codec_bench --sizes 640x360 1280x720 1920x1080 3840x2160 --qualities 60 90 --runs 200
+
+For every frame size it times the base64 path used by `frame` / `/upload-image`
+(data URL decode, JPEG encode + base64) and the binary path used by
+`frame_bin` (`decode_image_bytes`, `encode_image_bytes` as JPEG and WebP at
+each quality), and records the payload size. No model is loaded.
+"""
+
+import argparse
+
+from codec import decode_base64_image, decode_image_bytes, encode_image_bytes, encode_image_to_base64
+
+from benchmarks.common import load_image, parse_size, print_table, summarize, timed_runs, write_report
+
+
+def bench_size(image, runs: int, warmup: int, formats, qualities):
+    cases = []
+
+    def add(op, fn, payload_bytes, fmt='jpeg', quality=90):
+        latencies, _ = timed_runs(fn, runs, warmup)
+        cases.append({'op': op, 'format': fmt, 'quality': quality, 'bytes': payload_bytes, 'latency': summarize(latencies)})
+
+    data_url = encode_image_to_base64(image)
+    add('encode_image_to_base64', lambda: encode_image_to_base64(image), len(data_url))
+    add('decode_base64_image', lambda: decode_base64_image(data_url), len(data_url))
+    for fmt in formats:
+        for quality in qualities:
+            buf = encode_image_bytes(image, fmt, quality)
+            add('encode_image_bytes', lambda: encode_image_bytes(image, fmt, quality), len(buf), fmt, quality)
+            add('decode_image_bytes', lambda: decode_image_bytes(buf), len(buf), fmt, quality)
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', default=None, help='source image (default: Detection/assets/people.jpg)')
+    parser.add_argument('--sizes', nargs='+', default=['640x360', '1280x720', '1920x1080'], help='frame sizes WxH')
+    parser.add_argument('--formats', nargs='+', default=['jpeg', 'webp'])
+    parser.add_argument('--qualities', type=int, nargs='+', default=[70, 90])
+    parser.add_argument('--runs', type=int, default=100)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--out', default='benchmarks/results/codec.json')
+    args = parser.parse_args()
+
+    cases = []
+    for size in args.sizes:
+        image = load_image(args.image, parse_size(size))
+        for case in bench_size(image, args.runs, args.warmup, args.formats, args.qualities):
+            cases.append({'size': size, **case})
+
+    print_table(cases, ['size', 'op', 'format', 'quality', 'bytes'])
+    write_report(args.out, 'codec', args, cases)
+
+
+if __name__ == '__main__':
+    main()
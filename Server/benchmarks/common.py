@@ -0,0 +1,140 @@
+"""Shared helpers for the benchmark scripts: test images, latency summaries and JSON reports."""
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import cv2
+import numpy as np
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_IMAGE = os.path.join(SERVER_DIR, 'Detection', 'assets', 'people.jpg')
+
+
+def percentile(sorted_values, q: float) -> float:
+    """Linearly interpolated `q`-th percentile (0-100) of an already sorted, non-empty sequence."""
+    if len(sorted_values) == 1:
+        return float(sorted_values[0])
+    pos = (len(sorted_values) - 1) * q / 100.0
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return float(sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo))
+
+
+def summarize(latencies, elapsed: float | None = None, items: int | None = None) -> dict:
+    """Latency statistics (seconds) and throughput for one benchmark case.
+
+    `elapsed` is the wall time of the whole case; throughput is `items`
+    (default: the number of latencies) per second of it. Without `elapsed`
+    the latencies are assumed to be sequential and their sum is used.
+    """
+    values = sorted(latencies)
+    if not values:
+        return {'n': 0}
+    elapsed = sum(values) if elapsed is None else elapsed
+    items = len(values) if items is None else items
+    return {
+        'n': len(values),
+        'mean': sum(values) / len(values),
+        'min': values[0],
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'max': values[-1],
+        'throughput': items / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def load_image(path: str | None = None, size: tuple[int, int] | None = None, grid: int = 1):
+    """BGR test image: `path` (default assets/people.jpg) tiled `grid` x `grid` times, resized to `size` (w, h).
+
+    Tiling the crowd picture multiplies the number of people in the frame, which is how the
+    benchmarks vary detection counts with a real model. Falls back to seeded noise when the
+    image cannot be read.
+    """
+    image = cv2.imread(path or DEFAULT_IMAGE)
+    if image is None:
+        if path:
+            raise FileNotFoundError(f"Image not found at {path}")
+        image = np.random.default_rng(0).integers(0, 256, (720, 1280, 3), dtype=np.uint8)
+    if grid > 1:
+        image = np.tile(image, (grid, grid, 1))
+    if size is not None:
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    return image
+
+
+def parse_size(text: str) -> tuple[int, int]:
+    """'1920x1080' -> (1920, 1080)."""
+    w, _, h = text.lower().partition('x')
+    return int(w), int(h)
+
+
+def timed_runs(fn, runs: int, warmup: int = 1):
+    """Call `fn()` `warmup` times untimed, then `runs` times; returns (latencies, last result)."""
+    result = None
+    for _ in range(warmup):
+        result = fn()
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        latencies.append(time.perf_counter() - start)
+    return latencies, result
+
+
+def environment() -> dict:
+    """Where the numbers came from: commit, interpreter, library versions and CPU."""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=SERVER_DIR, capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    env = {
+        'commit': commit,
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+    }
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        env['torch'] = torch.__version__
+        env['torch_threads'] = torch.get_num_threads()
+    return env
+
+
+def write_report(path: str, suite: str, args, cases: list[dict]) -> dict:
+    """Write `{suite, created, environment, args, cases}` as JSON to `path` and return it."""
+    report = {
+        'suite': suite,
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'environment': environment(),
+        'args': vars(args),
+        'cases': cases,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {path}")
+    return report
+
+
+def print_table(cases: list[dict], keys: list[str]):
+    """One line per case: the given parameter keys, then p50/p95/p99 in ms and throughput."""
+    widths = [max(len(k), *(len(str(case.get(k))) for case in cases)) + 2 for k in keys]
+    print(''.join(f'{k:>{w}}' for k, w in zip(keys, widths)) + f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'per s':>9}")
+    for case in cases:
+        line = ''.join(f"{str(case.get(k)):>{w}}" for k, w in zip(keys, widths))
+        s = case['latency']
+        if not s.get('n'):
+            print(line + f"{'-':>10}{'-':>10}{'-':>10}{'-':>9}")
+            continue
+        print(line + f"{s['p50'] * 1000:>10.2f}{s['p95'] * 1000:>10.2f}{s['p99'] * 1000:>10.2f}{s['throughput']:>9.2f}")
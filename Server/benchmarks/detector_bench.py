@@ -0,0 +1,90 @@
+"""Microbenchmark `Detector.detect` across resolutions, resize_long_edge, TTA and people counts.
+
+Run from the Server folder:
+    python -m benchmarks.detector_bench
+    python -m benchmarks.detector_bench --sizes 1280x720 3840x2160 --resize none 800 --tta none hflip --grids 1 2 3
+    python -m benchmarks.detector_bench --runtime onnx --artifact Detection/models/frcnn.onnx --threads 4 --out onnx.json
+
+Every combination of the sweep lists is one case. `--grids` tiles the crowd
+image N x N before resizing, so the same frame size holds ~N^2 times as many
+people (more boxes for NMS and rendering). Each case gets `--warmup` untimed
+calls, then `--runs` timed ones; the report holds p50/p95/p99 latency,
+throughput, the detected count and the mean time per stage (from
+`Detector.detect(..., timings=...)`).
+"""
+
+import argparse
+import itertools
+import time
+
+from Detection.detect import Detector
+
+from benchmarks.common import load_image, parse_size, print_table, summarize, write_report
+
+
+def bench_case(det, image, runs: int, warmup: int, confidence: float, return_image: bool, **params):
+    for _ in range(warmup):
+        det.detect(image, confidence_threshold=confidence, return_image=return_image, **params)
+    latencies, stages = [], {}
+    count = 0
+    for _ in range(runs):
+        timings = {}
+        start = time.perf_counter()
+        _, _, count = det.detect(image, confidence_threshold=confidence, return_image=return_image, timings=timings, **params)
+        latencies.append(time.perf_counter() - start)
+        for stage, seconds in timings.items():
+            stages[stage] = stages.get(stage, 0.0) + seconds
+    return {
+        'latency': summarize(latencies),
+        'count': int(count),
+        'stages': {stage: total / runs for stage, total in stages.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', default=None, help='source image (default: Detection/assets/people.jpg)')
+    parser.add_argument('--sizes', nargs='+', default=['1280x720', '1920x1080'], help='frame sizes WxH')
+    parser.add_argument('--resize', nargs='+', default=['none', '800'], help="resize_long_edge values ('none' = off)")
+    parser.add_argument('--tta', nargs='+', default=['none', 'hflip'], help="TTA presets ('none' = off)")
+    parser.add_argument('--grids', type=int, nargs='+', default=[1], help='tile the image N x N to add people')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--confidence', type=float, default=0.8)
+    parser.add_argument('--boxes-only', action='store_true', help='return_image=False (skip rendering)')
+    parser.add_argument('--backend', default='frcnn')
+    parser.add_argument('--runtime', default='eager')
+    parser.add_argument('--artifact', default=None)
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--quantize', default=None)
+    parser.add_argument('--device', default=None)
+    parser.add_argument('--out', default='benchmarks/results/detector.json')
+    args = parser.parse_args()
+
+    build_start = time.perf_counter()
+    det = Detector(device=args.device, backend=args.backend, runtime=args.runtime, artifact=args.artifact,
+                   num_threads=args.threads, quantize=args.quantize)
+    load_time = time.perf_counter() - build_start
+    print(f"{args.backend}/{args.runtime} on {det.device}, loaded in {load_time:.2f}s")
+
+    cases = []
+    for size, resize, tta, grid in itertools.product(args.sizes, args.resize, args.tta, args.grids):
+        image = load_image(args.image, parse_size(size), grid)
+        params = {
+            'resize_long_edge': None if resize == 'none' else int(resize),
+            'tta': None if tta == 'none' else tta,
+        }
+        result = bench_case(det, image, args.runs, args.warmup, args.confidence, not args.boxes_only, **params)
+        case = {'size': size, 'resize': resize, 'tta': tta, 'grid': grid, **result}
+        cases.append(case)
+        print(f"{size} resize={resize} tta={tta} grid={grid}: p50 {result['latency']['p50'] * 1000:.1f}ms, "
+              f"{result['count']} people")
+
+    print()
+    print_table(cases, ['size', 'resize', 'tta', 'grid', 'count'])
+    args.load_time = load_time
+    write_report(args.out, 'detector', args, cases)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+"""End-to-end load generator: simulated Socket.IO clients and concurrent `/upload-image` posts.
+
+Start the server as usual (e.g. `python app.py`), then from the Server folder:
+    python -m benchmarks.load_test --clients 8 --duration 30
+    python -m benchmarks.load_test --clients 16 --fps 5 --event frame --mode boxes
+    python -m benchmarks.load_test --clients 0 --uploads 4 --duration 20 --out benchmarks/results/uploads.json
+
+Each Socket.IO client follows the credit protocol (sends a frame when it holds
+a credit, at most `--fps` per second) and measures the round trip from emit to
+`processed_frame` / `processed_frame_bin`. Every frame carries a `seq` id that
+the server echoes, so replies are matched to their frame even when frames
+are dropped or answered out of order.
+Throughput counts only the replies received during the load period (until
+the clients are told to stop) over that period; replies still arriving in the
+drain afterwards add to the latencies and are reported as `drained`. Upload workers post one image after
+another. Frames cycle through `--variants` slightly different encodings so the
+result cache does not answer them (use `--variants 1` to measure cache hits).
+
+The report holds p50/p95/p99 round-trip latency and throughput for each kind
+of traffic, the server-reported `latency` (receipt to reply) and counts of
+cached / reused / tracked replies, errors and dropped frames.
+
+Needs the Socket.IO client: pip install "python-socketio[client]".
+"""
+
+import argparse
+import base64
+import threading
+import time
+import urllib.request
+import uuid
+
+import cv2
+import numpy as np
+
+from benchmarks.common import load_image, parse_size, print_table, summarize, write_report
+
+
+def _socketio():
+    try:
+        import socketio
+    except ImportError as e:
+        raise ImportError('The load test needs the Socket.IO client: pip install "python-socketio[client]"') from e
+    return socketio
+
+
+def make_variants(image, n: int, quality: int = 80, seed: int = 0):
+    """`n` JPEG encodings of `image`, each with a different 8x8 noise patch in the corner."""
+    rng = np.random.default_rng(seed)
+    variants = []
+    for _ in range(max(1, n)):
+        frame = image.copy()
+        if n > 1:
+            frame[:8, :8] = rng.integers(0, 256, (8, 8, 3), dtype=np.uint8)
+        variants.append(cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), quality])[1].tobytes())
+    return variants
+
+
+class SocketClient:
+    """One simulated browser tab sending frames over Socket.IO until `stop` is set."""
+
+    def __init__(self, url: str, frames, event: str, mode: str, confidence: float, fps: float,
+                 division: str, transports=None):
+        self.url = url
+        self.frames = frames
+        self.event = event
+        self.mode = mode
+        self.confidence = confidence
+        self.interval = 1.0 / fps if fps > 0 else 0.0
+        self.division = division
+        self.transports = transports
+        self.round_trips = []
+        self.server_latencies = []
+        self.outcomes = {'cached': 0, 'reused': 0, 'tracked': 0}
+        self.errors = 0
+        self.dropped = 0
+        self.drained = 0  # replies received after `stop` was set
+        self._stop = None
+        self._sent = {}  # seq -> send time
+        self._credit = threading.Event()
+        self._lock = threading.Lock()
+
+    def _on_processed(self, data):
+        now = time.perf_counter()
+        with self._lock:
+            sent_at = self._sent.pop(data.get('seq'), None)
+            if sent_at is not None:
+                self.round_trips.append(now - sent_at)
+                if self._stop is not None and self._stop.is_set():
+                    self.drained += 1
+            self.server_latencies.append(float(data.get('latency', 0.0)))
+            for key in self.outcomes:
+                if data.get(key):
+                    self.outcomes[key] += 1
+            self.dropped = int(data.get('stats', {}).get('dropped', self.dropped))
+
+    def _on_error(self, data):
+        with self._lock:
+            self.errors += 1
+            self._sent.pop(data.get('seq') if isinstance(data, dict) else None, None)
+
+    def run(self, stop: threading.Event):
+        self._stop = stop
+        sio = _socketio().Client(reconnection=False)
+        reply = 'processed_frame_bin' if self.event == 'frame_bin' else 'processed_frame'
+        sio.on(reply, self._on_processed)
+        sio.on('error', self._on_error)
+        sio.on('connected', lambda data: self._credit.set())
+        sio.on('frame_ack', lambda data: self._credit.set())
+        sio.connect(self.url, transports=self.transports)
+        try:
+            i = 0
+            next_send = time.perf_counter()
+            while not stop.is_set():
+                if not self._credit.wait(timeout=0.1):
+                    continue
+                delay = next_send - time.perf_counter()
+                if delay > 0 and stop.wait(delay):
+                    break
+                self._credit.clear()
+                frame = self.frames[i % len(self.frames)]
+                i += 1
+                payload = {'image': frame, 'confidence': self.confidence, 'mode': self.mode, 'division': self.division,
+                           'seq': i}
+                if self.event == 'frame_bin':
+                    payload['format'] = 'jpeg'
+                with self._lock:
+                    self._sent[i] = time.perf_counter()
+                sio.emit(self.event, payload)
+                next_send = max(next_send + self.interval, time.perf_counter()) if self.interval else 0.0
+            # let in-flight replies arrive so the tail latencies are not lost (dropped frames never reply)
+            deadline = time.perf_counter() + 5.0
+            while self._sent and time.perf_counter() < deadline:
+                time.sleep(0.01)
+                with self._lock:
+                    if self.dropped >= len(self._sent):
+                        break
+        finally:
+            sio.disconnect()
+
+
+def _multipart(fields: dict, file_bytes: bytes):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="frame.jpg"\r\n'
+                 f'Content-Type: image/jpeg\r\n\r\n'.encode() + file_bytes + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+class UploadWorker:
+    """Posts frames to `/upload-image` back to back until `stop` is set."""
+
+    def __init__(self, url: str, frames, mode: str, confidence: float, division: str, offset: int = 0):
+        self.url = url.rstrip('/') + '/upload-image'
+        self.frames = frames
+        self.fields = {'confidence': confidence, 'mode': mode, 'division': division}
+        self.offset = offset
+        self.round_trips = []
+        self.errors = 0
+        self.drained = 0  # requests that completed after `stop` was set
+
+    def run(self, stop: threading.Event):
+        i = self.offset
+        while not stop.is_set():
+            body, content_type = _multipart(self.fields, self.frames[i % len(self.frames)])
+            i += 1
+            req = urllib.request.Request(self.url, data=body, headers={'Content-Type': content_type})
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(req, timeout=60) as resp:
+                    resp.read()
+                self.round_trips.append(time.perf_counter() - start)
+                if stop.is_set():
+                    self.drained += 1
+            except OSError:
+                self.errors += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--clients', type=int, default=4, help='simulated Socket.IO clients')
+    parser.add_argument('--uploads', type=int, default=0, help='concurrent /upload-image workers')
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds of load')
+    parser.add_argument('--fps', type=float, default=0.0, help='max frames per second per client (0 = credit-limited)')
+    parser.add_argument('--event', choices=['frame_bin', 'frame'], default='frame_bin')
+    parser.add_argument('--mode', choices=['image', 'boxes'], default='image')
+    parser.add_argument('--transport', choices=['websocket', 'polling'], default=None)
+    parser.add_argument('--image', default=None, help='source image (default: Detection/assets/people.jpg)')
+    parser.add_argument('--size', default='1280x720', help='frame size WxH')
+    parser.add_argument('--quality', type=int, default=80, help='JPEG quality of the sent frames')
+    parser.add_argument('--variants', type=int, default=16, help='distinct frames to cycle through')
+    parser.add_argument('--confidence', type=float, default=0.8)
+    parser.add_argument('--division', default='loadtest')
+    parser.add_argument('--out', default='benchmarks/results/load.json')
+    args = parser.parse_args()
+
+    frames = make_variants(load_image(args.image, parse_size(args.size)), args.variants, args.quality)
+    if args.event == 'frame':
+        frames = ['data:image/jpeg;base64,' + base64.b64encode(f).decode('ascii') for f in frames]
+    upload_frames = make_variants(load_image(args.image, parse_size(args.size)), args.variants, args.quality, seed=1)
+
+    transports = [args.transport] if args.transport else None
+    clients = [SocketClient(args.url, frames, args.event, args.mode, args.confidence, args.fps, args.division, transports)
+               for _ in range(args.clients)]
+    uploaders = [UploadWorker(args.url, upload_frames, args.mode, args.confidence, args.division, offset=i)
+                 for i in range(args.uploads)]
+
+    stop = threading.Event()
+    threads = [threading.Thread(target=w.run, args=(stop,), daemon=True) for w in clients + uploaders]
+    print(f"{len(clients)} socket clients ({args.event}), {len(uploaders)} upload workers, {args.duration:.0f}s "
+          f"against {args.url}")
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(args.duration)
+    stop.set()
+    elapsed = time.perf_counter() - started  # the load period; the drain and joins below are not part of it
+    for t in threads:
+        t.join(timeout=10)
+
+    cases = []
+    if clients:
+        round_trips = [x for c in clients for x in c.round_trips]
+        drained = sum(c.drained for c in clients)
+        outcomes = {key: sum(c.outcomes[key] for c in clients) for key in clients[0].outcomes}
+        cases.append({
+            'traffic': args.event,
+            'workers': len(clients),
+            'latency': summarize(round_trips, elapsed, items=len(round_trips) - drained),
+            'server_latency': summarize([x for c in clients for x in c.server_latencies], elapsed,
+                                        items=len(round_trips) - drained),
+            'drained': drained,
+            'outcomes': outcomes,
+            'errors': sum(c.errors for c in clients),
+            'dropped': sum(c.dropped for c in clients),
+        })
+    if uploaders:
+        round_trips = [x for w in uploaders for x in w.round_trips]
+        drained = sum(w.drained for w in uploaders)
+        cases.append({
+            'traffic': 'upload-image',
+            'workers': len(uploaders),
+            'latency': summarize(round_trips, elapsed, items=len(round_trips) - drained),
+            'drained': drained,
+            'errors': sum(w.errors for w in uploaders),
+        })
+
+    print()
+    print_table(cases, ['traffic', 'workers', 'errors'])
+    write_report(args.out, 'load', args, cases)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""Image encoding and decoding for the HTTP and Socket.IO endpoints.
+
+Frames arrive as base64 data URLs (`frame`, `/upload-image` replies) or raw
+JPEG/WebP bytes (`frame_bin`) and leave the same way. The helpers accept an
+optional `timings` dict and add the seconds spent in each stage to it
+('b64decode', 'imdecode', 'imencode', 'b64encode'; see metrics.timed).
+"""
+
+import base64
+
+import cv2
+import numpy as np
+
+from metrics import timed
+
+IMAGE_FORMATS = {
+    'jpeg': ('.jpg', cv2.IMWRITE_JPEG_QUALITY, 'image/jpeg'),
+    'webp': ('.webp', cv2.IMWRITE_WEBP_QUALITY, 'image/webp'),
+}
+
+
+def decode_base64_image(b64_str: str, timings=None):
+    # Accept either data URL (data:image/..;base64,...) or raw base64
+    with timed(timings, 'b64decode'):
+        if ',' in b64_str:
+            b64_str = b64_str.split(',', 1)[1]
+        img_bytes = base64.b64decode(b64_str)
+    return decode_image_bytes(img_bytes, timings)
+
+
+def decode_image_bytes(buf, timings=None):
+    # decode straight from the received buffer (bytes/bytearray/memoryview), no intermediate copies
+    with timed(timings, 'imdecode'):
+        arr = np.frombuffer(buf, dtype=np.uint8)
+        img = cv2.imdecode(arr, cv2.IMREAD_COLOR)
+    return img
+
+
+def encode_image_bytes(img, fmt: str = 'jpeg', quality: int = 90, timings=None) -> bytes:
+    ext, quality_flag, _ = IMAGE_FORMATS.get(fmt, IMAGE_FORMATS['jpeg'])
+    with timed(timings, 'imencode'):
+        _, buf = cv2.imencode(ext, img, [int(quality_flag), int(quality)])
+    return buf.tobytes()
+
+
+def encode_image_to_base64(img, timings=None, quality: int = 90) -> str:
+    with timed(timings, 'imencode'):
+        _, buf = cv2.imencode('.jpg', img, [int(cv2.IMWRITE_JPEG_QUALITY), int(quality)])
+    with timed(timings, 'b64encode'):
+        b64 = base64.b64encode(buf).decode('utf-8')
+    return 'data:image/jpeg;base64,' + b64
@@ -0,0 +1,356 @@
+"""Multi-process inference pool with shared-memory frame hand-off.
+
+PyTorch inference holds the CPU for the whole forward pass, so running it
+inside the gevent/eventlet web process stalls every socket and HTTP request.
+`InferencePool` moves it into N worker processes, each with its own warm
+`Detector` and a pinned torch thread count.
+
+Frames are not pickled: every worker owns a `multiprocessing.shared_memory`
+ring of fixed-size slots. The parent copies a frame into a free slot and
+sends only (slot, shape) over the control queue; the worker reads the frame
+in place and, when an annotated image is requested, renders it back into
+the same slot. Frames larger than a slot fall back to being sent inline.
+
+Results come back on one result queue that a background task polls without
+blocking, resolving `concurrent.futures.Future` objects the calling
+greenlet/thread waits on. The pool exposes the same `detect` /
+`detect_batch` interface as `Detector`, so it can be used in its place.
+
+The collector also watches the worker processes. A worker that dies after
+it was ready (crash, OOM kill) has its outstanding batches failed and is
+restarted, up to `max_restarts` times. A worker that cannot build its
+`Detector` (or dies before it is ready) fails the whole pool: `error` is
+set, `on_failure(error)` is called and further submits raise.
+"""
+
+import atexit
+import itertools
+import multiprocessing as mp
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+def _slot_view(shm, slot_bytes, slot, shape):
+    return np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=slot * slot_bytes)
+
+
+@contextmanager
+def _without_main_module():
+    """Keep spawned workers from re-importing the parent's `__main__` (e.g. app.py, which builds the server).
+
+    `spawn` runs the main script again in every child (as `__mp_main__`) unless the main module has neither
+    `__spec__` nor `__file__`; `_worker_main` lives in this module and only needs `Detection.detect`.
+    """
+    main = sys.modules.get('__main__')
+    saved = {name: main.__dict__[name] for name in ('__spec__', '__file__') if main is not None and name in main.__dict__}
+    try:
+        for name in saved:
+            if name == '__spec__':
+                main.__spec__ = None
+            else:
+                del main.__file__
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(main, name, value)
+
+
+def _worker_main(index, generation, shm_name, slot_bytes, detector_kwargs, torch_threads, warmup, ctrl_q, result_q):
+    import torch
+    from Detection.detect import Detector
+
+    if torch_threads:
+        torch.set_num_threads(torch_threads)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        detector = Detector(**detector_kwargs)
+        if warmup:
+            detector.warmup(**warmup)
+    except Exception as e:
+        shm.close()
+        result_q.put(('failed', index, generation, repr(e)))
+        return
+    result_q.put(('ready', index, generation, None))
+    try:
+        while True:
+            msg = ctrl_q.get()
+            if msg is None:
+                break
+            job_id, items, params = msg
+            try:
+                images = [
+                    _slot_view(shm, slot_bytes, slot, shape) if slot is not None else inline
+                    for slot, shape, inline in items
+                ]
+                timings = {}
+                results = detector.detect_batch(images, timings=timings, **params)
+                out = []
+                for (slot, shape, _), (output, *rest) in zip(items, results):
+                    if isinstance(output, np.ndarray) and slot is not None and output.shape == tuple(shape):
+                        # annotated frame goes back through the same slot
+                        _slot_view(shm, slot_bytes, slot, shape)[...] = output
+                        output = None
+                    out.append((output, *rest))
+                result_q.put(('result', index, job_id, (out, timings)))
+            except Exception as e:
+                result_q.put(('error', index, job_id, repr(e)))
+    finally:
+        shm.close()
+
+
+class _Worker:
+    def __init__(self, index, process, ctrl_q, shm, slots, generation=0):
+        self.index = index
+        self.process = process
+        self.ctrl_q = ctrl_q
+        self.shm = shm
+        self.free_slots = list(range(slots))
+        self.in_flight = 0
+        self.ready = False
+        # bumped on every restart so a late 'ready' from a previous process is ignored
+        self.generation = generation
+        self.restarts = 0
+
+
+class InferencePool:
+    """Pool of inference worker processes, each holding a warm `Detector`.
+
+    Usage:
+        pool = InferencePool(4, {'backend': 'frcnn'}, torch_threads=2,
+                             spawn=socketio.start_background_task, sleep=socketio.sleep)
+        out_img, t, count = pool.detect(img, confidence_threshold=0.8)
+
+    `spawn(fn)` starts the result-collector task and `sleep(seconds)` yields
+    while it polls; pass the Socket.IO helpers so both cooperate with the
+    server's async mode (defaults: a daemon thread and `time.sleep`).
+    `warmup` (keyword arguments of `Detector.warmup`) runs in every worker
+    before it reports ready. `on_failure(error)` is called once if the pool
+    can no longer serve (see the module docstring).
+    """
+
+    def __init__(
+        self,
+        num_workers: int,
+        detector_kwargs: dict | None = None,
+        torch_threads: int | None = None,
+        slots_per_worker: int = 4,
+        slot_bytes: int = 4 * 1024 * 1024,
+        spawn=None,
+        sleep=None,
+        poll_interval: float = 0.002,
+        warmup: dict | None = None,
+        health_interval: float = 0.5,
+        max_restarts: int = 3,
+        on_failure=None,
+    ):
+        self.num_workers = max(1, int(num_workers))
+        self.slot_bytes = int(slot_bytes)
+        self.slots_per_worker = int(slots_per_worker)
+        self.poll_interval = poll_interval
+        self.health_interval = health_interval
+        self.max_restarts = int(max_restarts)
+        self.on_failure = on_failure
+        self.error = None
+        self._sleep = sleep or time.sleep
+        self._lock = threading.Lock()
+        self._futures = {}
+        self._job_ids = itertools.count()
+        self._result_q = None
+        self._workers = []
+        self._closed = False
+        self._worker_config = (detector_kwargs or {}, torch_threads, warmup)
+
+        # spawn (not fork): workers must not inherit the parent's monkey-patched event loop or torch threads
+        self._ctx = mp.get_context('spawn')
+        self._result_q = self._ctx.Queue()
+        for index in range(self.num_workers):
+            shm = shared_memory.SharedMemory(create=True, size=self.slot_bytes * self.slots_per_worker)
+            process, ctrl_q = self._start_process(index, 0, shm)
+            self._workers.append(_Worker(index, process, ctrl_q, shm, self.slots_per_worker))
+
+        if spawn is None:
+            threading.Thread(target=self._collect, daemon=True, name='inference-results').start()
+        else:
+            spawn(self._collect)
+        atexit.register(self.close)
+
+    def _start_process(self, index, generation, shm):
+        detector_kwargs, torch_threads, warmup = self._worker_config
+        ctrl_q = self._ctx.Queue()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(index, generation, shm.name, self.slot_bytes, detector_kwargs, torch_threads, warmup, ctrl_q,
+                  self._result_q),
+            daemon=True,
+            name=f'inference-worker-{index}',
+        )
+        with _without_main_module():
+            process.start()
+        return process, ctrl_q
+
+    @property
+    def ready(self) -> bool:
+        # a worker being restarted after a crash does not make the pool unready: the others take its batches
+        return self.error is None and all(w.ready or w.restarts for w in self._workers)
+
+    @property
+    def ready_workers(self) -> int:
+        return sum(w.ready for w in self._workers)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return sum(w.in_flight for w in self._workers)
+
+    def submit(self, images, **params) -> Future:
+        """Send a batch to the least busy worker. The future resolves to `detect_batch`'s result list.
+
+        Once resolved, `future.timings` holds the worker's per-stage seconds.
+        """
+        fut = Future()
+        fut.timings = {}
+        with self._lock:
+            if self.error is not None or self._closed:
+                raise RuntimeError(f"inference pool unavailable: {self.error or 'closed'}")
+            # a restarting worker only gets batches when no ready worker is left
+            workers = [w for w in self._workers if w.ready] or self._workers
+            worker = min(workers, key=lambda w: w.in_flight)
+            job_id = next(self._job_ids)
+            items = []
+            for img in images:
+                img = np.ascontiguousarray(img, dtype=np.uint8)
+                if img.nbytes <= self.slot_bytes and worker.free_slots:
+                    slot = worker.free_slots.pop()
+                    _slot_view(worker.shm, self.slot_bytes, slot, img.shape)[...] = img
+                    items.append((slot, img.shape, None))
+                else:
+                    items.append((None, img.shape, img))
+            worker.in_flight += 1
+            self._futures[job_id] = (fut, worker, items)
+        worker.ctrl_q.put((job_id, items, params))
+        return fut
+
+    def detect_batch(self, images, timeout: float | None = 120.0, timings: dict | None = None, **params):
+        """Same contract as `Detector.detect_batch`; blocks only the calling greenlet/thread.
+
+        Raises `concurrent.futures.TimeoutError` after `timeout` seconds (None waits indefinitely).
+        """
+        fut = self.submit(images, **params)
+        results = fut.result(timeout=timeout)
+        if timings is not None:
+            for stage, seconds in fut.timings.items():
+                timings[stage] = timings.get(stage, 0.0) + seconds
+        return results
+
+    def detect(self, image, regions=None, **params):
+        """Same contract as `Detector.detect`: `regions` is this image's rectangle list."""
+        return self.detect_batch([image], regions=[regions] if regions else None, **params)[0]
+
+    def _finish(self, kind, job_id, payload):
+        with self._lock:
+            entry = self._futures.pop(job_id, None)
+            if entry is None:
+                return
+            fut, worker, items = entry
+            results = []
+            if kind == 'result':
+                payload, fut.timings = payload
+                for (slot, shape, _), (output, *rest) in zip(items, payload):
+                    if output is None:
+                        output = _slot_view(worker.shm, self.slot_bytes, slot, shape).copy()
+                    results.append((output, *rest))
+            worker.free_slots.extend(slot for slot, _, _ in items if slot is not None)
+            worker.in_flight -= 1
+        if kind == 'result':
+            fut.set_result(results)
+        else:
+            fut.set_exception(RuntimeError(f"inference worker {worker.index} failed: {payload}"))
+
+    def _fail_outstanding(self, worker, reason):
+        """Fail every batch submitted to `worker` and give its slots back."""
+        with self._lock:
+            failed = [job_id for job_id, (_, w, _) in self._futures.items() if w is worker]
+            entries = [self._futures.pop(job_id) for job_id in failed]
+            worker.free_slots = list(range(self.slots_per_worker))
+            worker.in_flight = 0
+        for fut, _, _ in entries:
+            fut.set_exception(RuntimeError(f"inference worker {worker.index} {reason}"))
+
+    def _fail_pool(self, error):
+        if self.error is not None:
+            return
+        self.error = error
+        print(f"[pool] {error}")
+        for w in self._workers:
+            self._fail_outstanding(w, 'unavailable: ' + error)
+        if self.on_failure is not None:
+            self.on_failure(error)
+
+    def _check_workers(self):
+        """Restart workers that died while serving; fail the pool if one died before it was ready."""
+        for w in self._workers:
+            if self.error is not None or w.process.is_alive():
+                continue
+            reason = f"exited with code {w.process.exitcode}"
+            if not w.ready or w.restarts >= self.max_restarts:
+                self._fail_pool(f"inference worker {w.index} {reason}")
+                return
+            print(f"[pool] inference worker {w.index} {reason}; restarting")
+            w.ready = False
+            self._fail_outstanding(w, reason)
+            w.restarts += 1
+            w.generation += 1
+            w.process, w.ctrl_q = self._start_process(w.index, w.generation, w.shm)
+
+    def _collect(self):
+        """Poll the result queue without blocking the event loop, resolve futures and watch the workers."""
+        next_check = time.monotonic() + self.health_interval
+        while not self._closed:
+            if time.monotonic() >= next_check:
+                self._check_workers()
+                next_check = time.monotonic() + self.health_interval
+            try:
+                kind, index, job_id, payload = self._result_q.get_nowait()
+            except queue.Empty:
+                self._sleep(self.poll_interval)
+                continue
+            if kind in ('ready', 'failed'):
+                worker = self._workers[index]
+                if job_id != worker.generation:
+                    continue  # from a process that has since been replaced
+                if kind == 'failed':
+                    self._fail_pool(f"inference worker {index} failed to load: {payload}")
+                    continue
+                worker.ready = True
+                print(f"[pool] inference worker {index} ready")
+                continue
+            self._finish(kind, job_id, payload)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        for w in self._workers:
+            try:
+                w.ctrl_q.put(None)
+            except Exception:
+                pass
+        for w in self._workers:
+            w.process.join(timeout=5)
+            if w.process.is_alive():
+                w.process.terminate()
+            w.shm.close()
+            try:
+                w.shm.unlink()
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            for fut, _, _ in self._futures.values():
+                fut.set_exception(RuntimeError("inference pool closed"))
+            self._futures.clear()
@@ -0,0 +1,159 @@
+"""Minimal Prometheus-style metrics: labelled histograms and callback gauges.
+
+The server records how long each hot-path stage takes (base64 decode,
+`imdecode`, tensor conversion, forward, NMS, rendering, `imencode`, base64
+encode, ...) per endpoint and division, and exposes them together with
+queue depth and frames in flight on `/metrics` in the Prometheus text
+format. Durations are measured with `time.perf_counter` (monotonic).
+
+No client library is needed; histograms are cumulative-bucket counters
+guarded by a lock.
+"""
+
+import math
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# seconds; covers sub-millisecond codec stages up to multi-second CPU inference
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_LABEL_VALUE = re.compile(r'[^A-Za-z0-9_.:-]')
+
+
+def clean_label(value, default: str = 'unknown', max_length: int = 32, allowed=None, other: str = 'other') -> str:
+    """Label values come from clients: keep them short and to a safe alphabet.
+
+    Only an `allowed` set bounds cardinality: values outside it (other than a missing one) become `other`.
+    """
+    value = _LABEL_VALUE.sub('', str(value or ''))[:max_length]
+    if not value:
+        return default
+    if allowed is not None and value not in allowed:
+        return other
+    return value
+
+
+@contextmanager
+def timed(timings: dict | None, stage: str):
+    """Add the seconds spent in the block to `timings[stage]` (no-op when `timings` is None)."""
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+
+def _format_value(value) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value))
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a fixed set of label names."""
+
+    def __init__(self, name: str, help_text: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues):
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, *labelvalues):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labelvalues)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted(self._series.items())
+            for labelvalues, values in series:
+                for bound, count in zip(self.buckets, values):
+                    labels = _format_labels(self.labelnames, labelvalues, ('le', _format_value(bound)))
+                    lines.append(f'{self.name}_bucket{labels} {count}')
+                labels = _format_labels(self.labelnames, labelvalues)
+                lines.append(f'{self.name}_sum{labels} {_format_value(values[-2])}')
+                lines.append(f'{self.name}_count{labels} {values[-1]}')
+        return lines
+
+
+class Gauge:
+    """Value read from a callback at scrape time (e.g. a queue length)."""
+
+    def __init__(self, name: str, help_text: str, fn, kind: str = 'gauge'):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+        self.kind = kind
+
+    def render(self):
+        try:
+            value = self.fn()
+        except Exception:
+            return []
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}', f'{self.name} {_format_value(value)}']
+
+
+class Metrics:
+    """Registry of histograms and gauges rendered together for `/metrics`.
+
+    Usage:
+        metrics = Metrics()
+        stages = metrics.histogram('smartflow_stage_seconds', 'Seconds per stage', ('stage', 'endpoint'))
+        stages.observe(0.012, 'imdecode', 'frame')
+        metrics.gauge('smartflow_queue_depth', 'Frames waiting', scheduler.qsize)
+        text = metrics.render()
+    """
+
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self):
+        self._metrics = []
+
+    def histogram(self, name: str, help_text: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        h = Histogram(name, help_text, labelnames, buckets)
+        self._metrics.append(h)
+        return h
+
+    def gauge(self, name: str, help_text: str, fn, kind: str = 'gauge') -> Gauge:
+        g = Gauge(name, help_text, fn, kind)
+        self._metrics.append(g)
+        return g
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
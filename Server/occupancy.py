@@ -0,0 +1,296 @@
+"""In-process occupancy time series per division / camera with rolling aggregates.
+
+Every reply carries a people `count`; `OccupancyStore.record` keeps them
+per series key (e.g. 'showroom', 'warehouse/dock-2', 'showroom#entrance'
+for a zone) so dashboards can ask for recent occupancy without touching
+the inference path.
+
+Each series has one `RollingWindow` per span (1 min, 15 min, 1 h by
+default). A window is a ring of 60 time buckets of fixed-size arrays: the
+sample count, sum and max per bucket plus a histogram of the (integer)
+counts. Running totals are updated on every sample, and when the ring
+moves on, the expiring bucket is subtracted, so the mean, max and
+percentiles of a window never rescan its history: a query costs
+O(buckets + histogram bins). Percentiles are exact for counts below
+`max_value` (larger counts fall in the top bin). Timestamps are Unix
+seconds, so batch jobs over recorded footage can replay their own times.
+
+Queries look at the window ending at `at` (default: now); `at` may not be
+earlier than a series' newest bucket, since the ring has already moved
+past that window (`ValueError`).
+
+`save` / `load` write all series to one compressed `.npz` snapshot
+(mostly empty histograms compress to almost nothing). `snapshot` copies
+the arrays under the lock and `write_snapshot` compresses and writes
+them, so a server can take the copy on its event loop and leave only the
+file work to a thread; it does this periodically and reloads the snapshot
+at startup.
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+
+# name -> span in seconds
+WINDOWS = {'1m': 60, '15m': 15 * 60, '1h': 60 * 60}
+QUANTILES = (50, 90, 95, 99)
+SNAPSHOT_VERSION = 1
+
+
+class RollingWindow:
+    """Aggregates of the samples from the last `span` seconds, kept in `buckets` time buckets."""
+
+    def __init__(self, span: float, buckets: int = 60, max_value: int = 256):
+        self.span = float(span)
+        self.buckets = int(buckets)
+        self.width = self.span / self.buckets
+        self.max_value = int(max_value)
+        self.n = np.zeros(self.buckets, dtype=np.int64)
+        self.sum = np.zeros(self.buckets, dtype=np.float64)
+        self.max = np.zeros(self.buckets, dtype=np.float64)
+        self.hist = np.zeros((self.buckets, self.max_value), dtype=np.int32)
+        self.head = None  # absolute index (time // width) of the newest bucket
+        self._reset_totals()
+
+    def _reset_totals(self):
+        self.total_n = int(self.n.sum())
+        self.total_sum = float(self.sum.sum())
+        self.total_hist = self.hist.sum(axis=0, dtype=np.int64)
+
+    def _expiring(self, index: int):
+        """Ring slots that fall out of the window when the newest bucket becomes `index`."""
+        if self.head is None or index <= self.head:
+            return []
+        return [b % self.buckets for b in range(self.head + 1, self.head + 1 + min(index - self.head, self.buckets))]
+
+    def add(self, t: float, value: float) -> bool:
+        """Add one sample at Unix time `t`. Returns False if it is older than the window."""
+        index = int(t // self.width)
+        if self.head is not None and index <= self.head - self.buckets:
+            return False
+        for slot in self._expiring(index):
+            if self.n[slot]:
+                self.total_n -= int(self.n[slot])
+                self.total_sum -= float(self.sum[slot])
+                self.total_hist -= self.hist[slot]
+                self.n[slot] = 0
+                self.sum[slot] = 0.0
+                self.max[slot] = 0.0
+                self.hist[slot] = 0
+        if self.head is None or index > self.head:
+            self.head = index
+        slot = index % self.buckets
+        value = max(0.0, float(value))
+        self.n[slot] += 1
+        self.sum[slot] += value
+        self.max[slot] = max(self.max[slot], value)
+        self.hist[slot, min(int(value), self.max_value - 1)] += 1
+        self.total_n += 1
+        self.total_sum += value
+        self.total_hist[min(int(value), self.max_value - 1)] += 1
+        return True
+
+    def _check_at(self, at: float):
+        if self.head is not None and int(at // self.width) < self.head:
+            raise ValueError(f"'at' {at} is earlier than the newest sample of the {self.span:g}s window")
+
+    def stats(self, at: float | None = None, quantiles=QUANTILES) -> dict:
+        """Samples, mean, max and percentiles of the window ending at `at` (default: the newest sample)."""
+        n, total, hist = self.total_n, self.total_sum, self.total_hist
+        live = self.n > 0
+        if at is not None:
+            self._check_at(at)
+            expired = self._expiring(int(at // self.width))
+            if expired:
+                # read-only view of the window at `at`: leave the ring for `add` to advance
+                n -= int(self.n[expired].sum())
+                total -= float(self.sum[expired].sum())
+                hist = hist - self.hist[expired].sum(axis=0)
+                live = live.copy()
+                live[expired] = False
+        if n <= 0:
+            return {'samples': 0, 'mean': None, 'max': None, **{f'p{q}': None for q in quantiles}}
+        cumulative = np.cumsum(hist)
+        out = {'samples': int(n), 'mean': total / n, 'max': float(self.max[live].max())}
+        for q in quantiles:
+            rank = max(1, int(np.ceil(q / 100.0 * n)))
+            out[f'p{q}'] = int(np.searchsorted(cumulative, rank))
+        return out
+
+    def points(self, at: float | None = None):
+        """[(bucket start, mean, max), ...] oldest first, for the non-empty buckets still in the window."""
+        if self.head is None:
+            return []
+        if at is not None:
+            self._check_at(at)
+        newest = int(at // self.width) if at is not None else self.head
+        out = []
+        for index in range(newest - self.buckets + 1, newest + 1):
+            slot = index % self.buckets
+            if index <= self.head and index > self.head - self.buckets and self.n[slot]:
+                out.append((index * self.width, float(self.sum[slot] / self.n[slot]), float(self.max[slot])))
+        return out
+
+
+class Series:
+    """Latest sample and one `RollingWindow` per span for one key."""
+
+    def __init__(self, windows=WINDOWS, buckets: int = 60, max_value: int = 256):
+        self.windows = {name: RollingWindow(span, buckets, max_value) for name, span in windows.items()}
+        self.last_time = None
+        self.last_value = None
+
+    def add(self, t: float, value: float) -> bool:
+        """Add one sample. Returns False if it is older than every window."""
+        added = False
+        for window in self.windows.values():
+            added = window.add(t, value) or added
+        if added and (self.last_time is None or t >= self.last_time):
+            self.last_time, self.last_value = t, value
+        return added
+
+
+class OccupancyStore:
+    """Thread-safe map of series key -> `Series`.
+
+    Usage:
+        store = OccupancyStore()
+        store.record('showroom', 12)
+        store.record_many('warehouse/recorded', timestamps, counts)
+        store.query('showroom')        # {'last': ..., 'windows': {'1m': {...}, '15m': {...}, '1h': {...}}}
+        store.save('occupancy.npz'); store = OccupancyStore.load('occupancy.npz')
+    """
+
+    def __init__(self, windows=WINDOWS, buckets: int = 60, max_value: int = 256, max_series: int = 1024):
+        self.windows = dict(windows)
+        self.buckets = int(buckets)
+        self.max_value = int(max_value)
+        self.max_series = int(max_series)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        series = self._series.get(key)
+        if series is None:
+            if len(self._series) >= self.max_series:
+                return None
+            series = self._series[key] = Series(self.windows, self.buckets, self.max_value)
+        return series
+
+    def record(self, key: str, value: float, t: float | None = None) -> bool:
+        t = time.time() if t is None else float(t)
+        with self._lock:
+            series = self._get(key)
+            return series is not None and series.add(t, value)
+
+    def record_many(self, key: str, times, values, chunk: int = 2048) -> int:
+        """Add (time, value) samples in time order; the lock is released between chunks.
+
+        Returns the number of samples added: non-finite ones, those older than every window and
+        those past the series limit are not.
+        """
+        times = np.asarray(times, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        finite = np.isfinite(times) & np.isfinite(values)
+        times, values = times[finite], values[finite]
+        order = np.argsort(times, kind='stable')
+        times, values = times[order], values[order]
+        added = 0
+        for start in range(0, len(times), chunk):
+            with self._lock:
+                series = self._get(key)
+                if series is None:
+                    break
+                for t, value in zip(times[start:start + chunk], values[start:start + chunk]):
+                    added += series.add(float(t), float(value))
+        return added
+
+    def keys(self):
+        with self._lock:
+            return sorted(self._series)
+
+    def query(self, key: str, at: float | None = None, points: str | None = None) -> dict | None:
+        """Aggregates of `key` for windows ending at `at` (default: now). `points` adds that window's buckets.
+
+        Raises ValueError if `at` is earlier than the newest bucket of one of the windows.
+        """
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                return None
+            if at is None:
+                # now, unless replayed samples are timed later
+                at = max(time.time(), series.last_time or 0.0)
+            out = {
+                'key': key,
+                'last': series.last_value,
+                'last_time': series.last_time,
+                'windows': {name: w.stats(at) for name, w in series.windows.items()},
+            }
+            if points in series.windows:
+                out['points'] = series.windows[points].points(at)
+            return out
+
+    def query_all(self, at: float | None = None) -> dict:
+        return {key: self.query(key, at) for key in self.keys()}
+
+    def save(self, path: str):
+        """Write every series to a compressed `.npz` snapshot at `path` (atomically)."""
+        self.write_snapshot(path, self.snapshot())
+
+    def snapshot(self) -> dict:
+        """Copies of every series' arrays, taken under the lock; `write_snapshot` writes them."""
+        with self._lock:
+            keys = sorted(self._series)
+            arrays = {
+                'version': np.array(SNAPSHOT_VERSION),
+                'keys': np.array(keys, dtype=str),
+                'window_names': np.array(list(self.windows), dtype=str),
+                'window_spans': np.array(list(self.windows.values()), dtype=np.float64),
+                'last': np.array([(s.last_time or np.nan, s.last_value if s.last_value is not None else np.nan)
+                                  for s in (self._series[k] for k in keys)], dtype=np.float64).reshape(-1, 2),
+            }
+            for i, name in enumerate(self.windows):
+                windows = [self._series[k].windows[name] for k in keys]
+                arrays[f'w{i}_head'] = np.array([-1 if w.head is None else w.head for w in windows], dtype=np.int64)
+                arrays[f'w{i}_n'] = np.array([w.n for w in windows], dtype=np.int64).reshape(len(keys), self.buckets)
+                arrays[f'w{i}_sum'] = np.array([w.sum for w in windows]).reshape(len(keys), self.buckets)
+                arrays[f'w{i}_max'] = np.array([w.max for w in windows]).reshape(len(keys), self.buckets)
+                arrays[f'w{i}_hist'] = np.array([w.hist for w in windows], dtype=np.int32).reshape(
+                    len(keys), self.buckets, self.max_value)
+        return arrays
+
+    @staticmethod
+    def write_snapshot(path: str, arrays: dict):
+        """Compress `arrays` (from `snapshot`) into `path`, atomically. Does not touch the store."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = f"{path}.tmp{os.getpid()}"
+        with open(tmp, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, max_series: int = 1024) -> 'OccupancyStore':
+        with np.load(path) as data:
+            if int(data['version']) != SNAPSHOT_VERSION:
+                raise ValueError(f"unsupported occupancy snapshot version {int(data['version'])}")
+            windows = dict(zip(data['window_names'].tolist(), data['window_spans'].tolist()))
+            hist0 = data['w0_hist']
+            store = cls(windows, buckets=hist0.shape[1], max_value=hist0.shape[2], max_series=max_series)
+            for k, key in enumerate(data['keys'].tolist()):
+                series = store._series[key] = Series(windows, store.buckets, store.max_value)
+                last_time, last_value = data['last'][k]
+                if not np.isnan(last_time):
+                    series.last_time, series.last_value = float(last_time), float(last_value)
+                for i, name in enumerate(windows):
+                    w = series.windows[name]
+                    head = int(data[f'w{i}_head'][k])
+                    w.head = None if head < 0 else head
+                    w.n[:] = data[f'w{i}_n'][k]
+                    w.sum[:] = data[f'w{i}_sum'][k]
+                    w.max[:] = data[f'w{i}_max'][k]
+                    w.hist[:] = data[f'w{i}_hist'][k]
+                    w._reset_totals()
+        return store
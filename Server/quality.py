@@ -0,0 +1,130 @@
+"""Per-session adaptive quality: hold a target p95 latency by trading resolution, JPEG quality and send rate.
+
+Static settings are either too slow at peak or waste accuracy off-peak. A
+`QualityController` per Socket.IO session watches the end-to-end latency
+(receipt to reply) of its inferred frames and moves along a ladder of
+(`resize_long_edge`, output JPEG quality) levels:
+
+- p95 above the target: step one level down the ladder; on the last level,
+  lengthen the suggested client send interval instead;
+- p95 below `headroom * target` for a full window: shorten the send
+  interval first, then step back up the ladder.
+
+Steps down react after `min_samples` frames, steps up need a full window,
+and the window restarts after every change so that only measurements of
+the current setting are judged. The suggested interval is never shorter
+than the session's median model time, since frames sent faster than that
+only wait for their credit.
+"""
+
+from collections import deque
+
+# (resize_long_edge, output JPEG quality), best first; None keeps the frame's own size
+QUALITY_LEVELS = (
+    (None, 90),
+    (1280, 85),
+    (1024, 80),
+    (800, 75),
+    (640, 70),
+    (480, 60),
+)
+
+
+def _percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100.0 * (len(ordered) - 1))))]
+
+
+class QualityController:
+    """Feedback controller for one session.
+
+    Usage:
+        ctrl = QualityController(target_p95=0.5)
+        job.resize_long_edge = ctrl.resize_for(image)   # before inference
+        job.quality = ctrl.jpeg_quality                 # when encoding the reply
+        ctrl.observe(end_to_end_seconds, model_seconds) # after replying
+        payload['quality'] = ctrl.state()               # suggestion for the client
+    """
+
+    def __init__(
+        self,
+        target_p95: float = 0.5,
+        window: int = 30,
+        min_samples: int = 8,
+        headroom: float = 0.6,
+        min_interval: float = 0.05,
+        max_interval: float = 2.0,
+        levels=QUALITY_LEVELS,
+    ):
+        self.target_p95 = float(target_p95)
+        self.window = max(2, int(window))
+        self.min_samples = max(1, min(int(min_samples), self.window))
+        self.headroom = float(headroom)
+        self.min_interval = float(min_interval)
+        self.max_interval = float(max_interval)
+        self.levels = tuple(levels)
+        self.level = 0
+        self.interval = self.min_interval
+        self.changes = 0
+        self._latencies = deque(maxlen=self.window)
+        self._model_times = deque(maxlen=self.window)
+
+    @property
+    def resize_long_edge(self) -> int | None:
+        return self.levels[self.level][0]
+
+    @property
+    def jpeg_quality(self) -> int:
+        return self.levels[self.level][1]
+
+    def resize_for(self, image) -> int | None:
+        """`resize_long_edge` for this frame: only ever a downscale."""
+        limit = self.resize_long_edge
+        if limit is None or max(image.shape[:2]) <= limit:
+            return None
+        return limit
+
+    def observe(self, latency: float, model_time: float = 0.0):
+        """Record one inferred frame's end-to-end and model seconds, then adjust the setting if due."""
+        self._latencies.append(float(latency))
+        if model_time > 0:
+            self._model_times.append(float(model_time))
+        if len(self._latencies) < self.min_samples:
+            return
+        p95 = _percentile(self._latencies, 95)
+        if p95 > self.target_p95:
+            if self.level < len(self.levels) - 1:
+                self.level += 1
+            elif self.interval < self.max_interval:
+                self.interval = min(self.max_interval, self.interval * 1.5)
+            else:
+                return
+            self._changed()
+        elif p95 < self.headroom * self.target_p95 and len(self._latencies) == self.window:
+            if self.interval > self.min_interval:
+                self.interval = max(self.min_interval, self.interval / 1.5)
+            elif self.level > 0:
+                self.level -= 1
+            else:
+                return
+            self._changed()
+
+    def _changed(self):
+        self.changes += 1
+        self._latencies.clear()
+
+    @property
+    def send_interval(self) -> float:
+        """Suggested seconds between client frames."""
+        floor = _percentile(self._model_times, 50) if self._model_times else 0.0
+        return max(self.interval, floor)
+
+    def state(self) -> dict:
+        return {
+            'level': self.level,
+            'resize_long_edge': self.resize_long_edge,
+            'jpeg_quality': self.jpeg_quality,
+            'send_interval_ms': round(self.send_interval * 1000),
+            'target_p95_ms': round(self.target_p95 * 1000),
+            'p95_ms': round(_percentile(self._latencies, 95) * 1000) if self._latencies else None,
+        }
@@ -0,0 +1,180 @@
+"""Bounded caches for detection results.
+
+`ResultCache` reuses finished results of byte-identical inputs;
+`RawResultStore` keeps unfiltered detections so thresholds can be changed
+without inference.
+
+Retried uploads, the client's test frame and overnight static cameras send
+the exact same encoded image again and again. `ResultCache` maps a fast
+BLAKE2 digest of the encoded bytes (or of decoded pixels), together with
+the detection parameters, to the finished result, so a duplicate costs
+a hash and a dictionary lookup instead of an inference.
+
+Entries are evicted least-recently-used first once either `max_entries`
+or `max_bytes` (estimated size of the cached values, e.g. annotated
+frames) is exceeded. `max_bytes=0` disables the cache.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def estimate_size(value) -> int:
+    """Rough number of bytes held by `value` (arrays, strings and containers of them)."""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (bytes, bytearray, memoryview, str)):
+        return len(value)
+    if isinstance(value, dict):
+        return 64 + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return 56 + sum(estimate_size(v) for v in value)
+    return 32
+
+
+class ResultCache:
+    """Thread-safe LRU of results keyed by input content + detection parameters.
+
+    Usage:
+        cache = ResultCache(max_bytes=64 * 1024 * 1024)
+        key = cache.make_key(jpeg_bytes, confidence=0.8, mode='boxes')
+        result = cache.get(key)
+        if result is None:
+            result = run_model(...)
+            cache.put(key, result)
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_entries: int = 1024):
+        self.max_bytes = max(0, int(max_bytes))
+        self.max_entries = max(1, int(max_entries))
+        self._entries = OrderedDict()  # key -> (value, nbytes)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def make_key(data, **params) -> tuple:
+        """Digest of `data` (encoded bytes, a str or a numpy image) plus the sorted parameters."""
+        h = hashlib.blake2b(digest_size=16)
+        if isinstance(data, np.ndarray):
+            h.update(repr((data.shape, data.dtype.str)).encode())
+            data = np.ascontiguousarray(data)
+        elif isinstance(data, str):
+            data = data.encode('utf-8')
+        h.update(memoryview(data).cast('B'))
+        return (h.digest(), tuple(sorted(params.items())))
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, nbytes: int | None = None):
+        if not self.enabled:
+            return
+        nbytes = estimate_size(value) if nbytes is None else int(nbytes)
+        if nbytes > self.max_bytes:
+            return  # would evict everything else and still not fit
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._entries[key] = (value, nbytes)
+            self.bytes += nbytes
+            while self.bytes > self.max_bytes or len(self._entries) > self.max_entries:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+            }
+
+
+class RawResultStore:
+    """Last `per_owner` raw (unfiltered) detection results per session or upload id.
+
+    Raw results hold every person box and score before the confidence
+    threshold and NMS (`Detector.detect(..., return_raw=True)`), so a new
+    threshold can be applied with `Detector.select_detections` without
+    running the model again. Owners are evicted least-recently-used first
+    beyond `max_owners`.
+    """
+
+    def __init__(self, per_owner: int = 3, max_owners: int = 256):
+        self.per_owner = max(0, int(per_owner))
+        self.max_owners = max(1, int(max_owners))
+        self._owners = OrderedDict()  # owner -> (next_id, OrderedDict(item_id -> entry))
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.per_owner > 0
+
+    def add(self, owner, entry: dict) -> int | None:
+        """Store `entry` (must hold 'raw') under `owner`. Returns its id within the owner."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            next_id, items = self._owners.pop(owner, (1, OrderedDict()))
+            items[next_id] = entry
+            while len(items) > self.per_owner:
+                items.popitem(last=False)
+            self._owners[owner] = (next_id + 1, items)
+            while len(self._owners) > self.max_owners:
+                self._owners.popitem(last=False)
+            return next_id
+
+    def get(self, owner, item_id: int | None = None):
+        """The entry `item_id` of `owner` (its latest when None), or None if it is no longer kept."""
+        with self._lock:
+            state = self._owners.get(owner)
+            if state is None:
+                return None
+            self._owners.move_to_end(owner)
+            items = state[1]
+            if item_id is None:
+                return next(reversed(items.values()), None)
+            return items.get(int(item_id))
+
+    def drop(self, owner):
+        with self._lock:
+            self._owners.pop(owner, None)
+
+    def __len__(self):
+        return len(self._owners)
@@ -0,0 +1,286 @@
+"""Cross-client micro-batching for the Socket.IO `frame` path.
+
+Every Socket.IO session has an inbox of depth 1: a newer frame replaces a
+queued frame that has not started yet (latest frame wins), so a slow server
+never builds a backlog. A background task takes the waiting frames of up
+to `max_batch_size` sessions, waiting at most `max_wait_ms` after the first
+one arrives, runs one batched `detect_batch` call and sends each result back
+to the sid that submitted the frame. With an `InferencePool` several
+`run` loops can be started so that every worker process has a batch.
+
+Credit protocol: when a session's frame is taken for inference the server
+grants the client one credit (`on_ack`), meaning it may send the next
+frame. Clients that respect credits never have frames dropped; clients
+that ignore them simply have stale frames replaced.
+"""
+
+import threading
+import time
+from collections import deque
+
+
+class FrameJob:
+    """One decoded frame waiting for inference."""
+
+    __slots__ = (
+        'sid', 'image', 'confidence', 'mode', 'binary', 'image_format', 'track', 'received_at',
+        'cache_key', 'keep_raw', 'raw', 'endpoint', 'division', 'timings', 'resize_long_edge', 'quality',
+        'zones', 'regions', 'camera', 'nms_iou', 'queued_at', 'seq',
+    )
+
+    def __init__(
+        self,
+        sid,
+        image,
+        confidence: float = 0.8,
+        mode: str = 'image',
+        binary: bool = False,
+        image_format: str = 'jpeg',
+        track: bool = False,
+        endpoint: str = 'frame',
+        division: str = 'unknown',
+        timings: dict | None = None,
+        nms_iou: float = 0.5,
+    ):
+        self.sid = sid
+        # decoded BGR frame; None while a frame is only looked up in the result cache by its encoded bytes
+        self.image = image
+        self.confidence = confidence
+        self.nms_iou = nms_iou
+        # 'image' returns an annotated frame, 'boxes' returns only the detections
+        self.mode = mode
+        # reply with raw encoded bytes ('processed_frame_bin') instead of a base64 data URL
+        self.binary = binary
+        self.image_format = image_format
+        # keyframe of a tracked session: detections go through the session tracker before drawing
+        self.track = track
+        self.received_at = time.monotonic()
+        # set by BatchScheduler.submit; the 'queue' stage runs from here to the start of the batch
+        self.queued_at = None
+        # set when the result should be stored in the server's ResultCache
+        self.cache_key = None
+        # ask the detector for the unfiltered person boxes too (filled into `raw` before on_result)
+        self.keep_raw = False
+        self.raw = None
+        # metric labels and per-stage seconds (decode, queue, detector stages, encode)
+        self.endpoint = endpoint
+        self.division = division
+        self.timings = timings if timings is not None else {}
+        # set per session by the adaptive quality controller: model input size and reply JPEG/WebP quality
+        self.resize_long_edge = None
+        self.quality = 90
+        # division zones (roi.ZoneSet): only `regions` of the frame run through the model, and the
+        # detections are filtered and counted per zone (and drawn) before the reply
+        self.zones = None
+        self.regions = None
+        # optional camera name within the division; with `division` it keys the occupancy series
+        self.camera = ''
+        # client sequence id ('seq'), echoed in the reply so clients can match replies to frames
+        self.seq = None
+
+    @property
+    def return_image(self) -> bool:
+        return self.mode != 'boxes' and not self.track and self.zones is None
+
+
+class SessionState:
+    """Per-session inbox (depth 1) and frame counters."""
+
+    __slots__ = ('pending', 'received', 'processed', 'dropped', 'reused')
+
+    def __init__(self):
+        self.pending = None
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.reused = 0  # answered from a cached result without inference
+
+    def stats(self) -> dict:
+        return {'received': self.received, 'processed': self.processed, 'dropped': self.dropped, 'reused': self.reused}
+
+
+class BatchScheduler:
+    """Collects frames from all sessions and runs them through the detector in batches.
+
+    Usage:
+        scheduler = BatchScheduler(detector, on_result, on_error, on_ack, max_batch_size=8, max_wait_ms=30)
+        socketio.start_background_task(scheduler.run)
+        scheduler.submit(FrameJob(request.sid, img, confidence=0.8))
+
+    `on_result(job, output, inference_time, count, stats)` and `on_error(job, exc)`
+    are called from the scheduler task, once per job. `output` is the annotated
+    image, or the list of detections for jobs that do not want an image
+    (`FrameJob.return_image`). `on_ack(sid, stats)` is
+    called when a session's frame leaves its inbox for inference.
+    `detect_params` (e.g. tiling) are passed to every `detect_batch` call.
+    """
+
+    def __init__(
+        self,
+        detector,
+        on_result,
+        on_error,
+        on_ack=None,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 30.0,
+        detect_params: dict | None = None,
+    ):
+        self.detector = detector
+        self.detect_params = detect_params or {}
+        self.on_result = on_result
+        self.on_error = on_error
+        self.on_ack = on_ack
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._sessions = {}
+        self._ready = deque()  # sids with a pending frame, oldest first
+        self._cond = threading.Condition()
+        self._running = False
+        self.in_flight = 0  # frames taken from inboxes whose results have not been delivered yet
+
+    def submit(self, job: FrameJob) -> bool:
+        """Place `job` in its session inbox. Returns False if it replaced a queued frame."""
+        job.queued_at = time.monotonic()
+        with self._cond:
+            state = self._sessions.setdefault(job.sid, SessionState())
+            state.received += 1
+            replaced = state.pending is not None
+            if replaced:
+                state.dropped += 1
+            else:
+                self._ready.append(job.sid)
+            state.pending = job
+            self._cond.notify()
+        return not replaced
+
+    def record_reused(self, sid) -> dict:
+        """Count a frame that was answered without inference (e.g. by the motion gate)."""
+        with self._cond:
+            state = self._sessions.setdefault(sid, SessionState())
+            state.received += 1
+            state.reused += 1
+            return state.stats()
+
+    def record_dropped(self, sid):
+        """Count a frame that was replaced by a newer one before it was answered (outside the inbox)."""
+        with self._cond:
+            state = self._sessions.setdefault(sid, SessionState())
+            state.received += 1
+            state.dropped += 1
+
+    def remove_session(self, sid):
+        """Forget a disconnected session and discard its queued frame."""
+        with self._cond:
+            state = self._sessions.pop(sid, None)
+            if state is not None and state.pending is not None:
+                self._ready.remove(sid)
+
+    def drain(self):
+        """Take every queued frame out of its inbox (e.g. when the model failed to load). Returns the jobs."""
+        with self._cond:
+            jobs = []
+            while self._ready:
+                state = self._sessions.get(self._ready.popleft())
+                if state is not None and state.pending is not None:
+                    jobs.append(state.pending)
+                    state.pending = None
+            return jobs
+
+    def session_stats(self, sid) -> dict:
+        with self._cond:
+            state = self._sessions.get(sid)
+            return state.stats() if state else SessionState().stats()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+
+    def qsize(self) -> int:
+        return len(self._ready)
+
+    def _take(self, batch):
+        while self._ready and len(batch) < self.max_batch_size:
+            state = self._sessions[self._ready.popleft()]
+            batch.append(state.pending)
+            state.pending = None
+
+    def _next_batch(self):
+        """Block for the first frame, then gather more until the batch is full or the deadline passes."""
+        batch = []
+        with self._cond:
+            if not self._ready:
+                self._cond.wait(timeout=0.5)
+            if not self._ready:
+                return batch
+            self._take(batch)
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size and self._running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(timeout=remaining)
+                self._take(batch)
+            self._take(batch)
+        return batch
+
+    def run(self):
+        """Scheduler loop; meant to be started with `socketio.start_background_task`."""
+        self._running = True
+        while self._running:
+            batch = self._next_batch()
+            if not batch:
+                continue
+            if self.on_ack:
+                for job in batch:
+                    self.on_ack(job.sid, self.session_stats(job.sid))
+            params = dict(self.detect_params)
+            if any(job.nms_iou != 0.5 for job in batch):
+                params['nms_iou'] = [job.nms_iou for job in batch]
+            if any(job.keep_raw for job in batch):
+                params['return_raw'] = True
+            if any(job.resize_long_edge for job in batch):
+                params['resize_long_edge'] = [job.resize_long_edge for job in batch]
+            if any(job.regions for job in batch):
+                params['regions'] = [job.regions for job in batch]
+            started = time.monotonic()
+            for job in batch:
+                job.timings['queue'] = started - (job.queued_at or job.received_at)
+            with self._cond:
+                self.in_flight += len(batch)
+            try:
+                self._run_batch(batch, params)
+            finally:
+                with self._cond:
+                    self.in_flight -= len(batch)
+
+    def _run_batch(self, batch, params):
+        """One batched `detect_batch` call, then deliver every job's result (or the error)."""
+        timings = {}
+        try:
+            results = self.detector.detect_batch(
+                [job.image for job in batch],
+                confidence_threshold=[job.confidence for job in batch],
+                return_image=[job.return_image for job in batch],
+                timings=timings,
+                **params,
+            )
+        except Exception as e:
+            for job in batch:
+                self.on_error(job, e)
+            return
+        for job, (output, t, count, *raw) in zip(batch, results):
+            if raw and job.keep_raw:
+                job.raw = raw[0]
+            job.timings.update(timings)
+            with self._cond:
+                state = self._sessions.get(job.sid)
+                if state is None:
+                    # client disconnected while its frame was in flight
+                    continue
+                state.processed += 1
+                stats = state.stats()
+            try:
+                self.on_result(job, output, t, count, stats)
+            except Exception as e:
+                self.on_error(job, e)
@@ -0,0 +1,52 @@
+import pytest
+
+from metrics import Metrics, clean_label, timed
+
+
+def test_clean_label():
+    assert clean_label('show room!') == 'showroom'
+    assert clean_label(None) == 'unknown'
+    assert clean_label('', default='') == ''
+    assert clean_label('x' * 40) == 'x' * 32
+    assert clean_label('warehouse', allowed={'showroom'}) == 'other'
+    assert clean_label(None, allowed={'showroom'}) == 'unknown'
+
+
+def test_histogram_renders_cumulative_buckets():
+    metrics = Metrics()
+    hist = metrics.histogram('smartflow_test_seconds', 'Test', ('stage',), buckets=(1.0, 0.1))
+    for value in (0.05, 0.5, 5.0):
+        hist.observe(value, 'decode')
+    lines = metrics.render().splitlines()
+    assert lines[:2] == ['# HELP smartflow_test_seconds Test', '# TYPE smartflow_test_seconds histogram']
+    assert 'smartflow_test_seconds_bucket{stage="decode",le="0.1"} 1' in lines
+    assert 'smartflow_test_seconds_bucket{stage="decode",le="1.0"} 2' in lines
+    assert 'smartflow_test_seconds_bucket{stage="decode",le="+Inf"} 3' in lines
+    assert 'smartflow_test_seconds_sum{stage="decode"} 5.55' in lines
+    assert 'smartflow_test_seconds_count{stage="decode"} 3' in lines
+
+
+def test_histogram_checks_labels():
+    hist = Metrics().histogram('h', 'Test', ('stage', 'endpoint'))
+    with pytest.raises(ValueError):
+        hist.observe(0.1, 'decode')
+
+
+def test_gauge_reads_its_callback_and_skips_failures():
+    metrics = Metrics()
+    metrics.gauge('smartflow_queue_depth', 'Frames waiting', lambda: 3)
+    metrics.gauge('smartflow_broken', 'Fails', lambda: 1 / 0)
+    text = metrics.render()
+    assert 'smartflow_queue_depth 3.0' in text
+    assert 'smartflow_broken' not in text
+
+
+def test_timed_adds_up_stages():
+    timings = {}
+    with timed(timings, 'decode'):
+        pass
+    with timed(timings, 'decode'):
+        pass
+    assert set(timings) == {'decode'} and timings['decode'] >= 0
+    with timed(None, 'decode'):
+        pass
@@ -0,0 +1,121 @@
+import math
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from occupancy import OccupancyStore, RollingWindow  # noqa: E402
+
+
+def test_window_aggregates():
+    window = RollingWindow(span=60, buckets=60)
+    for value in (2, 4, 6):
+        assert window.add(10.5, value)
+    stats = window.stats()
+    assert stats['samples'] == 3
+    assert stats['mean'] == 4
+    assert stats['max'] == 6
+    assert stats['p50'] == 4
+
+
+def test_window_percentiles_are_exact_ranks():
+    window = RollingWindow(span=60, buckets=60)
+    for value in range(1, 101):
+        window.add(0.5, value)
+    stats = window.stats()
+    assert (stats['p50'], stats['p90'], stats['p95'], stats['p99']) == (50, 90, 95, 99)
+
+
+def test_values_above_max_value_fall_in_top_bin():
+    window = RollingWindow(span=60, buckets=60, max_value=8)
+    window.add(0.5, 100)
+    stats = window.stats()
+    assert stats['p99'] == 7
+    assert stats['max'] == 100
+
+
+def test_expiring_buckets_leave_the_totals():
+    window = RollingWindow(span=10, buckets=10)  # 1 s buckets
+    window.add(0.5, 5)
+    window.add(5.5, 7)
+    window.add(12.5, 1)  # the window now covers buckets 3..12: t=0.5 expired, t=5.5 is kept
+    stats = window.stats()
+    assert stats['samples'] == 2
+    assert stats['mean'] == 4
+    assert stats['max'] == 7
+    assert window.points() == [(5.0, 7.0, 7.0), (12.0, 1.0, 1.0)]
+
+
+def test_stats_at_a_later_time_is_read_only():
+    window = RollingWindow(span=10, buckets=10)
+    window.add(5.5, 7)
+    window.add(12.5, 1)
+    assert window.stats(at=15.5)['samples'] == 1  # bucket 5 is out of the window ending at 15
+    assert window.stats(at=30.0)['samples'] == 0
+    assert window.stats()['samples'] == 2
+
+
+def test_at_before_newest_bucket_is_rejected():
+    window = RollingWindow(span=10, buckets=10)
+    window.add(12.5, 1)
+    with pytest.raises(ValueError):
+        window.stats(at=3.0)
+    with pytest.raises(ValueError):
+        window.points(at=3.0)
+
+
+def test_samples_older_than_the_window_are_refused():
+    window = RollingWindow(span=10, buckets=10)
+    window.add(12.5, 1)
+    assert not window.add(2.5, 1)
+    assert window.add(3.5, 1)
+    assert window.stats()['samples'] == 2
+
+
+def test_record_many_counts_only_added_samples():
+    store = OccupancyStore(windows={'10s': 10}, buckets=10)
+    assert store.record('k', 5, t=100.5)
+    added = store.record_many('k', [0.5, 95.5, math.nan, 99.5], [1, 2, 3, 4])
+    assert added == 2
+    assert store.query('k', at=100.5)['windows']['10s']['samples'] == 3
+
+
+def test_series_limit():
+    store = OccupancyStore(max_series=1)
+    assert store.record('a', 1)
+    assert not store.record('b', 1)
+    assert store.record_many('b', [1.0, 2.0], [1, 2]) == 0
+    assert store.keys() == ['a']
+
+
+def test_query_reports_last_sample_and_points():
+    store = OccupancyStore(windows={'10s': 10}, buckets=10)
+    store.record('k', 3, t=1.5)
+    store.record('k', 5, t=2.5)
+    result = store.query('k', at=2.5, points='10s')
+    assert result['last'] == 5 and result['last_time'] == 2.5
+    assert result['points'] == [(1.0, 3.0, 3.0), (2.0, 5.0, 5.0)]
+    assert store.query('missing') is None
+
+
+def test_snapshot_round_trip(tmp_path):
+    store = OccupancyStore(windows={'10s': 10, '100s': 100}, buckets=10, max_value=16)
+    store.record_many('showroom', [1.5, 2.5, 30.5], [3, 5, 7])
+    store.record('warehouse/dock-2', 2, t=31.0)
+    path = str(tmp_path / 'occupancy.npz')
+    store.save(path)
+    loaded = OccupancyStore.load(path)
+    assert loaded.keys() == store.keys()
+    for key in store.keys():
+        assert loaded.query(key, at=40.0) == store.query(key, at=40.0)
+    # loaded windows keep aggregating
+    assert loaded.record('showroom', 1, t=41.0)
+    assert loaded.query('showroom', at=41.0)['windows']['100s']['samples'] == 4
+
+
+def test_snapshot_arrays_are_copies():
+    store = OccupancyStore(windows={'10s': 10}, buckets=10)
+    store.record('k', 3, t=1.5)
+    arrays = store.snapshot()
+    store.record('k', 4, t=1.5)
+    assert arrays['w0_n'].sum() == 1
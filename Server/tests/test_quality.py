@@ -0,0 +1,80 @@
+from types import SimpleNamespace
+
+from quality import QualityController
+
+
+def make_controller(**kwargs):
+    params = dict(target_p95=0.5, window=4, min_samples=2, headroom=0.6, min_interval=0.05, max_interval=0.2,
+                  levels=((None, 90), (640, 70)))
+    params.update(kwargs)
+    return QualityController(**params)
+
+
+def test_steps_down_after_min_samples():
+    ctrl = make_controller()
+    ctrl.observe(1.0)
+    assert ctrl.level == 0
+    ctrl.observe(1.0)
+    assert ctrl.level == 1 and ctrl.jpeg_quality == 70 and ctrl.changes == 1
+
+
+def test_lengthens_the_interval_on_the_last_level():
+    ctrl = make_controller()
+    for _ in range(2):
+        ctrl.observe(1.0)
+    for _ in range(2):
+        ctrl.observe(1.0)
+    assert ctrl.level == 1
+    assert ctrl.interval > ctrl.min_interval
+    for _ in range(20):
+        ctrl.observe(1.0)
+    assert ctrl.interval == ctrl.max_interval
+
+
+def test_recovers_interval_first_then_level():
+    ctrl = make_controller()
+    for _ in range(4):
+        ctrl.observe(1.0)  # level 1, then a longer interval
+    assert ctrl.level == 1 and ctrl.interval > ctrl.min_interval
+    for _ in range(4):
+        ctrl.observe(0.1)
+    assert ctrl.level == 1  # the interval shortens first
+    for _ in range(4 * 5):
+        ctrl.observe(0.1)
+    assert ctrl.level == 0 and ctrl.interval == ctrl.min_interval
+
+
+def test_steps_up_only_after_a_full_window():
+    ctrl = make_controller()
+    ctrl.observe(1.0)
+    ctrl.observe(1.0)
+    for _ in range(3):
+        ctrl.observe(0.1)
+    assert ctrl.level == 1
+    ctrl.observe(0.1)
+    assert ctrl.level == 0
+
+
+def test_holds_between_headroom_and_target():
+    ctrl = make_controller()
+    ctrl.observe(1.0)
+    ctrl.observe(1.0)
+    changes = ctrl.changes
+    for _ in range(20):
+        ctrl.observe(0.4)  # above 0.6 * target, below the target
+    assert ctrl.changes == changes and ctrl.level == 1
+
+
+def test_send_interval_is_at_least_the_median_model_time():
+    ctrl = make_controller()
+    ctrl.observe(0.1, model_time=0.3)
+    assert ctrl.send_interval == 0.3
+    assert ctrl.state()['send_interval_ms'] == 300
+
+
+def test_resize_only_downscales():
+    ctrl = make_controller()
+    ctrl.observe(1.0)
+    ctrl.observe(1.0)
+    assert ctrl.resize_for(SimpleNamespace(shape=(720, 1280, 3))) == 640
+    assert ctrl.resize_for(SimpleNamespace(shape=(480, 640, 3))) is None
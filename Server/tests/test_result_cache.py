@@ -0,0 +1,106 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from result_cache import RawResultStore, ResultCache, estimate_size  # noqa: E402
+
+
+def test_key_separates_modes_zones_and_parameters():
+    data = b'\xff\xd8same jpeg bytes'
+    base = dict(confidence=0.8, nms_iou=0.5, quality_level=None)
+    keys = {
+        ResultCache.make_key(data, mode='image', zones='showroom', **base),
+        ResultCache.make_key(data, mode='boxes', zones='showroom', **base),
+        ResultCache.make_key(data, mode='image', zones='showroom/cam-1', **base),
+        ResultCache.make_key(data, mode='image', zones=None, **base),
+        ResultCache.make_key(data, mode='image', zones='showroom', **dict(base, nms_iou=0.3)),
+        ResultCache.make_key(data + b'!', mode='image', zones='showroom', **base),
+    }
+    assert len(keys) == 6
+
+
+def test_key_ignores_parameter_order():
+    assert ResultCache.make_key(b'x', mode='boxes', confidence=0.8) == ResultCache.make_key(b'x', confidence=0.8, mode='boxes')
+
+
+def test_key_of_array_includes_shape():
+    pixels = np.zeros(12, dtype=np.uint8)
+    assert ResultCache.make_key(pixels.reshape(3, 4)) != ResultCache.make_key(pixels.reshape(4, 3))
+    assert ResultCache.make_key(pixels.reshape(3, 4)) == ResultCache.make_key(pixels.reshape(3, 4).copy())
+
+
+def test_evicts_least_recently_used_entry():
+    cache = ResultCache(max_bytes=1024, max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1  # 'b' is now the oldest
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_evicts_by_bytes():
+    cache = ResultCache(max_bytes=100, max_entries=10)
+    cache.put('a', 'a', nbytes=40)
+    cache.put('b', 'b', nbytes=40)
+    cache.put('c', 'c', nbytes=40)
+    assert len(cache) == 2 and cache.bytes == 80
+    assert cache.get('a') is None
+
+
+def test_replacing_a_key_keeps_byte_count():
+    cache = ResultCache(max_bytes=100)
+    cache.put('a', 'x', nbytes=30)
+    cache.put('a', 'y', nbytes=50)
+    assert len(cache) == 1 and cache.bytes == 50
+    assert cache.get('a') == 'y'
+
+
+def test_oversized_value_is_not_stored():
+    cache = ResultCache(max_bytes=100)
+    cache.put('small', 's', nbytes=10)
+    cache.put('huge', np.zeros(1000, dtype=np.uint8))
+    assert cache.get('huge') is None
+    assert cache.get('small') == 's'
+
+
+def test_zero_bytes_disables_the_cache():
+    cache = ResultCache(max_bytes=0)
+    assert not cache.enabled
+    cache.put('a', 1)
+    assert cache.get('a') is None
+    assert cache.stats()['misses'] == 0
+
+
+def test_hit_rate():
+    cache = ResultCache()
+    cache.put('a', 1)
+    cache.get('a')
+    cache.get('b')
+    assert cache.stats()['hit_rate'] == 0.5
+
+
+def test_estimate_size_counts_arrays_and_containers():
+    frame = np.zeros((10, 10, 3), dtype=np.uint8)
+    assert estimate_size(frame) == 300
+    assert estimate_size((frame, b'abcd')) == 56 + 300 + 4
+
+
+def test_raw_store_keeps_last_items_per_owner():
+    store = RawResultStore(per_owner=2, max_owners=2)
+    ids = [store.add('a', {'raw': i}) for i in range(3)]
+    assert ids == [1, 2, 3]
+    assert store.get('a', 1) is None
+    assert store.get('a', 2) == {'raw': 1}
+    assert store.get('a') == {'raw': 2}
+
+
+def test_raw_store_evicts_least_recently_used_owner():
+    store = RawResultStore(per_owner=1, max_owners=2)
+    store.add('a', {'raw': 'a'})
+    store.add('b', {'raw': 'b'})
+    store.get('a')
+    store.add('c', {'raw': 'c'})
+    assert store.get('b') is None
+    assert store.get('a') == {'raw': 'a'}
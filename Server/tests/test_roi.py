@@ -0,0 +1,69 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('cv2')
+
+from Detection.roi import ZoneSet, merge_rects, pack_regions, points_in_polygon  # noqa: E402
+
+
+def test_points_in_square():
+    square = np.array([[0, 0], [1, 0], [1, 1], [0, 1]], dtype=np.float64)
+    assert points_in_polygon([0.5, 1.5, -0.1], [0.5, 0.5, 0.5], square).tolist() == [True, False, False]
+
+
+def test_points_in_concave_polygon():
+    l_shape = np.array([[0, 0], [2, 0], [2, 1], [1, 1], [1, 2], [0, 2]], dtype=np.float64)
+    inside = points_in_polygon([0.5, 1.5, 1.5], [1.5, 0.5, 1.5], l_shape)
+    assert inside.tolist() == [True, True, False]
+
+
+def test_merge_rects_unions_overlaps_only():
+    merged = merge_rects([(0, 0, 10, 10), (5, 5, 20, 20), (30, 30, 40, 40)])
+    assert sorted(map(tuple, merged)) == [(0, 0, 20, 20), (30, 30, 40, 40)]
+    # touching edges do not overlap
+    assert len(merge_rects([(0, 0, 10, 10), (10, 0, 20, 10)])) == 2
+
+
+def test_pack_regions_round_trip():
+    image = (np.arange(100 * 200 * 3) % 251).astype(np.uint8).reshape(100, 200, 3)
+    rects = [(10, 10, 50, 40), (100, 20, 180, 90), (0, 60, 30, 100)]
+    mosaic, placements = pack_regions(image, rects, gap=16, fill=114)
+    assert sorted(p[2:] for p in placements) == sorted(rects)
+    for mx, my, x0, y0, x1, y1 in placements:
+        # every crop is copied unchanged, so a box found at (mx + dx, my + dy) maps back to (x0 + dx, y0 + dy)
+        np.testing.assert_array_equal(mosaic[my:my + y1 - y0, mx:mx + x1 - x0], image[y0:y1, x0:x1])
+    for i, (ax, ay, *a) in enumerate(placements):
+        for bx, by, *b in placements[i + 1:]:
+            aw, ah = a[2] - a[0], a[3] - a[1]
+            bw, bh = b[2] - b[0], b[3] - b[1]
+            apart_x = ax + aw + 16 <= bx or bx + bw + 16 <= ax
+            apart_y = ay + ah + 16 <= by or by + bh + 16 <= ay
+            assert apart_x or apart_y
+
+
+def test_pack_regions_fills_the_gaps():
+    image = np.zeros((50, 50), dtype=np.uint8)
+    mosaic, placements = pack_regions(image, [(0, 0, 10, 10), (20, 20, 30, 30)], gap=4, fill=114)
+    # the 10 px crops do not fit one 14 px wide row (~sqrt of their area), so they are stacked
+    assert [p[:2] for p in placements] == [(0, 0), (0, 14)]
+    assert mosaic.shape == (24, 10)
+    assert (mosaic[10:14] == 114).all()
+    assert (mosaic[:10] == 0).all() and (mosaic[14:] == 0).all()
+
+
+def test_zone_regions_and_assign():
+    zones = ZoneSet([{'name': 'entrance', 'polygon': [[0.25, 0.25], [0.5, 0.25], [0.5, 0.5], [0.25, 0.5]]}])
+    assert zones.regions(800, 400, margin=0) == [(200, 100, 400, 200)]
+    kept, counts = zones.assign([(250, 120, 300, 180, 0.9), (10, 10, 20, 20, 0.8)], 800, 400)
+    assert kept == [(250, 120, 300, 180, 0.9)]
+    assert counts == {'entrance': 1}
+
+
+def test_zone_covering_the_frame_uses_the_full_frame():
+    zones = ZoneSet([{'name': 'all', 'polygon': [[0, 0], [1, 0], [1, 1], [0, 1]]}])
+    assert zones.regions(640, 480) is None
+
+
+def test_zone_needs_three_points():
+    with pytest.raises(ValueError):
+        ZoneSet([{'name': 'line', 'polygon': [[0, 0], [1, 1]]}])
@@ -0,0 +1,154 @@
+import threading
+
+from scheduler import BatchScheduler, FrameJob
+
+
+class FakeDetector:
+    """Returns each image back as its output and its batch position as the count."""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.calls = []
+
+    def detect_batch(self, images, **params):
+        self.calls.append((list(images), params))
+        if self.fail:
+            raise RuntimeError('model failed')
+        return [(image, 0.01, i) for i, image in enumerate(images)]
+
+
+class Recorder:
+    def __init__(self, expected: int):
+        self.expected = expected
+        self.results = []
+        self.errors = []
+        self.acks = []
+        self.done = threading.Event()
+
+    def on_result(self, job, output, t, count, stats):
+        self.results.append((job, output, count, stats))
+        self._check()
+
+    def on_error(self, job, exc):
+        self.errors.append((job, exc))
+        self._check()
+
+    def on_ack(self, sid, stats):
+        self.acks.append((sid, stats))
+
+    def _check(self):
+        if len(self.results) + len(self.errors) >= self.expected:
+            self.done.set()
+
+
+def make_scheduler(expected, detector=None, **kwargs):
+    recorder = Recorder(expected)
+    scheduler = BatchScheduler(
+        detector or FakeDetector(), recorder.on_result, recorder.on_error, recorder.on_ack, **kwargs)
+    return scheduler, recorder
+
+
+def run_until_done(scheduler, recorder, timeout: float = 5.0):
+    thread = threading.Thread(target=scheduler.run, daemon=True)
+    thread.start()
+    try:
+        assert recorder.done.wait(timeout), 'scheduler did not deliver every job'
+    finally:
+        scheduler.stop()
+        thread.join(timeout)
+
+
+def test_newer_frame_replaces_queued_frame():
+    scheduler, _ = make_scheduler(0)
+    assert scheduler.submit(FrameJob('a', 'frame-1'))
+    assert not scheduler.submit(FrameJob('a', 'frame-2'))
+    assert scheduler.qsize() == 1
+    assert scheduler.session_stats('a') == {'received': 2, 'processed': 0, 'dropped': 1, 'reused': 0}
+
+
+def test_batch_spans_sessions_and_acks_once_per_frame():
+    detector = FakeDetector()
+    scheduler, recorder = make_scheduler(3, detector, max_batch_size=8, max_wait_ms=0)
+    scheduler.submit(FrameJob('a', 'a-old'))
+    scheduler.submit(FrameJob('a', 'a-new'))
+    scheduler.submit(FrameJob('b', 'b-1'))
+    scheduler.submit(FrameJob('c', 'c-1'))
+    run_until_done(scheduler, recorder)
+
+    assert len(detector.calls) == 1
+    assert detector.calls[0][0] == ['a-new', 'b-1', 'c-1']
+    # one credit per frame taken for inference; the replaced frame never gets one
+    assert [sid for sid, _ in recorder.acks] == ['a', 'b', 'c']
+    assert [output for _, output, _, _ in recorder.results] == ['a-new', 'b-1', 'c-1']
+    assert recorder.results[0][3] == {'received': 2, 'processed': 1, 'dropped': 1, 'reused': 0}
+    assert scheduler.in_flight == 0
+
+
+def test_batches_are_capped_at_max_batch_size():
+    detector = FakeDetector()
+    scheduler, recorder = make_scheduler(5, detector, max_batch_size=2, max_wait_ms=0)
+    for sid in 'abcde':
+        scheduler.submit(FrameJob(sid, sid))
+    run_until_done(scheduler, recorder)
+    assert [len(images) for images, _ in detector.calls] == [2, 2, 1]
+
+
+def test_per_frame_params_only_when_they_differ():
+    detector = FakeDetector()
+    scheduler, recorder = make_scheduler(2, detector, max_wait_ms=0, detect_params={'tile_size': 640})
+    scheduler.submit(FrameJob('a', 'a'))
+    scheduler.submit(FrameJob('b', 'b', nms_iou=0.3))
+    run_until_done(scheduler, recorder)
+    params = detector.calls[0][1]
+    assert params['tile_size'] == 640
+    assert params['nms_iou'] == [0.5, 0.3]
+    assert params['return_image'] == [True, True]
+    assert 'regions' not in params
+
+
+def test_detector_failure_reaches_every_job():
+    scheduler, recorder = make_scheduler(2, FakeDetector(fail=True), max_wait_ms=0)
+    scheduler.submit(FrameJob('a', 'a'))
+    scheduler.submit(FrameJob('b', 'b'))
+    run_until_done(scheduler, recorder)
+    assert sorted(job.sid for job, _ in recorder.errors) == ['a', 'b']
+    assert not recorder.results
+    assert scheduler.session_stats('a')['processed'] == 0
+
+
+def test_record_reused_and_dropped_count_as_received():
+    scheduler, _ = make_scheduler(0)
+    scheduler.record_reused('a')
+    scheduler.record_dropped('a')
+    assert scheduler.session_stats('a') == {'received': 2, 'processed': 0, 'dropped': 1, 'reused': 1}
+
+
+def test_drain_empties_every_inbox():
+    scheduler, _ = make_scheduler(0)
+    scheduler.submit(FrameJob('a', 'a'))
+    scheduler.submit(FrameJob('b', 'b'))
+    jobs = scheduler.drain()
+    assert [job.sid for job in jobs] == ['a', 'b']
+    assert scheduler.qsize() == 0
+    assert scheduler.drain() == []
+    # a drained session can queue a new frame
+    assert scheduler.submit(FrameJob('a', 'a2'))
+
+
+def test_remove_session_discards_its_frame():
+    scheduler, _ = make_scheduler(0)
+    scheduler.submit(FrameJob('a', 'a'))
+    scheduler.submit(FrameJob('b', 'b'))
+    scheduler.remove_session('a')
+    assert scheduler.qsize() == 1
+    assert scheduler.session_stats('a') == {'received': 0, 'processed': 0, 'dropped': 0, 'reused': 0}
+    assert [job.sid for job in scheduler.drain()] == ['b']
+
+
+def test_return_image_follows_mode_tracking_and_zones():
+    assert FrameJob('a', None).return_image
+    assert not FrameJob('a', None, mode='boxes').return_image
+    assert not FrameJob('a', None, track=True).return_image
+    job = FrameJob('a', None)
+    job.zones = object()
+    assert not job.return_image
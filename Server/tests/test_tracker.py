@@ -0,0 +1,70 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from Detection.tracker import Tracker, greedy_match, iou_matrix  # noqa: E402
+
+
+def test_iou_matrix():
+    a = np.array([[0, 0, 10, 10]], dtype=np.float64)
+    b = np.array([[0, 0, 10, 10], [5, 0, 15, 10], [20, 20, 30, 30]], dtype=np.float64)
+    np.testing.assert_allclose(iou_matrix(a, b), [[1.0, 1 / 3, 0.0]], rtol=1e-6)
+    assert iou_matrix(a, np.zeros((0, 4))).shape == (1, 0)
+
+
+def test_greedy_match_takes_best_pairs_first():
+    iou = np.array([[0.9, 0.8], [0.85, 0.1]])
+    matches, rows, cols = greedy_match(iou, threshold=0.3)
+    assert matches.tolist() == [[0, 0]]
+    assert rows.tolist() == [1]
+    assert cols.tolist() == [1]
+
+
+def test_greedy_match_without_candidates():
+    matches, rows, cols = greedy_match(np.zeros((2, 0)), threshold=0.3)
+    assert matches.shape == (0, 2)
+    assert rows.tolist() == [0, 1]
+    assert cols.tolist() == []
+
+
+def test_ids_stay_stable_for_moving_people():
+    tracker = Tracker()
+    _, first = tracker.update([(0, 0, 50, 100, 0.9), (200, 0, 250, 100, 0.8)])
+    assert first == [1, 2]
+    for step in range(1, 5):
+        tracks, ids = tracker.update([(200, 0, 250, 100, 0.8), (10 * step, 0, 50 + 10 * step, 100, 0.9)])
+        assert sorted(ids) == [1, 2]
+        assert len(tracks) == 2
+    assert tracker.total_tracks == 2
+
+
+def test_predict_carries_the_velocity_forward():
+    tracker = Tracker()
+    for step in range(6):
+        tracker.update([(10 * step, 0, 50 + 10 * step, 100, 0.9)])
+    last_centre = (50 + 50 + 50) / 2  # centre x of the box at step 5
+    tracks, ids = tracker.predict()
+    assert ids == [1]
+    x1, _, x2, _, score = tracks[0]
+    assert (x1 + x2) / 2 > last_centre + 5
+    assert score == pytest.approx(0.9)
+
+
+def test_unmatched_tracks_are_hidden_then_dropped():
+    tracker = Tracker(max_age=1)
+    tracker.update([(0, 0, 50, 100, 0.9)])
+    tracks, ids = tracker.update([])
+    assert tracks == [] and ids == []
+    assert len(tracker) == 1  # kept for re-association
+    tracker.update([])
+    assert len(tracker) == 0
+    _, ids = tracker.update([(0, 0, 50, 100, 0.9)])
+    assert ids == [2]
+
+
+def test_a_missed_keyframe_can_be_reassociated():
+    tracker = Tracker(max_age=2)
+    tracker.update([(0, 0, 50, 100, 0.9)])
+    tracker.update([])
+    _, ids = tracker.update([(0, 0, 50, 100, 0.9)])
+    assert ids == [1]